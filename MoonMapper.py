@@ -1,26 +1,48 @@
 import os
 import re
-import json
 import base58
 import bip_utils
 import html
 import asyncio
-import aiohttp
 import random
+import time
 from datetime import datetime
 from bip_utils import Bip39SeedGenerator, Bip44Coins, Bip44, Bip44Changes
 from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton
+from telegram.error import BadRequest
 from telegram.ext import Application, CommandHandler, CallbackQueryHandler, ContextTypes, MessageHandler, filters
 from solders.keypair import Keypair  # type: ignore
 from solders.pubkey import Pubkey  # type: ignore
-from solana.rpc.api import Client
-from raydiumFolder.raydium_py.raydium.amm_v4 import buy, sell
+from raydiumFolder.raydium_py.raydium.amm_v4 import buy_async, sell_async, buy_with_state_async, get_token_mint, EPHEMERAL_WSOL, PERSISTENT_WSOL
+from raydiumFolder.raydium_py.utils.clients import get_async_rpc_client, rpc_request, init_clients, close_clients
+from raydiumFolder.raydium_py.raydium.amm_v4_quote import quote_many, sol_and_token_reserves, token_decimals
+from raydiumFolder.raydium_py.utils.pool_cache import pool_keys_cache, prewarm_pool_keys, get_pool_keys_async
+from raydiumFolder.raydium_py.utils.pool_utils import get_amm_v4_reserves_raw_async, get_amm_v4_pair_from_rpc
+from raydiumFolder.raydium_py.utils.pool_index import pool_index
+from raydiumFolder.raydium_py.utils.chain_state import blockhash_service
+from raydiumFolder.raydium_py.utils.confirmation import confirmation_service
+from raydiumFolder.raydium_py.utils.auto_slippage import auto_slippage as auto_slippage_engine
+from raydiumFolder.raydium_py.utils.sol_price import sol_price_service
+from raydiumFolder.raydium_py.utils.priority_fees import priority_fee_estimator, FEE_TIERS, DEFAULT_FEE_TIER
+from user_store import open_store, migrate_json_to_sqlite, USER_STORE_BACKEND, USER_STORE_PATH
+from trade_queue import TradeQueue
+from metrics import LatencyTracker
+from market_data import market_data
+from portfolio import portfolio_cache
+from trade_ledger import trade_ledger, record_swap
+from copy_trade import copy_trade_engine, follower_trade_size
+from sniper import sniper_engine, snipe_latency, swap_state_for
+from orders import order_engine, TAKE_PROFIT, STOP_LOSS, LIMIT_BUY
+from dca import dca_scheduler, DcaBuyer, parse_interval, format_interval
+from demo import demo_simulator, new_demo_balance, demo_sol_and_token
 
 """---------------------------------"""
 """         Global Variable         """
 """---------------------------------"""
 
-WALLETS_FILE = "users.json"
+WALLETS_FILE = "users.json" # Legacy file, migrated into the user store on first start
+user_store = open_store()
+trade_queue = TradeQueue()
 TOKEN = "" # Paste your TG token
 coinType = Bip44Coins.SOLANA
 
@@ -147,16 +169,12 @@ def format_price(price):
 async def wallet_exists_and_has_balance(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
 
-    wallets = await load_wallets()
-    if not wallets:
+    user = await load_user(user_id)
+    if not user or "wallets" not in user:
         await update.callback_query.message.reply_text("❌ No wallet found for this user.")
         return False
 
-    if str(user_id) not in wallets or "wallets" not in wallets[str(user_id)]:
-        await update.callback_query.message.reply_text("❌ No wallet found for this user.")
-        return False
-
-    user_wallets = wallets[str(user_id)]["wallets"]
+    user_wallets = user["wallets"]
     
     if not user_wallets:
         await update.callback_query.message.reply_text("❌ The wallet is incomplete.")
@@ -176,39 +194,177 @@ async def wallet_exists_and_has_balance(update: Update, context: ContextTypes.DE
         return False
 
 
+def format_market_value(value, formatter):
+    try:
+        return formatter(float(value))
+    except (TypeError, ValueError):
+        return "N/A"
+
 async def get_token_data(token_address):
-    url = f"https://api.dexscreener.com/latest/dex/tokens/{token_address}"
-    async with aiohttp.ClientSession() as session:
-        async with session.get(url) as response:
-            if response.status != 200:
-                print(f"[ERROR] API request failed with status {response.status}")
-                return None
-
-            data = await response.json()
-
-            if "pairs" not in data or not isinstance(data["pairs"], list):
-                print(f"[ERROR] No 'pairs' data found for token {token_address}")
-                return None
-
-            # We take the Raydium pools for now
-            raydium_pools = [pair for pair in data["pairs"] if pair.get("dexId") == "raydium"]
-            if not raydium_pools:
-                print(f"[ERROR] No Raydium pools found for token {token_address}")
-                return None
-
-            best_pool = max(raydium_pools, key=lambda p: p.get("liquidity", {}).get("usd", 0))
-
-            return {
-                "token_name": best_pool.get("baseToken", {}).get("name", "Unknown"),
-                "token_symbol": best_pool.get("baseToken", {}).get("symbol", "Unknown"),
-                "price_sol": format_price(float(best_pool.get("priceNative", "N/A"))),
-                "price_usd": format_price(float(best_pool.get("priceUsd", "N/A"))),
-                "liquidity": format_number(float(best_pool["liquidity"].get("usd", "N/A"))) if "liquidity" in best_pool else "N/A",
-                "market_cap": format_number(float(best_pool.get("fdv", "N/A"))),
-                "price_change": best_pool.get("priceChange", {}),
-                "pair_address": best_pool.get("pairAddress", "N/A"), 
-                "best_pool": best_pool  
-            }
+    # The pool comes from the local pool index, DexScreener (shared market data cache) only adds the market data
+    pair_addresses, pairs = await asyncio.gather(
+        asyncio.to_thread(get_amm_v4_pair_from_rpc, token_address),
+        market_data.get_pairs(token_address),
+    )
+    if not pair_addresses:
+        print(f"[ERROR] No Raydium pools found for token {token_address}")
+        return None
+
+    market_pools = [pair for pair in pairs or () if pair.get("pairAddress") in pair_addresses]
+    if market_pools:
+        best_pool = max(market_pools, key=lambda p: p.get("liquidity", {}).get("usd", 0))
+    else:
+        # Pool not listed on DexScreener yet: tradable, without market data
+        best_pool = {"pairAddress": pair_addresses[0]}
+
+    return {
+        "token_name": best_pool.get("baseToken", {}).get("name", "Unknown"),
+        "token_symbol": best_pool.get("baseToken", {}).get("symbol", "Unknown"),
+        "price_sol": format_market_value(best_pool.get("priceNative"), format_price),
+        "price_usd": format_market_value(best_pool.get("priceUsd"), format_price),
+        "liquidity": format_market_value(best_pool.get("liquidity", {}).get("usd"), format_number),
+        "market_cap": format_market_value(best_pool.get("fdv"), format_number),
+        "price_change": best_pool.get("priceChange", {}),
+        "pair_address": best_pool["pairAddress"],
+        "best_pool": best_pool
+    }
+
+
+BUY_PREVIEW_SIZES = (0.1, 0.5, 1)
+
+async def get_buy_previews(pair_address, token_symbol, sol_amounts=BUY_PREVIEW_SIZES):
+    # Tokens received and price impact of each buy button, all quoted in one call
+    pool_keys = await get_pool_keys_async(pair_address)
+    if pool_keys is None:
+        return ""
+    base_vault_amount, quote_vault_amount = await get_amm_v4_reserves_raw_async(pool_keys)
+    if base_vault_amount is None or quote_vault_amount is None:
+        return ""
+
+    sol_reserve, token_reserve = sol_and_token_reserves(pool_keys, base_vault_amount, quote_vault_amount)
+    amounts_out, price_impacts = quote_many(
+        [round(sol_amount * 10**9) for sol_amount in sol_amounts],
+        [sol_reserve],
+        [token_reserve],
+        pool_keys.swap_fee_numerator,
+        pool_keys.swap_fee_denominator,
+    )
+    decimals = token_decimals(pool_keys)
+    lines = [
+        f"• {sol_amount} SOL → <b>{format_number(round(amount_out / 10**decimals, 2))} {token_symbol}</b> (impact {price_impact:.2f}%)"
+        for sol_amount, amount_out, price_impact in zip(sol_amounts, amounts_out[0], price_impacts[0])
+    ]
+    return "🧮 Buy preview:\n" + "\n".join(lines) + "\n\n"
+
+
+# Per-source timeouts of the token card, a slow source leaves its part of the card empty
+CARD_MARKET_TIMEOUT = 6
+CARD_BALANCE_TIMEOUT = 3
+CARD_PREVIEW_TIMEOUT = 3
+card_first_paint_latency = LatencyTracker("token card first paint")
+card_complete_latency = LatencyTracker("token card complete")
+
+
+async def with_timeout(coroutine, timeout, default, source):
+    try:
+        return await asyncio.wait_for(coroutine, timeout)
+    except asyncio.TimeoutError:
+        print(f"[ERROR] {source} timed out after {timeout}s")
+    except Exception as e:
+        print(f"[ERROR] {source} failed: {e}")
+    return default
+
+
+def token_price_sol(best_pool):
+    try:
+        return float(best_pool.get("priceNative"))
+    except (TypeError, ValueError):
+        return None
+
+
+def render_token_card(token_data, pair_address, risk_percentage, honeypot_alert, wallet=None, buy_previews="", position=None):
+    # wallet is None while the balances are still loading
+    if wallet is None:
+        sol_line = "⏳"
+        token_line = "⏳"
+    else:
+        # None when the balance lookup timed out
+        sol_line = f"{wallet['sol_balance']:.4f} SOL" if wallet['sol_balance'] is not None else "N/A"
+        if wallet.get('demo'):
+            sol_line += " (demo)"
+        token_line = f"{wallet['token_balance']:.4f} {token_data['token_symbol']}" if wallet['token_balance'] is not None else "N/A"
+
+    # PnL of the trades made through the bot (trade ledger), valued at the pool price
+    price_sol = token_price_sol(token_data['best_pool'])
+    if position is None:
+        pnl_line, bought_line, sold_line = "--", "-- SOL", "-- SOL"
+    else:
+        bought_line = f"{position.bought_sol / 1e9:.4f} SOL"
+        sold_line = f"{position.sold_sol / 1e9:.4f} SOL"
+        if price_sol is None:
+            pnl_line = f"{position.realized_pnl_sol / 1e9:+.4f} SOL (realized)"
+        else:
+            pnl_line = f"{position.pnl_sol(price_sol):+.4f} SOL ({position.pnl_percentage(price_sol):+.2f}%)"
+
+    return (f"📊 <b>{token_data['token_name']} ({token_data['token_symbol']})</b>\n"
+            f"<code>{pair_address}</code>\n\n"
+            f"💰Price: <b>${token_data['price_usd']}</b> ({token_data['price_sol']} SOL)\n"
+            f"🏛️ Market Cap: <b>${token_data['market_cap']}</b>\n"
+            f"💧 Liquidity: <b>${token_data['liquidity']}</b>\n\n"
+            f"📈 Price Changes:\n"
+            f"• 5min: <b>{token_data['price_change'].get('m5', 'N/A')}%</b> • 1h: <b>{token_data['price_change'].get('h1', 'N/A')}%</b>\n"
+            f"• 6h: <b>{token_data['price_change'].get('h6', 'N/A')}%</b> • 24h: <b>{token_data['price_change'].get('h24', 'N/A')}%</b>\n\n"
+            f"{buy_previews}"
+            f"💼 My Wallet:\n"
+            f"| Solana: <b>{sol_line}</b>\n"
+            f"| Token: <b>{token_line}</b>\n"
+            f"| PnL <b>{pnl_line}</b> 🚀\n"
+            f"| Bought <b>{bought_line}</b>\n"
+            f"| Sold <b>{sold_line}</b>\n\n"
+            f"------------------------------\n"
+            f"📢 Risk percentage: <b>{risk_percentage:.2f}%</b>\n"
+            f"{honeypot_alert}\n")
+
+
+def token_card_keyboard(pair_address):
+    buy_buttons = [
+        InlineKeyboardButton("🟢 Buy 0.1 SOL", callback_data=f'buy_0.1_{pair_address}'),
+        InlineKeyboardButton("🟢 Buy 0.5 SOL", callback_data=f'buy_0.5_{pair_address}')
+    ]
+
+    buy_x_buttons = [
+        InlineKeyboardButton("🟢 Buy 1 SOL", callback_data=f'buy_1_{pair_address}'),
+        InlineKeyboardButton("🟢 Buy x SOL", callback_data=f'buy_x_{pair_address}')
+    ]
+
+    separator = [
+        InlineKeyboardButton("-", callback_data='separator')
+    ]
+
+    sell_buttons = [
+        InlineKeyboardButton("🔴 Sell 25%", callback_data=f'sell_25_{pair_address}'),
+        InlineKeyboardButton("🔴 Sell 50%", callback_data=f'sell_50_{pair_address}')
+    ]
+
+    sell_x_buttons = [
+        InlineKeyboardButton("🔴 Sell 100%", callback_data=f'sell_100_{pair_address}'),
+        InlineKeyboardButton("🔴 Sell x%", callback_data=f'sell_x_{pair_address}')
+    ]
+
+    orders_button = [InlineKeyboardButton("🎯 TP / SL / Limit", callback_data=f'orders_{pair_address}')]
+
+    back_button = [InlineKeyboardButton("← Back", callback_data='back_to_main')]
+
+    keyboard = [
+        buy_buttons,
+        buy_x_buttons,
+        separator,
+        sell_buttons,
+        sell_x_buttons,
+        orders_button,
+        back_button
+    ]
+    return InlineKeyboardMarkup(keyboard)
 
 
 async def process_token_address(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -217,92 +373,74 @@ async def process_token_address(update: Update, context: ContextTypes.DEFAULT_TY
 
     if context.user_data.get('awaiting_token_address'):
         token_address = user_message
-        
-        token_data = await get_token_data(token_address)
+        started_at = time.perf_counter()
+
+        # Every lookup that does not need the pool starts right away
+        user = await load_user(user_id)
+        public_address = None
+        if user and user.get("wallets"):
+            public_address = next(iter(user["wallets"].values()))['public_address']
+        demo_balance = get_demo_balance(user)
+
+        market_task = asyncio.create_task(with_timeout(get_token_data(token_address), CARD_MARKET_TIMEOUT, None, "token data"))
+        balance_tasks = []
+        if public_address and demo_balance is None:
+            balance_tasks = [
+                asyncio.create_task(with_timeout(get_solana_balance(public_address), CARD_BALANCE_TIMEOUT, None, "SOL balance")),
+                asyncio.create_task(with_timeout(get_token_balance(public_address, token_address), CARD_BALANCE_TIMEOUT, None, "token balance")),
+            ]
+
+        token_data = await market_task
         if not token_data:
+            for task in balance_tasks:
+                task.cancel()
             await update.message.reply_text("❌ No valid pool found on Raydium for this token.")
             return
 
         best_pool = token_data.get("best_pool")  
-        pair_address = best_pool.get("pairAddress") or best_pool.get("address") or best_pool.get("id", "N/A")
+        pair_address = token_data["pair_address"]
         context.user_data['pair_address'] = pair_address
         context.user_data['token_symbol'] = token_data['token_symbol']  
+        asyncio.create_task(prewarm_pool_keys(pair_address))
+        priority_fee_estimator.watch(pair_address)
+        auto_slippage_engine.watch(pair_address)
         context.user_data.pop('awaiting_token_address', None)
-        wallets = await load_wallets()
-
-        if not wallets:
-            await update.message.reply_text("❌ No wallets file found or it is corrupted.")
-            return
 
-        if str(user_id) not in wallets or "wallets" not in wallets[str(user_id)]:
+        if not public_address:
             await update.message.reply_text("❌ No wallet found for this user.")
             return
 
-        user_wallets = wallets[str(user_id)]["wallets"]
-        wallet_data = next(iter(user_wallets.values()))
-        public_address = wallet_data['public_address']
-        sol_balance = await get_solana_balance(public_address)
-
-        token_mint = token_address 
-        token_balance = await get_token_balance(public_address, token_mint)
-
+        preview_task = asyncio.create_task(
+            with_timeout(get_buy_previews(pair_address, token_data['token_symbol']), CARD_PREVIEW_TIMEOUT, "", "buy preview")
+        )
         honeypot_alert, risk_percentage = is_honeypot(best_pool)
+        reply_markup = token_card_keyboard(pair_address)
 
-        message = (f"📊 <b>{token_data['token_name']} ({token_data['token_symbol']})</b>\n"
-                   f"<code>{pair_address}</code>\n\n"
-                   f"💰Price: <b>${token_data['price_usd']}</b> ({token_data['price_sol']} SOL)\n"
-                   f"🏛️ Market Cap: <b>${token_data['market_cap']}</b>\n"
-                   f"💧 Liquidity: <b>${token_data['liquidity']}</b>\n\n"
-                   f"📈 Price Changes:\n"
-                   f"• 5min: <b>{token_data['price_change'].get('m5', 'N/A')}%</b> • 1h: <b>{token_data['price_change'].get('h1', 'N/A')}%</b>\n"
-                   f"• 6h: <b>{token_data['price_change'].get('h6', 'N/A')}%</b> • 24h: <b>{token_data['price_change'].get('h24', 'N/A')}%</b>\n\n"
-                   f"💼 My Wallet:\n"
-                   f"| Solana: <b>{sol_balance:.4f} SOL</b>\n"
-                   f"| Token: <b>{token_balance:.4f} {token_data['token_symbol']}</b>\n"
-                   f"| PnL <b>--</b> 🚀\n"
-                   f"| Bought <b>-- SOL</b>\n"
-                   f"| Sold <b>-- SOL</b>\n\n"
-                   f"------------------------------\n"
-                   f"📢 Risk percentage: <b>{risk_percentage:.2f}%</b>\n"
-                   f"{honeypot_alert}\n")
-                   
-
-        buy_buttons = [
-            InlineKeyboardButton("🟢 Buy 0.1 SOL", callback_data=f'buy_0.1_{pair_address}'),
-            InlineKeyboardButton("🟢 Buy 0.5 SOL", callback_data=f'buy_0.5_{pair_address}')
-        ]
-
-        buy_x_buttons = [
-            InlineKeyboardButton("🟢 Buy 1 SOL", callback_data=f'buy_1_{pair_address}'),
-            InlineKeyboardButton("🟢 Buy x SOL", callback_data=f'buy_x_{pair_address}')
-        ]
-
-        separator = [
-            InlineKeyboardButton("-", callback_data='separator')
-        ]
-
-        sell_buttons = [
-            InlineKeyboardButton("🔴 Sell 25%", callback_data=f'sell_25_{pair_address}'),
-            InlineKeyboardButton("🔴 Sell 50%", callback_data=f'sell_50_{pair_address}')
-        ]
-
-        sell_x_buttons = [
-            InlineKeyboardButton("🔴 Sell 100%", callback_data=f'sell_100_{pair_address}'),
-            InlineKeyboardButton("🔴 Sell x%", callback_data=f'sell_x_{pair_address}')
-        ]
-
-        back_button = [InlineKeyboardButton("← Back", callback_data='back_to_main')]
+        # Market data first, the wallet and the previews are edited in when they arrive
+        card = await update.message.reply_text(
+            render_token_card(token_data, pair_address, risk_percentage, honeypot_alert),
+            reply_markup=reply_markup,
+            parse_mode="HTML",
+        )
+        card_first_paint_latency.record(time.perf_counter() - started_at)
 
-        keyboard = [
-            buy_buttons,
-            buy_x_buttons,
-            separator,
-            sell_buttons,
-            sell_x_buttons,
-            back_button
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        await update.message.reply_text(message, reply_markup=reply_markup, parse_mode="HTML")
+        if demo_balance is not None:
+            buy_previews = await preview_task
+            sol_balance, token_balance = demo_sol_and_token(demo_balance, token_address)
+        else:
+            sol_balance, token_balance, buy_previews = await asyncio.gather(*balance_tasks, preview_task)
+        wallet = {"sol_balance": sol_balance, "token_balance": token_balance, "demo": demo_balance is not None}
+        # The ledger only holds real trades
+        position = trade_ledger.position(user_id, token_address) if demo_balance is None else None
+        try:
+            await card.edit_text(
+                render_token_card(token_data, pair_address, risk_percentage, honeypot_alert, wallet, buy_previews, position),
+                reply_markup=reply_markup,
+                parse_mode="HTML",
+            )
+        except Exception as e:
+            print(f"[ERROR] Could not complete token card: {e}")
+        card_complete_latency.record(time.perf_counter() - started_at)
     
     else:
         await update.message.reply_text("❓ I didn't ask for a token address. Use /start to begin.")
@@ -357,12 +495,7 @@ async def process_amount(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 await update.message.reply_text("❌ Slippage must be between 0 and 100.")
                 return
             
-            wallets = await load_wallets()
-            if str(user_id) in wallets and 'settings' in wallets[str(user_id)]:
-                wallets[str(user_id)]['settings']['slippage'] = slippage
-
-                await save_wallets(wallets)
-
+            if await update_settings(user_id, slippage=slippage):
                 await update.message.reply_text(f"✅ Slippage set to {slippage}%")
             else:
                 await update.message.reply_text("❌ User settings not found.")
@@ -407,36 +540,51 @@ async def process_amount(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("❓ I didn't ask for an amount. Use /start to begin.")
 
 
+def get_trade_slippage(user):
+    # None lets the swap compute its own tolerance from the pool (auto slippage)
+    settings = user.get('settings', {})
+    if settings.get('auto_slippage', 'disabled') == 'enabled':
+        return None
+    return settings.get('slippage', 2)
+
+
 async def execute_buy(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
     pair_address = context.user_data.get('pair_address')
     sol_amount = context.user_data.get('sol_amount')
     token_symbol = context.user_data.get('token_symbol', 'Unknown')
 
-    wallets = await load_wallets()
-    if not wallets:
-        if update.message:
-            await update.message.reply_text("❌ No wallets file found or it is corrupted.")
-        elif update.callback_query and update.callback_query.message:
-            await update.callback_query.message.reply_text("❌ No wallets file found or it is corrupted.")
-        return
-
-    if str(user_id) not in wallets or "wallets" not in wallets[str(user_id)]:
+    user = await load_user(user_id)
+    if not user or "wallets" not in user:
         if update.message:
             await update.message.reply_text("❌ No wallet found for this user.")
         elif update.callback_query and update.callback_query.message:
             await update.callback_query.message.reply_text("❌ No wallet found for this user.")
         return
 
-    user_wallets = wallets[str(user_id)]["wallets"]
+    user_wallets = user["wallets"]
     wallet_data = next(iter(user_wallets.values()))
     private_key = wallet_data['private_key']
-    slippage = wallets[str(user_id)].get('settings', {}).get('slippage', 2)
-    
+    slippage = get_trade_slippage(user)
+    wsol_mode = user.get('settings', {}).get('wsol_mode', EPHEMERAL_WSOL)
+    fee_tier = user.get('settings', {}).get('fee_tier', DEFAULT_FEE_TIER)
+
+    # The trade runs in the trade queue, this handler returns right away
+    if get_demo_balance(user) is not None:
+        job = lambda: run_demo_buy(update, pair_address, sol_amount, token_symbol)
+    else:
+        job = lambda: run_buy(update, pair_address, private_key, sol_amount, slippage, token_symbol, wsol_mode, fee_tier)
+    if trade_queue.submit(user_id, job) is None:
+        await reply_trade_queue_full(update)
+
+
+async def run_buy(update: Update, pair_address, private_key, sol_amount, slippage, token_symbol, wsol_mode=EPHEMERAL_WSOL, fee_tier=DEFAULT_FEE_TIER):
     # Buy 
     try:
-        result, amount_out, txn_sig = buy(pair_address, private_key, sol_amount, slippage)  
+        result, amount_out, txn_sig = await buy_async(pair_address, private_key, sol_amount, slippage, wsol_mode, fee_tier)  
+        portfolio_cache.invalidate(update.effective_user.id)
         if result == True:
+            asyncio.create_task(record_swap(update.effective_user.id, "buy", pair_address, txn_sig, token_symbol, sol_amount, amount_out))
             message = (
                 f"✅ Buy order executed successfully!\n\n"
                 f"Amount In: <b>-{sol_amount} SOL</b>\n"
@@ -455,8 +603,7 @@ async def execute_buy(update: Update, context: ContextTypes.DEFAULT_TYPE):
             elif update.callback_query and update.callback_query.message:
                 sent_message = await update.callback_query.message.reply_text(error_message)
 
-        await asyncio.sleep(10)
-        await sent_message.delete()
+        asyncio.create_task(delete_message_later(sent_message, 10))
 
     except Exception as e:
         error_message = f"❌ Error executing buy order: {e}"
@@ -472,35 +619,44 @@ async def execute_sell(update: Update, context: ContextTypes.DEFAULT_TYPE):
     sell_percentage = context.user_data.get('sell_percentage')
     token_symbol = context.user_data.get('token_symbol', 'Unknown')
 
-    wallets = await load_wallets()
-    if not wallets:
-        await update.message.reply_text("❌ No wallets file found or it is corrupted.")
-        return
-
-    if str(user_id) not in wallets or "wallets" not in wallets[str(user_id)]:
+    user = await load_user(user_id)
+    if not user or "wallets" not in user:
         await update.message.reply_text("❌ No wallet found for this user.")
         return
     
-    user_wallets = wallets[str(user_id)]["wallets"]
+    user_wallets = user["wallets"]
     wallet_data = next(iter(user_wallets.values()))
     private_key = wallet_data['private_key']
-    slippage = wallets[str(user_id)].get('settings', {}).get('slippage', 2)
+    slippage = get_trade_slippage(user)
+    wsol_mode = user.get('settings', {}).get('wsol_mode', EPHEMERAL_WSOL)
+    fee_tier = user.get('settings', {}).get('fee_tier', DEFAULT_FEE_TIER)
+
+    if get_demo_balance(user) is not None:
+        job = lambda: run_demo_sell(update, pair_address, sell_percentage, token_symbol)
+    else:
+        job = lambda: run_sell(update, user, pair_address, private_key, sell_percentage, slippage, token_symbol, wsol_mode, fee_tier)
+    if trade_queue.submit(user_id, job) is None:
+        await reply_trade_queue_full(update)
+
+
+async def run_sell(update: Update, user, pair_address, private_key, sell_percentage, slippage, token_symbol, wsol_mode=EPHEMERAL_WSOL, fee_tier=DEFAULT_FEE_TIER):
+    user_id = update.effective_user.id
 
     # Sell
     try:
-        result,token_balance, amount_out, txn_sig = sell(pair_address, private_key, sell_percentage, slippage)
+        result,token_balance, amount_out, txn_sig = await sell_async(pair_address, private_key, sell_percentage, slippage, wsol_mode, fee_tier)
+        portfolio_cache.invalidate(user_id)
 
         if result == True: 
-            if 'settings' in wallets[str(user_id)]:
-                wallets[str(user_id)]['settings']['trades'] = wallets[str(user_id)]['settings'].get('trades', 0) + 1
-                
-                # We give the user a random reward (cashback), the more he trade the more he earn
-                base_reward = random.uniform(0.0001, 0.0005)  
-                reward_increment = (sell_percentage / 100) * base_reward  
-                reward_increment = round(reward_increment, 4) 
-                wallets[str(user_id)]['settings']['reward'] = wallets[str(user_id)]['settings'].get('reward', 0) + reward_increment
+            asyncio.create_task(record_swap(user_id, "sell", pair_address, txn_sig, token_symbol, amount_out, token_balance))
 
-            await save_wallets(wallets)
+            # We give the user a random reward (cashback), the more he trade the more he earn
+            base_reward = random.uniform(0.0001, 0.0005)  
+            reward_increment = (sell_percentage / 100) * base_reward  
+            reward_increment = round(reward_increment, 4) 
+            if 'settings' in user:
+                await increment_setting(user_id, 'trades', 1)
+                await increment_setting(user_id, 'reward', reward_increment)
 
             if update.message:
                 sent_message = await update.message.reply_text(
@@ -521,16 +677,18 @@ async def execute_sell(update: Update, context: ContextTypes.DEFAULT_TYPE):
                     parse_mode="HTML"
                 )
             
-            await asyncio.sleep(10)
-            await sent_message.delete()
+            asyncio.create_task(delete_message_later(sent_message, 10))
+
+        elif txn_sig is None:
+            sent_message = await reply_to(update, f"❌ You have no {token_symbol} to sell.")
+            asyncio.create_task(delete_message_later(sent_message, 5))
 
         else: 
             if update.message:
                 sent_message = await update.message.reply_text("❌ Sell order failed. Please increase the slippage or check your wallet balance and try again.")
             else:
                 sent_message = await update.callback_query.message.reply_text("❌ Sell order failed. Please increase the slippage or check your wallet balance and try again.")
-            await asyncio.sleep(5)
-            await sent_message.delete()
+            asyncio.create_task(delete_message_later(sent_message, 5))
 
     except Exception as e:
         print(f"[ERROR] Error executing sell order: {e}")
@@ -540,6 +698,82 @@ async def execute_sell(update: Update, context: ContextTypes.DEFAULT_TYPE):
             await update.callback_query.message.reply_text(f"❌ Error executing sell order: {e}")
 
 
+def get_demo_balance(user):
+    # The virtual wallet when demo mode is enabled, None otherwise
+    settings = (user or {}).get('settings', {})
+    if settings.get('demo_mode', 'disabled') != 'enabled':
+        return None
+    return settings.get('demo_balance') or new_demo_balance()
+
+
+async def run_demo_buy(update: Update, pair_address, sol_amount, token_symbol):
+    # Filled by the local pool simulator, the user's trades run one at a time so the
+    # balance read here is still current when it is written back
+    user_id = update.effective_user.id
+    try:
+        balance = get_demo_balance(await load_user(user_id))
+        result, amount_out, balance = await demo_simulator.buy(balance, pair_address, sol_amount)
+        if result:
+            await update_settings(user_id, demo_balance=balance)
+            message = (
+                f"🎮 Demo buy executed!\n\n"
+                f"Amount In: <b>-{sol_amount} SOL</b>\n"
+                f"Amount Out: <b>+{amount_out:.2f} {token_symbol}</b>\n\n"
+                f"Demo balance: <b>{balance['sol'] / 1e9:.4f} SOL</b>"
+            )
+        else:
+            message = "❌ Demo buy failed. Please check your demo balance and try again."
+        sent_message = await reply_to(update, message, parse_mode="HTML")
+        asyncio.create_task(delete_message_later(sent_message, 10))
+    except Exception as e:
+        print(f"[ERROR] Error executing demo buy: {e}")
+        await reply_to(update, f"❌ Error executing demo buy: {e}")
+
+
+async def run_demo_sell(update: Update, pair_address, sell_percentage, token_symbol):
+    user_id = update.effective_user.id
+    try:
+        balance = get_demo_balance(await load_user(user_id))
+        result, token_amount, amount_out, balance = await demo_simulator.sell(balance, pair_address, sell_percentage)
+        if result:
+            await update_settings(user_id, demo_balance=balance)
+            message = (
+                f"🎮 Demo sell executed!\n\n"
+                f"Amount In: <b>-{token_amount:.2f} {token_symbol}</b>\n"
+                f"Amount Out: <b>+{amount_out:.4f} SOL</b>\n\n"
+                f"Demo balance: <b>{balance['sol'] / 1e9:.4f} SOL</b>"
+            )
+        else:
+            message = "❌ Demo sell failed. You hold none of this token in demo mode."
+        sent_message = await reply_to(update, message, parse_mode="HTML")
+        asyncio.create_task(delete_message_later(sent_message, 10))
+    except Exception as e:
+        print(f"[ERROR] Error executing demo sell: {e}")
+        await reply_to(update, f"❌ Error executing demo sell: {e}")
+
+
+async def reply_to(update: Update, message, **kwargs):
+    if update.message:
+        return await update.message.reply_text(message, **kwargs)
+    return await update.callback_query.message.reply_text(message, **kwargs)
+
+
+async def reply_trade_queue_full(update: Update):
+    error_message = "❌ Too many trades are pending right now. Please try again in a moment."
+    if update.message:
+        await update.message.reply_text(error_message)
+    elif update.callback_query and update.callback_query.message:
+        await update.callback_query.message.reply_text(error_message)
+
+
+async def delete_message_later(message, delay):
+    await asyncio.sleep(delay)
+    try:
+        await message.delete()
+    except Exception as e:
+        print(f"[ERROR] Could not delete message: {e}")
+
+
 """-------------------------------"""
 """      Get Wallet Balance       """
 """-------------------------------"""
@@ -552,9 +786,8 @@ async def get_solana_balance(public_address):
         print(f"Error decoding public address: {e}")
         return 0
 
-    client = Client("https://api.mainnet-beta.solana.com")
     try:
-        balance_response = client.get_balance(pubkey)
+        balance_response = await get_async_rpc_client().get_balance(pubkey)
         balance_lamports = balance_response.value
     except Exception as e:
         print(f"Error fetching balance: {e}")
@@ -564,57 +797,33 @@ async def get_solana_balance(public_address):
 
 
 async def get_sol_price():
-    url = "https://api.coingecko.com/api/v3/simple/price"
-    params = {
-        'ids': 'solana',
-        'vs_currencies': 'usd'
-    }
-    async with aiohttp.ClientSession() as session:
-        async with session.get(url, params=params) as response:
-            if response.status == 200:
-                data = await response.json()
-                return data['solana']['usd']
-            else:
-                print(f"Error fetching SOL price: {response.status}")
-                return 0
+    # From memory (SOL/USDC pool reserves), CoinGecko only when the pool price is stale
+    return await sol_price_service.get_async()
 
 
 async def get_token_balance(public_address, token_mint):
-    url = "https://api.mainnet-beta.solana.com"
-    headers = {
-        "Content-Type": "application/json"
-    }
-    payload = {
-        "jsonrpc": "2.0",
-        "id": 1,
-        "method": "getTokenAccountsByOwner",
-        "params": [
-            public_address,
-            {
-                "mint": token_mint 
-            },
-            {
-                "encoding": "jsonParsed"
-            }
-        ]
-    }
+    params = [
+        public_address,
+        {
+            "mint": token_mint 
+        },
+        {
+            "encoding": "jsonParsed"
+        }
+    ]
 
-    async with aiohttp.ClientSession() as session:
-        async with session.post(url, headers=headers, json=payload) as response:
-            if response.status == 200:
-                data = await response.json()
+    data = await rpc_request("getTokenAccountsByOwner", params)
+    if data is None:
+        return 0
 
-                for account in data.get("result", {}).get("value", []):
-                    token_info = account.get("account", {}).get("data", {}).get("parsed", {}).get("info", {})
-                    balance = int(token_info.get("tokenAmount", {}).get("amount", 0))
-                    decimals = int(token_info.get("tokenAmount", {}).get("decimals", 0))
-                    balance_normalized = balance / (10 ** decimals)
-                    return balance_normalized
+    for account in data.get("result", {}).get("value", []):
+        token_info = account.get("account", {}).get("data", {}).get("parsed", {}).get("info", {})
+        balance = int(token_info.get("tokenAmount", {}).get("amount", 0))
+        decimals = int(token_info.get("tokenAmount", {}).get("decimals", 0))
+        balance_normalized = balance / (10 ** decimals)
+        return balance_normalized
 
-                return 0  
-            else:
-                print(f"Error fetching token balance: {response.status}")
-                return 0
+    return 0  
 
 
 """-------------------------------"""
@@ -630,23 +839,23 @@ async def display_wallet(update: Update, context: ContextTypes.DEFAULT_TYPE):
         message = update.message  
 
     user_id = update.effective_user.id  
-    wallets = await load_wallets()
+    user = await load_user(user_id)
+    user_wallets = (user or {}).get("wallets", {})
 
-    if not wallets:
+    if not user_wallets:
         message_text = "⚠️ <b>You don't have any wallets!</b>"
     else:
-        user_wallets = wallets.get(str(user_id), {}).get("wallets", {})
-
-        if not user_wallets:
-            message_text = "⚠️ <b>You don't have any wallets!</b>"
-        else:
-            sol_price = await get_sol_price()
-            wallets_list = "\n".join(
-                [f"<code>{html.escape(data['public_address'])}</code> (<i>Tap to copy</i>)\n"
-                 f"Balance: <b>{await get_solana_balance(data['public_address']):.4f} SOL (${await get_solana_balance(data['public_address']) * sol_price:.2f})</b>\n\n"
-                 for wallet_type, data in user_wallets.items()]
-            )
-            message_text = f"<b>Your Wallets</b>\n\n{wallets_list}"
+        addresses = [data['public_address'] for data in user_wallets.values()]
+        sol_price, snapshot = await asyncio.gather(
+            get_sol_price(),
+            portfolio_cache.get(user_id, addresses, include_tokens=False),
+        )
+        wallets_list = "\n".join(
+            [f"<code>{html.escape(address)}</code> (<i>Tap to copy</i>)\n"
+             f"Balance: <b>{snapshot[address]['sol']:.4f} SOL (${snapshot[address]['sol'] * sol_price:.2f})</b>\n\n"
+             for address in addresses]
+        )
+        message_text = f"<b>Your Wallets</b>\n\n{wallets_list}"
 
     keyboard_wallet = [
         [
@@ -692,24 +901,12 @@ async def wallet_action(update: Update, context: ContextTypes.DEFAULT_TYPE):
 """------------------------------"""
 
 async def save_wallet_to_file(user_id: int, public_address: str, private_key: str, mnemonic: str = "", wallet_type: str = "created"):
-    wallets = await load_wallets()
-    if not wallets:
-        return False
-
-    if str(user_id) not in wallets:
-        wallets[str(user_id)] = {"wallets": {}, "settings": {}}
-
-    if wallet_type in wallets[str(user_id)]["wallets"] and wallets[str(user_id)]["wallets"][wallet_type]:
-        return False 
-
-    wallets[str(user_id)]["wallets"][wallet_type] = {
+    # False when the user already has a wallet of this type
+    return await add_wallet(user_id, wallet_type, {
         "public_address": public_address,
         "private_key": private_key,
         "mnemonic": mnemonic
-    }
-
-    await save_wallets(wallets)
-    return True
+    })
 
 
 """------------------------------"""
@@ -720,14 +917,14 @@ async def create_wallet(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     user_id = update.effective_user.id
 
-    wallets = await load_wallets()
-    if not wallets:
-        sent_message = await query.message.reply_text("❌ No wallets file found or it is corrupted.")
+    user = await load_user(user_id)
+    if not user:
+        sent_message = await query.message.reply_text("❌ No settings found for this user.")
         await asyncio.sleep(3)
         await sent_message.delete()
         return
 
-    if str(user_id) in wallets and "created" in wallets[str(user_id)] and wallets[str(user_id)]["created"]:
+    if user.get("wallets", {}).get("created"):
         sent_message = await query.message.reply_text("❌ You already have a created wallet. You cannot create another one.")
         await asyncio.sleep(3)
         await sent_message.delete()
@@ -774,12 +971,12 @@ async def import_wallet(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     user_id = update.effective_user.id
 
-    wallets = await load_wallets()
-    if not wallets:
-        await query.message.reply_text("<b>❌ No wallets file found or it is corrupted.</b>", parse_mode="HTML")
+    user = await load_user(user_id)
+    if not user:
+        await query.message.reply_text("<b>❌ No settings found for this user.</b>", parse_mode="HTML")
         return
 
-    if str(user_id) in wallets and "imported" in wallets[str(user_id)] and wallets[str(user_id)]["imported"]:
+    if user.get("wallets", {}).get("imported"):
         await query.message.reply_text("<b>❌ You already have an imported wallet. You cannot import another one.</b>", parse_mode="HTML")
         return
 
@@ -822,13 +1019,9 @@ async def delete_wallet(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
     await query.answer()
     
-    wallets = await load_wallets()
-    if not wallets:
-        await query.message.reply_text("⚠️ <b>No saved wallet found.</b>", parse_mode="HTML")
-        return
-    
-    if str(user_id) in wallets:
-        user_wallets = wallets[str(user_id)]["wallets"]
+    user = await load_user(user_id)
+    if user:
+        user_wallets = user["wallets"]
         keyboard = [[InlineKeyboardButton(f"💳 {html.escape(data['public_address'])}", callback_data=f'delete_{wallet_type}')]
                 for wallet_type, data in user_wallets.items()]
         reply_markup = InlineKeyboardMarkup(keyboard)
@@ -843,17 +1036,7 @@ async def confirm_delete_wallet(update: Update, context: ContextTypes.DEFAULT_TY
     wallet_type = query.data.replace('delete_', '')
     await query.answer()
     
-    wallets = await load_wallets()
-    if not wallets:
-        sent_message = await query.message.reply_text("⚠️ <b>Wallet not found or already deleted</b>", parse_mode="HTML")
-        await asyncio.sleep(3)
-        await sent_message.delete()
-        return
-
-    if str(user_id) in wallets and wallet_type in wallets[str(user_id)]["wallets"]:
-        del wallets[str(user_id)]["wallets"][wallet_type]
-        await save_wallets(wallets)
-            
+    if await remove_wallet(user_id, wallet_type):
         sent_message = await query.message.reply_text(
             f"✅ <b>{wallet_type.capitalize()} wallet deleted.</b>\n", parse_mode="HTML")
         await asyncio.sleep(3)
@@ -873,12 +1056,8 @@ async def send_private_key(update: Update, context: ContextTypes.DEFAULT_TYPE, w
     query = update.callback_query
     user_id = str(update.effective_user.id)
 
-    wallets = await load_wallets()
-    if not wallets:
-        await query.message.reply_text("❌ Wallet not found!", parse_mode="HTML")
-        return
-
-    user_wallets = wallets.get(user_id, {}).get("wallets", {})
+    user = await load_user(user_id)
+    user_wallets = (user or {}).get("wallets", {})
 
     if wallet_type in user_wallets:
         private_key = user_wallets[wallet_type].get("private_key", "🔒 No private key found!")
@@ -905,24 +1084,22 @@ async def assets_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     user_id = str(update.effective_user.id)
 
-    wallets = await load_wallets()
-    if not wallets:
-        await query.message.reply_text("❌ No wallets file found or it is corrupted.")
-        return
-
-    if user_id not in wallets or "wallets" not in wallets[user_id]:
+    user = await load_user(user_id)
+    if not user or "wallets" not in user:
         await query.message.reply_text("❌ No wallet found for this user.")
         return
 
-    user_wallets = wallets[user_id]["wallets"]
+    user_wallets = user["wallets"]
     message = "<b>Your Assets</b>\n\n"
 
-    for wallet_type, wallet_data in user_wallets.items():
-        public_address = wallet_data['public_address']
-        sol_balance = await get_solana_balance(public_address)
+    addresses = [wallet_data['public_address'] for wallet_data in user_wallets.values()]
+    snapshot = await portfolio_cache.get(user_id, addresses)
+
+    for public_address in addresses:
+        sol_balance = snapshot[public_address]['sol']
         message += f"<b>Wallet Address:</b> <code>{public_address}</code> (<i>Tap to copy</i>)\n\n"
         message += f"💰 <b>SOL Balance:</b> {sol_balance:.4f} SOL\n\n"
-        tokens = await get_all_token_balances(public_address)
+        tokens = snapshot[public_address]['tokens']
         if tokens:
             message += "<b>Tokens:</b>\n"
             for token, balance in tokens.items():
@@ -940,7 +1117,12 @@ async def assets_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
     ]
     reply_markup = InlineKeyboardMarkup(keyboard)
 
-    await query.message.edit_text(message, reply_markup=reply_markup, parse_mode="HTML")
+    try:
+        await query.message.edit_text(message, reply_markup=reply_markup, parse_mode="HTML")
+    except BadRequest as e:
+        # Refresh tapped while the snapshot is still cached: same text, nothing to edit
+        if "not modified" not in str(e):
+            raise
 
 async def button_assets(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
@@ -951,44 +1133,526 @@ async def button_assets(update: Update, context: ContextTypes.DEFAULT_TYPE):
     elif query.data == 'back_to_main':
         await start(update, context)  
 
-async def get_all_token_balances(public_address):
-    url = "https://api.mainnet-beta.solana.com"
-    headers = {
-        "Content-Type": "application/json"
-    }
-    payload = {
-        "jsonrpc": "2.0",
-        "id": 1,
-        "method": "getTokenAccountsByOwner",
-        "params": [
-            public_address,
-            {
-                "programId": "TokenkegQfeZyiNwAJbNbGKPFXCWuBvf9Ss623VQ5DA"  
-            },
-            {
-                "encoding": "jsonParsed"
-            }
-        ]
-    }
 
-    async with aiohttp.ClientSession() as session:
-        async with session.post(url, headers=headers, json=payload) as response:
-            if response.status == 200:
-                data = await response.json()
-
-                tokens = {}
-                for account in data.get("result", {}).get("value", []):
-                    token_info = account.get("account", {}).get("data", {}).get("parsed", {}).get("info", {})
-                    mint = token_info.get("mint", "Unknown")
-                    balance = int(token_info.get("tokenAmount", {}).get("amount", 0))
-                    decimals = int(token_info.get("tokenAmount", {}).get("decimals", 0))
-                    balance_normalized = balance / (10 ** decimals)
-                    tokens[mint] = balance_normalized
-
-                return tokens
-            else:
-                print(f"Error fetching token balances: {response.status}")
-                return {}
+"""-------------------------------"""
+"""         History Menu          """
+"""-------------------------------"""
+
+async def history_menu(update: Update, context: ContextTypes.DEFAULT_TYPE, before_id=None, after_id=None):
+    # One page of the trade ledger, newest first, paged by trade id
+    query = update.callback_query
+    user_id = str(update.effective_user.id)
+
+    trades = trade_ledger.history(user_id, before_id=before_id, after_id=after_id)
+    if not trades and after_id is not None:
+        trades = trade_ledger.history(user_id)
+
+    message = "<b>Trade History</b>\n\n"
+    if not trades:
+        message += "No trades yet."
+    for trade in trades:
+        token_amount = trade['token_amount'] / 10**trade['token_decimals']
+        sol_amount = trade['sol_amount'] / 1e9
+        date = datetime.fromtimestamp(trade['created_at']).strftime("%Y-%m-%d %H:%M")
+        if trade['side'] == "buy":
+            message += f"🟢 <b>Buy</b> {format_number(round(token_amount, 2))} {html.escape(trade['token_symbol'])} for <b>{sol_amount:.4f} SOL</b>\n"
+        else:
+            message += f"🔴 <b>Sell</b> {format_number(round(token_amount, 2))} {html.escape(trade['token_symbol'])} for <b>{sol_amount:.4f} SOL</b>\n"
+        message += f"{date} • <a href='https://solscan.io/tx/{trade['signature']}'>View Transaction</a>\n\n"
+
+    navigation = []
+    if trades and trade_ledger.has_trades(user_id, after_id=trades[0]['id']):
+        navigation.append(InlineKeyboardButton("« Newer", callback_data=f"history_newer_{trades[0]['id']}"))
+    if trades and trade_ledger.has_trades(user_id, before_id=trades[-1]['id']):
+        navigation.append(InlineKeyboardButton("Older »", callback_data=f"history_older_{trades[-1]['id']}"))
+    keyboard = [navigation] if navigation else []
+    keyboard.append([InlineKeyboardButton("← Back", callback_data='back_to_main')])
+    reply_markup = InlineKeyboardMarkup(keyboard)
+
+    if query.data.startswith("history_"):
+        await query.message.edit_text(message, reply_markup=reply_markup, parse_mode="HTML", disable_web_page_preview=True)
+    else:
+        await query.message.reply_text(message, reply_markup=reply_markup, parse_mode="HTML", disable_web_page_preview=True)
+
+async def history_button(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    await query.answer()
+
+    _, direction, trade_id = query.data.split('_')
+    if direction == 'older':
+        await history_menu(update, context, before_id=int(trade_id))
+    else:
+        await history_menu(update, context, after_id=int(trade_id))
+
+
+"""-------------------------------"""
+"""          Copy Trade           """
+"""-------------------------------"""
+
+async def copy_trade_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    user = await load_user(update.effective_user.id)
+    follows = user.get('settings', {}).get('copy_trade', {})
+
+    message = "<b>🎯 Copy Trade</b>\n\n"
+    if follows:
+        for leader, follow in follows.items():
+            size = f"{follow['ratio']}% of the leader, max {follow['max_sol']} SOL" if follow.get('ratio') else f"{follow['max_sol']} SOL"
+            message += f"👤 <code>{leader}</code>\nBuys: <b>{size}</b> • Sells: <b>same % as the leader</b>\n\n"
+    else:
+        message += "You are not copying any wallet.\n\n"
+    message += (
+        "Copy a wallet: <code>/copy &lt;wallet&gt; &lt;max SOL per buy&gt; [% of the leader's size]</code>\n"
+        "Stop copying: <code>/uncopy &lt;wallet&gt;</code>"
+    )
+
+    keyboard = [[InlineKeyboardButton(f"❌ Stop {leader[:4]}...{leader[-4:]}", callback_data=f"uncopy_{leader}")] for leader in follows]
+    keyboard.append([InlineKeyboardButton("← Back", callback_data='back_to_main')])
+    await query.message.reply_text(message, reply_markup=InlineKeyboardMarkup(keyboard), parse_mode="HTML")
+
+async def copy_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user_id = str(update.effective_user.id)
+    user = await load_user(user_id)
+    if not user or "settings" not in user:
+        await update.message.reply_text("❌ No settings found for this user.")
+        return
+    if not user["settings"].get('pro_version', False):
+        await update.message.reply_text("This feature is only available for <b>MoonBot Pro</b> members. Use /upgrade.", parse_mode="HTML")
+        return
+    if get_demo_balance(user) is not None:
+        await update.message.reply_text("🎮 Copy trading is not available in demo mode. Disable it in the settings first.")
+        return
+
+    try:
+        leader = str(Pubkey.from_string(context.args[0]))
+        max_sol = float(context.args[1])
+        ratio = float(context.args[2]) if len(context.args) > 2 else None
+        if max_sol <= 0 or (ratio is not None and ratio <= 0):
+            raise ValueError
+    except (IndexError, ValueError):
+        await update.message.reply_text("❌ Usage: /copy <wallet> <max SOL per buy> [% of the leader's size]")
+        return
+    if any(wallet['public_address'] == leader for wallet in user.get("wallets", {}).values()):
+        await update.message.reply_text("❌ You cannot copy your own wallet.")
+        return
+
+    follow = {"max_sol": max_sol, "ratio": ratio}
+    follows = dict(user["settings"].get('copy_trade', {}))
+    follows[leader] = follow
+    await update_settings(user_id, copy_trade=follows)
+    copy_trade_engine.follow(user_id, leader, follow)
+    await update.message.reply_text(f"✅ Copying <code>{leader}</code>", parse_mode="HTML")
+
+async def uncopy(user_id, leader):
+    user = await load_user(user_id)
+    follows = dict(user.get('settings', {}).get('copy_trade', {}))
+    if follows.pop(leader, None) is None:
+        return False
+    await update_settings(user_id, copy_trade=follows)
+    copy_trade_engine.unfollow(user_id, leader)
+    return True
+
+async def uncopy_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not context.args:
+        await update.message.reply_text("❌ Usage: /uncopy <wallet>")
+        return
+    if await uncopy(str(update.effective_user.id), context.args[0]):
+        await update.message.reply_text(f"✅ Stopped copying <code>{context.args[0]}</code>", parse_mode="HTML")
+    else:
+        await update.message.reply_text("❌ You are not copying this wallet.")
+
+async def uncopy_button(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    await query.answer()
+    leader = query.data.replace("uncopy_", "")
+    if await uncopy(str(update.effective_user.id), leader):
+        await query.message.reply_text(f"✅ Stopped copying <code>{leader}</code>", parse_mode="HTML")
+
+def submit_copy_trade(bot, user_id, follow, trade):
+    # Called by the copy trade engine for every follower of a leader trade
+    if trade_queue.submit(user_id, lambda: run_copy_trade(bot, user_id, follow, trade)) is None:
+        print(f"[ERROR] Trade queue full, copy trade {trade.signature} skipped for user {user_id}")
+
+async def run_copy_trade(bot, user_id, follow, trade):
+    size = follower_trade_size(follow, trade)
+    if trade.swap.side == "sell":
+        size = max(1, size)
+    await run_background_trade(bot, user_id, trade.swap.side, trade.swap.amm_id, size, f"🎯 Copy {trade.swap.side}")
+
+async def notify(bot, user_id, message):
+    try:
+        await bot.send_message(chat_id=int(user_id), text=message, parse_mode="HTML")
+    except Exception as e:
+        print(f"[ERROR] Could not notify user {user_id}: {e}")
+
+async def run_background_trade(bot, user_id, side, pair_address, size, label):
+    # Trades started by the bot itself (copy trade, orders), the user gets the result as a message.
+    # size is SOL for a buy, a percentage of the tokens for a sell.
+    user = await load_user(user_id)
+    if not user or not user.get("wallets"):
+        await notify(bot, user_id, f"❌ {label} not executed: no wallet found for this user.")
+        return
+    # Follows and orders made before demo mode was enabled never sign real swaps meanwhile
+    if get_demo_balance(user) is not None:
+        await notify(bot, user_id, f"🎮 {label} skipped: demo mode is enabled.")
+        return
+    wallet_data = next(iter(user["wallets"].values()))
+    private_key = wallet_data['private_key']
+    settings = user.get('settings', {})
+    slippage = get_trade_slippage(user)
+    wsol_mode = settings.get('wsol_mode', EPHEMERAL_WSOL)
+    fee_tier = settings.get('fee_tier', DEFAULT_FEE_TIER)
+
+    try:
+        if side == "buy":
+            result, token_amount, txn_sig = await buy_async(pair_address, private_key, size, slippage, wsol_mode, fee_tier)
+            sol_amount = size
+        else:
+            result, token_amount, sol_amount, txn_sig = await sell_async(pair_address, private_key, size, slippage, wsol_mode, fee_tier)
+        portfolio_cache.invalidate(user_id)
+    except Exception as e:
+        print(f"[ERROR] {label} failed for user {user_id}: {e}")
+        await notify(bot, user_id, f"❌ {label} failed. Please check your wallet balance and slippage.")
+        return
+
+    pool_keys = await get_pool_keys_async(pair_address)
+    mint = str(get_token_mint(pool_keys)) if pool_keys else pair_address
+    token_data = await with_timeout(get_token_data(mint), CARD_MARKET_TIMEOUT, None, "token data")
+    token_symbol = token_data['token_symbol'] if token_data else mint[:6]
+    if result == True:
+        asyncio.create_task(record_swap(user_id, side, pair_address, txn_sig, token_symbol, sol_amount, token_amount))
+        if side == "buy":
+            message = f"{label} executed!\n\nAmount In: <b>-{sol_amount:.4f} SOL</b>\nAmount Out: <b>+{token_amount:.2f} {html.escape(token_symbol)}</b>\n\n"
+        else:
+            message = f"{label} executed!\n\nAmount In: <b>-{token_amount:.2f} {html.escape(token_symbol)}</b>\nAmount Out: <b>+{sol_amount:.4f} SOL</b>\n\n"
+        message += f"<a href='https://solscan.io/tx/{txn_sig}'>View Transaction</a>"
+    elif txn_sig is None:
+        message = f"❌ {label} not executed: no {html.escape(token_symbol)} left to sell."
+    else:
+        message = f"❌ {label} of {html.escape(token_symbol)} failed. Please check your wallet balance and slippage."
+    await notify(bot, user_id, message)
+
+
+"""-------------------------------"""
+"""            Orders             """
+"""-------------------------------"""
+
+ORDER_LABELS = {TAKE_PROFIT: "📈 Take profit", STOP_LOSS: "📉 Stop loss", LIMIT_BUY: "🛒 Limit buy"}
+
+async def orders_menu(update: Update, context: ContextTypes.DEFAULT_TYPE, pair_address=None):
+    # Open orders of the user (of one pool when opened from a token card)
+    orders = order_engine.orders_of(update.effective_user.id, pair_address)
+    message = "<b>🎯 Take Profit / Stop Loss / Limit</b>\n\n"
+    if not orders:
+        message += "No open order.\n\n"
+    for order in orders:
+        amount = f"buy {order.amount} SOL" if order.side == "buy" else f"sell {order.amount:g}%"
+        message += f"#{order.id} {ORDER_LABELS[order.kind]} at <b>{format_price(order.trigger_price)} SOL</b>: {amount}\n<code>{order.pool}</code>\n\n"
+    message += (
+        "Take profit: <code>/tp &lt;pair&gt; &lt;gain %&gt; [sell %]</code>\n"
+        "Stop loss: <code>/sl &lt;pair&gt; &lt;loss %&gt; [sell %]</code>\n"
+        "Limit buy: <code>/limit &lt;pair&gt; &lt;price in SOL&gt; &lt;SOL amount&gt;</code>"
+    )
+    if pair_address:
+        message += f"\n\nPair: <code>{pair_address}</code>"
+
+    keyboard = [[InlineKeyboardButton(f"❌ Cancel #{order.id}", callback_data=f"cancel_order_{order.id}")] for order in orders]
+    keyboard.append([InlineKeyboardButton("← Back", callback_data='back_to_main')])
+    if update.message:
+        await update.message.reply_text(message, reply_markup=InlineKeyboardMarkup(keyboard), parse_mode="HTML")
+    else:
+        await update.callback_query.message.reply_text(message, reply_markup=InlineKeyboardMarkup(keyboard), parse_mode="HTML")
+
+async def orders_button(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    await query.answer()
+    if query.data.startswith("cancel_order_"):
+        if order_engine.cancel(update.effective_user.id, int(query.data.replace("cancel_order_", ""))):
+            await query.message.reply_text("✅ Order cancelled.")
+        else:
+            await query.message.reply_text("❌ Order not found.")
+    else:
+        await orders_menu(update, context, query.data.replace("orders_", ""))
+
+async def orders_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    await orders_menu(update, context)
+
+async def place_order_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    # /tp <pair> <gain %> [sell %], /sl <pair> <loss %> [sell %], /limit <pair> <price> <SOL>
+    command = update.message.text.split()[0].lstrip('/').split('@')[0]
+    usage = {
+        "tp": "/tp <pair> <gain %> [sell %]",
+        "sl": "/sl <pair> <loss %> [sell %]",
+        "limit": "/limit <pair> <price in SOL> <SOL amount>",
+    }[command]
+    try:
+        pair_address = str(Pubkey.from_string(context.args[0]))
+        value = float(context.args[1])
+        if command == "limit":
+            amount = float(context.args[2])
+        else:
+            amount = float(context.args[2]) if len(context.args) > 2 else 100.0
+        if value <= 0 or amount <= 0 or (command != "limit" and amount > 100) or (command == "sl" and value >= 100):
+            raise ValueError
+    except (IndexError, ValueError):
+        await update.message.reply_text(f"❌ Usage: {usage}")
+        return
+
+    # Orders execute later without the user: they need a wallet now and trade real funds only
+    user = await load_user(str(update.effective_user.id))
+    if not user or not user.get("wallets"):
+        await update.message.reply_text("❌ No wallet found for this user.")
+        return
+    if get_demo_balance(user) is not None:
+        await update.message.reply_text("🎮 Orders are not available in demo mode. Disable it in the settings first.")
+        return
+
+    if command == "limit":
+        kind, trigger_price = LIMIT_BUY, value
+    else:
+        price = await order_engine.current_price(pair_address)
+        if price is None:
+            await update.message.reply_text("❌ Could not read the price of this pool.")
+            return
+        kind = TAKE_PROFIT if command == "tp" else STOP_LOSS
+        trigger_price = price * (1 + value / 100) if command == "tp" else price * (1 - value / 100)
+
+    order = order_engine.place(update.effective_user.id, pair_address, kind, trigger_price, amount)
+    await update.message.reply_text(f"✅ Order #{order.id} placed: {ORDER_LABELS[kind]} at <b>{format_price(trigger_price)} SOL</b>", parse_mode="HTML")
+
+def submit_order(bot, order, price):
+    # Called by the order engine for every crossed order
+    label = ORDER_LABELS[order.kind]
+    if trade_queue.submit(order.user_id, lambda: run_background_trade(bot, order.user_id, order.side, order.pool, order.amount, label)) is None:
+        print(f"[ERROR] Trade queue full, order {order.id} of user {order.user_id} not executed")
+
+
+"""-------------------------------"""
+"""              DCA              """
+"""-------------------------------"""
+
+async def dca_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    schedules = dca_scheduler.schedules_of(update.effective_user.id)
+    message = "<b>🔁 DCA</b>\n\n"
+    if not schedules:
+        message += "No recurring buy.\n\n"
+    for schedule in schedules:
+        runs = "until cancelled" if schedule.runs_left is None else f"{schedule.runs_left} buys left"
+        next_run = time.strftime("%Y-%m-%d %H:%M UTC", time.gmtime(schedule.next_run))
+        message += (
+            f"#{schedule.id} <b>{schedule.sol_amount} SOL</b> every {format_interval(schedule.interval_seconds)} ({runs})\n"
+            f"<code>{schedule.pool}</code>\nNext buy: {next_run}\n\n"
+        )
+    message += "Add a recurring buy: <code>/dca &lt;pair&gt; &lt;SOL amount&gt; &lt;interval: 30m, 4h, 1d&gt; [number of buys]</code>"
+
+    keyboard = [[InlineKeyboardButton(f"❌ Cancel #{schedule.id}", callback_data=f"cancel_dca_{schedule.id}")] for schedule in schedules]
+    keyboard.append([InlineKeyboardButton("← Back", callback_data='back_to_main')])
+    await update.message.reply_text(message, reply_markup=InlineKeyboardMarkup(keyboard), parse_mode="HTML")
+
+async def dca_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    # /dca lists the schedules, /dca <pair> <SOL amount> <interval> [number of buys] adds one
+    if not context.args:
+        await dca_menu(update, context)
+        return
+    try:
+        pair_address = str(Pubkey.from_string(context.args[0]))
+        sol_amount = float(context.args[1])
+        interval_seconds = parse_interval(context.args[2])
+        runs = int(context.args[3]) if len(context.args) > 3 else None
+        if sol_amount <= 0 or interval_seconds is None or (runs is not None and runs <= 0):
+            raise ValueError
+    except (IndexError, ValueError):
+        await update.message.reply_text("❌ Usage: /dca <pair> <SOL amount> <interval: 30m, 4h, 1d> [number of buys]")
+        return
+
+    user = await load_user(update.effective_user.id)
+    if not user or not user.get("wallets"):
+        await update.message.reply_text("❌ Please create or import a wallet first.")
+        return
+    if get_demo_balance(user) is not None:
+        await update.message.reply_text("🎮 DCA is not available in demo mode. Disable it in the settings first.")
+        return
+    if await get_pool_keys_async(pair_address) is None:
+        await update.message.reply_text("❌ No Raydium AMM v4 pool found at this address.")
+        return
+
+    schedule = dca_scheduler.add(update.effective_user.id, pair_address, sol_amount, interval_seconds, runs)
+    await update.message.reply_text(
+        f"✅ DCA #{schedule.id}: <b>{sol_amount} SOL</b> every {format_interval(interval_seconds)}, first buy in {format_interval(interval_seconds)}.",
+        parse_mode="HTML",
+    )
+
+async def cancel_dca_button(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    await query.answer()
+    if dca_scheduler.cancel(update.effective_user.id, int(query.data.replace("cancel_dca_", ""))):
+        await query.message.reply_text("✅ DCA cancelled.")
+    else:
+        await query.message.reply_text("❌ DCA not found.")
+
+async def dca_buyer(user_id):
+    # None skips the buy, the schedule keeps running
+    user = await load_user(user_id)
+    if not user or not user.get("wallets") or get_demo_balance(user) is not None:
+        return None
+    wallet_data = next(iter(user["wallets"].values()))
+    settings = user.get('settings', {})
+    return DcaBuyer(
+        Keypair.from_base58_string(wallet_data['private_key']), get_trade_slippage(user),
+        settings.get('wsol_mode', EPHEMERAL_WSOL), settings.get('fee_tier', DEFAULT_FEE_TIER),
+    )
+
+async def dca_done(bot, schedule, result, amount_out, txn_sig):
+    portfolio_cache.invalidate(schedule.user_id)
+    if result == True:
+        pool_keys = await get_pool_keys_async(schedule.pool)
+        mint = str(get_token_mint(pool_keys)) if pool_keys else schedule.pool
+        token_data = await with_timeout(get_token_data(mint), CARD_MARKET_TIMEOUT, None, "token data")
+        token_symbol = token_data['token_symbol'] if token_data else mint[:6]
+        asyncio.create_task(record_swap(schedule.user_id, "buy", schedule.pool, txn_sig, token_symbol, schedule.sol_amount, amount_out))
+        message = (
+            f"🔁 DCA #{schedule.id} buy executed!\n\n"
+            f"Amount In: <b>-{schedule.sol_amount:.4f} SOL</b>\nAmount Out: <b>+{amount_out:.2f} {html.escape(token_symbol)}</b>\n\n"
+            f"<a href='https://solscan.io/tx/{txn_sig}'>View Transaction</a>"
+        )
+    else:
+        message = f"❌ DCA #{schedule.id} buy failed. Please check your wallet balance and slippage, the next buy is still scheduled."
+    if schedule.runs_left == 1:
+        message += f"\n\nDCA #{schedule.id} is complete."
+    try:
+        await bot.send_message(chat_id=int(schedule.user_id), text=message, parse_mode="HTML")
+    except Exception as e:
+        print(f"[ERROR] Could not notify user {schedule.user_id}: {e}")
+
+
+"""-------------------------------"""
+"""            Sniper             """
+"""-------------------------------"""
+
+async def sniper_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    user = await load_user(update.effective_user.id)
+    snipes = user.get('settings', {}).get('snipe', {})
+
+    message = "<b>🔫 Sniper</b>\n\n"
+    if snipes:
+        for mint, snipe in snipes.items():
+            message += f"🎯 <code>{mint}</code>\nBuy: <b>{snipe['sol_amount']} SOL</b> as soon as its Raydium pool opens\n\n"
+    else:
+        message += "No token armed.\n\n"
+    message += (
+        "Arm a token: <code>/snipe &lt;token address&gt; &lt;SOL amount&gt;</code>\n"
+        "Disarm: <code>/unsnipe &lt;token address&gt;</code>\n"
+        "Your slippage, WSOL mode and priority fee settings at arming time are used."
+    )
+
+    keyboard = [[InlineKeyboardButton(f"❌ Disarm {mint[:4]}...{mint[-4:]}", callback_data=f"unsnipe_{mint}")] for mint in snipes]
+    keyboard.append([InlineKeyboardButton("← Back", callback_data='back_to_main')])
+    await query.message.reply_text(message, reply_markup=InlineKeyboardMarkup(keyboard), parse_mode="HTML")
+
+async def snipe_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user_id = str(update.effective_user.id)
+    user = await load_user(user_id)
+    if not user or "settings" not in user:
+        await update.message.reply_text("❌ No settings found for this user.")
+        return
+    if not user["settings"].get('pro_version', False):
+        await update.message.reply_text("This feature is only available for <b>MoonBot Pro</b> members. Use /upgrade.", parse_mode="HTML")
+        return
+    if not user.get("wallets"):
+        await update.message.reply_text("❌ No wallet found for this user.")
+        return
+    if get_demo_balance(user) is not None:
+        await update.message.reply_text("🎮 Snipes are not available in demo mode. Disable it in the settings first.")
+        return
+
+    try:
+        mint = str(Pubkey.from_string(context.args[0]))
+        sol_amount = float(context.args[1])
+        if sol_amount <= 0:
+            raise ValueError
+    except (IndexError, ValueError):
+        await update.message.reply_text("❌ Usage: /snipe <token address> <SOL amount>")
+        return
+
+    snipes = dict(user["settings"].get('snipe', {}))
+    snipes[mint] = {"sol_amount": sol_amount}
+    await update_settings(user_id, snipe=snipes)
+    settings = user["settings"]
+    sniper_engine.arm(
+        user_id, mint, sol_amount, next(iter(user["wallets"].values()))['private_key'], get_trade_slippage(user),
+        settings.get('wsol_mode', EPHEMERAL_WSOL), settings.get('fee_tier', DEFAULT_FEE_TIER),
+    )
+    await update.message.reply_text(f"✅ Armed: <b>{sol_amount} SOL</b> on <code>{mint}</code>", parse_mode="HTML")
+
+async def unsnipe(user_id, mint):
+    user = await load_user(user_id)
+    snipes = dict(user.get('settings', {}).get('snipe', {}))
+    if snipes.pop(mint, None) is None:
+        return False
+    await update_settings(user_id, snipe=snipes)
+    sniper_engine.disarm(user_id, mint)
+    return True
+
+async def unsnipe_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not context.args:
+        await update.message.reply_text("❌ Usage: /unsnipe <token address>")
+        return
+    if await unsnipe(str(update.effective_user.id), context.args[0]):
+        await update.message.reply_text(f"✅ Disarmed <code>{context.args[0]}</code>", parse_mode="HTML")
+    else:
+        await update.message.reply_text("❌ This token is not armed.")
+
+async def unsnipe_button(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    await query.answer()
+    mint = query.data.replace("unsnipe_", "")
+    if await unsnipe(str(update.effective_user.id), mint):
+        await query.message.reply_text(f"✅ Disarmed <code>{mint}</code>", parse_mode="HTML")
+
+def fire_snipe(bot, target, new_pool):
+    # Called by the sniper for every armed target of a new pool, sent right away
+    asyncio.create_task(run_snipe(bot, target, new_pool))
+
+async def run_snipe(bot, target, new_pool):
+    user_id = target.user_id
+    if get_demo_balance(await load_user(user_id)) is not None:
+        # Armed before demo mode was enabled: never sent
+        result, amount_out, txn_sig = None, 0, ""
+    else:
+        try:
+            result, amount_out, txn_sig = await buy_with_state_async(
+                new_pool.amm_id, target.payer, swap_state_for(target, new_pool), target.sol_amount, target.slippage,
+                target.wsol_mode, target.fee_tier, on_sent=lambda _: snipe_latency.record(time.monotonic() - new_pool.detected_at),
+            )
+        except Exception as e:
+            print(f"[ERROR] Snipe failed for user {user_id}: {e}")
+            result, amount_out, txn_sig = False, 0, ""
+
+    # A target fires once, whatever the result
+    user = await load_user(user_id)
+    snipes = dict(user.get('settings', {}).get('snipe', {}))
+    if snipes.pop(new_pool.mint, None) is not None:
+        await update_settings(user_id, snipe=snipes)
+    portfolio_cache.invalidate(user_id)
+
+    if result == True:
+        asyncio.create_task(record_swap(user_id, "buy", new_pool.amm_id, txn_sig, new_pool.mint[:6], target.sol_amount, amount_out))
+        message = (
+            f"🔫 Snipe executed!\n\n"
+            f"Pool: <code>{new_pool.amm_id}</code>\n"
+            f"Amount In: <b>-{target.sol_amount} SOL</b>\n"
+            f"Amount Out: <b>+{amount_out:.2f}</b> <code>{new_pool.mint}</code>\n\n"
+            f"<a href='https://solscan.io/tx/{txn_sig}'>View Transaction</a>"
+        )
+    elif result is None:
+        message = f"🎮 Snipe of <code>{new_pool.mint}</code> skipped: demo mode is enabled."
+    else:
+        message = f"❌ Snipe of <code>{new_pool.mint}</code> failed. Please check your wallet balance and slippage."
+    try:
+        await bot.send_message(chat_id=int(user_id), text=message, parse_mode="HTML")
+    except Exception as e:
+        print(f"[ERROR] Could not notify user {user_id} of a snipe: {e}")
 
 
 """------------------------------"""
@@ -1000,17 +1664,13 @@ async def settings_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await query.answer()
 
     user_id = str(update.effective_user.id)
-    wallets = await load_wallets()
-    if not wallets:
-        await query.message.reply_text("❌ No wallets file found or it is corrupted.")
-        return
-
-    if user_id not in wallets or "wallets" not in wallets[user_id] or "settings" not in wallets[user_id]:
+    user = await load_user(user_id)
+    if not user or "wallets" not in user or "settings" not in user:
         await query.message.reply_text("❌ No wallet or settings found for this user.")
         return
 
-    user_wallets = wallets[user_id]["wallets"]
-    user_settings = wallets[user_id]["settings"]
+    user_wallets = user["wallets"]
+    user_settings = user["settings"]
 
     if not user_wallets:
         public_address = "No wallet found for this user"
@@ -1024,6 +1684,11 @@ async def settings_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
     usd_balance = sol_balance * sol_price
     auto_slippage_status = user_settings.get('auto_slippage', 'disabled')
     slippage_display = "Auto Slippage Enabled" if auto_slippage_status == "enabled" else f"{user_settings.get('slippage', 2)}%"
+    fee_tier = user_settings.get('fee_tier', DEFAULT_FEE_TIER)
+    fee_tier_display = f"{fee_tier.capitalize()} (p{FEE_TIERS.get(fee_tier, FEE_TIERS[DEFAULT_FEE_TIER])})"
+    wsol_display = "Kept wrapped" if user_settings.get('wsol_mode', EPHEMERAL_WSOL) == PERSISTENT_WSOL else "Wrapped per trade"
+    demo_balance = get_demo_balance(user)
+    demo_display = f"Demo mode: <b>On ({demo_balance['sol'] / 1e9:.4f} SOL)</b>\n" if demo_balance is not None else ""
     pro_version = user_settings.get('pro_version', False)
     user_pack = "Pro" if pro_version else "Free"
     reward_sol = user_settings.get('reward', 0)
@@ -1038,6 +1703,9 @@ async def settings_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
         f"<b>Wallet Address:</b> <code>{public_address}</code>\n\n"
         f"Balance: <b>{sol_balance:.4f}</b> SOL (${usd_balance:.2f})\n"
         f"Slippage: <b>{slippage_display}</b>\n"
+        f"WSOL: <b>{wsol_display}</b>\n"
+        f"Priority fee: <b>{fee_tier_display}</b>\n"
+        f"{demo_display}"
         f"Total trades: <b>{trades_count}</b>\n\n"
         f"🔗 You Referral Code: <code>{referral_code}</code>\n"
         f"👥 Affiliated Friends: <b>{referral_count}</b>\n\n"
@@ -1053,6 +1721,10 @@ async def settings_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
             InlineKeyboardButton("✏️ Set Slippage", callback_data='set_slippage'),
             InlineKeyboardButton("🔄 Auto Slippage", callback_data='auto_slippage')
         ],
+        [
+            InlineKeyboardButton("💧 WSOL Mode", callback_data='wsol_mode'),
+            InlineKeyboardButton("⚡ Priority Fee", callback_data='fee_tier')
+        ],
         [
             InlineKeyboardButton("----- Referral-----", callback_data='notbutton2')
         ],
@@ -1067,7 +1739,7 @@ async def settings_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
             InlineKeyboardButton("----- Info -----", callback_data='notbutton3')
         ],
         [
-            InlineKeyboardButton("🔜 Demo Mode", callback_data='demo_mode'),
+            InlineKeyboardButton("🎮 Demo Mode", callback_data='demo_mode'),
             InlineKeyboardButton("🛟 Help", callback_data='help')
 
         ],
@@ -1087,6 +1759,10 @@ async def settings_button(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await set_slippage(update, context)
     elif query.data == 'auto_slippage':
         await auto_slippage(update, context) 
+    elif query.data == 'wsol_mode':
+        await wsol_mode(update, context)
+    elif query.data == 'fee_tier':
+        await fee_tier(update, context)
     elif query.data == 'referral':
         await referral(update, context)
     elif query.data == 'claim_sol':
@@ -1098,11 +1774,9 @@ async def settings_button(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await asyncio.sleep(5)
         await sent_message.delete()
     elif query.data == 'demo_mode':
-        sent_message = await query.message.reply_text("Demo Mode is currently under development and will be available in the next update.")
-        await asyncio.sleep(5)
-        await sent_message.delete()
+        await demo_mode(update, context)
     elif query.data == 'help':
-        sent_message = await query.message.reply_text("Here you can configure your bot settings to suit your trading preferences.\n\n✏️ <b>Set Slippage</b>: Adjust the slippage tolerance for your trades. Slippage is the difference between the expected price and the actual execution price.\n\n🔄 <b>Auto Slippage</b>: Enable or disable automatic slippage adjustment based on market conditions.\n\n👥 <b>Referral code</b>: Enter your friend referral code to earn a reward.\n\n🎁 <b>Claim SOL</b>: Earn Solana based on the number of trades you make with MoonBot and the people you refer.\n\n💸 <b>Gift code</b>: Enter the gift code given to you by the MoonBot team to claim your rewards.\n\n🔜 <b>Demo Mode</b>: Switch to demo mode to practice trading without risking real funds.", parse_mode="HTML")
+        sent_message = await query.message.reply_text("Here you can configure your bot settings to suit your trading preferences.\n\n✏️ <b>Set Slippage</b>: Adjust the slippage tolerance for your trades. Slippage is the difference between the expected price and the actual execution price.\n\n🔄 <b>Auto Slippage</b>: Enable or disable automatic slippage adjustment based on market conditions.\n\n💧 <b>WSOL Mode</b>: Keep your SOL wrapped between trades for smaller and cheaper transactions, or wrap it for each trade.\n\n⚡ <b>Priority Fee</b>: Choose how fast your trades land. Normal, Fast and Turbo pay the median, 75th and 95th percentile of the fees recently paid on the pool.\n\n👥 <b>Referral code</b>: Enter your friend referral code to earn a reward.\n\n🎁 <b>Claim SOL</b>: Earn Solana based on the number of trades you make with MoonBot and the people you refer.\n\n💸 <b>Gift code</b>: Enter the gift code given to you by the MoonBot team to claim your rewards.\n\n🎮 <b>Demo Mode</b>: Switch to demo mode to practice trading with virtual SOL, on a simulation of the real pools, without risking real funds.", parse_mode="HTML")
         await asyncio.sleep(25)
         await sent_message.delete()
     elif query.data == 'back_to_main':
@@ -1113,15 +1787,10 @@ async def set_slippage(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await query.answer()
 
     user_id = str(update.effective_user.id)
-    wallets = await load_wallets()
-    if not wallets:
-        await query.message.reply_text("❌ No wallets file found or it is corrupted.")
+    if not await update_settings(user_id, auto_slippage='disabled'):
+        await query.message.reply_text("❌ User settings not found.")
         return
 
-    if user_id in wallets and 'settings' in wallets[user_id]:
-        wallets[user_id]['settings']['auto_slippage'] = 'disabled'
-
-    await save_wallets(wallets)
     context.user_data['awaiting_slippage'] = True
     await query.message.reply_text("Please enter the new slippage percentage (e.g., 2 for 2%):")
     
@@ -1136,13 +1805,7 @@ async def process_slippage(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 await update.message.reply_text("❌ Slippage must be between 0 and 100.")
                 return
 
-            wallets = await load_wallets()
-            if user_id in wallets and 'settings' in wallets[user_id]:
-                wallets[user_id]['settings']['slippage'] = slippage
-                wallets[user_id]['settings']['auto_slippage'] = 'disabled'  
-
-                await save_wallets(wallets)
-
+            if await update_settings(user_id, slippage=slippage, auto_slippage='disabled'):
                 await update.message.reply_text(f"✅ Slippage set to {slippage}%")
                 await settings_menu(update, context) 
             else:
@@ -1159,36 +1822,97 @@ async def auto_slippage(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await query.answer()
 
     user_id = str(update.effective_user.id)
-    wallets = await load_wallets()
-    if not wallets:
-        await query.message.reply_text("❌ No wallets file found or it is corrupted.")
-        return
+    user = await load_user(user_id)
     
-    if user_id in wallets and 'settings' in wallets[user_id]:
-        if wallets[user_id]['settings']['auto_slippage'] == "disabled":
-            wallets[user_id]['settings']['auto_slippage'] = "enabled"
-            wallets[user_id]['settings']['slippage'] = 3.0  # For the moment it's not auto, we put the default slippage to 3
+    if user and 'settings' in user:
+        if user['settings'].get('auto_slippage', 'disabled') == "disabled":
+            # The manual slippage is kept for when auto slippage gets disabled
+            await update_settings(user_id, auto_slippage="enabled")
             message = "✅ Auto Slippage enabled"
         else:
-            wallets[user_id]['settings']['auto_slippage'] = "disabled"
+            await update_settings(user_id, auto_slippage="disabled")
             message = "✅ Auto Slippage disabled"
 
-        await save_wallets(wallets)
         await query.message.reply_text(message)
         await settings_menu(update, context)
     else:
         await query.message.reply_text("❌ User settings not found.")
 
+async def wsol_mode(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    await query.answer()
+
+    user_id = str(update.effective_user.id)
+    user = await load_user(user_id)
+
+    if user and 'settings' in user:
+        # Persistent mode keeps a WSOL account open, the SOL received from sells stays wrapped
+        if user['settings'].get('wsol_mode', EPHEMERAL_WSOL) == EPHEMERAL_WSOL:
+            await update_settings(user_id, wsol_mode=PERSISTENT_WSOL)
+            message = "✅ WSOL will be kept wrapped between trades"
+        else:
+            await update_settings(user_id, wsol_mode=EPHEMERAL_WSOL)
+            message = "✅ WSOL will be wrapped for each trade"
+
+        await query.message.reply_text(message)
+        await settings_menu(update, context)
+    else:
+        await query.message.reply_text("❌ User settings not found.")
+
+async def demo_mode(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    await query.answer()
+
+    user_id = str(update.effective_user.id)
+    user = await load_user(user_id)
+
+    if user and 'settings' in user:
+        # The virtual wallet is kept when demo mode gets disabled
+        if user['settings'].get('demo_mode', 'disabled') == 'disabled':
+            demo_balance = user['settings'].get('demo_balance') or new_demo_balance()
+            await update_settings(user_id, demo_mode='enabled', demo_balance=demo_balance)
+            message = (
+                f"🎮 Demo mode enabled, you trade with {demo_balance['sol'] / 1e9:.4f} virtual SOL\n"
+                "Copy trades, orders, DCA buys and snipes are paused until it is disabled"
+            )
+        else:
+            await update_settings(user_id, demo_mode='disabled')
+            message = "✅ Demo mode disabled, your trades use your wallet again"
+
+        await query.message.reply_text(message)
+        await settings_menu(update, context)
+    else:
+        await query.message.reply_text("❌ User settings not found.")
+
+async def fee_tier(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    await query.answer()
+
+    user_id = str(update.effective_user.id)
+    user = await load_user(user_id)
+
+    if user and 'settings' in user:
+        # Cycle normal -> fast -> turbo -> normal
+        tiers = list(FEE_TIERS)
+        current = user['settings'].get('fee_tier', DEFAULT_FEE_TIER)
+        next_tier = tiers[(tiers.index(current) + 1) % len(tiers)] if current in tiers else DEFAULT_FEE_TIER
+        await update_settings(user_id, fee_tier=next_tier)
+
+        await query.message.reply_text(f"✅ Priority fee set to {next_tier.capitalize()}")
+        await settings_menu(update, context)
+    else:
+        await query.message.reply_text("❌ User settings not found.")
+
 async def referral(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
     user_id = str(update.effective_user.id)
-    wallets = await load_wallets()
-    if not wallets:
-        await query.message.reply_text("❌ No wallets file found or it is corrupted.")
+    user = await load_user(user_id)
+    if not user:
+        await query.message.reply_text("❌ No settings found for this user.")
         return
     
-    if user_id in wallets and "settings" in wallets[user_id] and "friend_code" in wallets[user_id]["settings"]:
+    if "friend_code" in user.get("settings", {}):
         sent_message = await query.message.reply_text("❌ You have already entered a referral code.")
         await asyncio.sleep(5)
         await sent_message.delete()
@@ -1201,9 +1925,9 @@ async def referral(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def process_referral_code(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = str(update.effective_user.id)
     referral_code = update.message.text.strip()
-    wallets = await load_wallets()
-    if not wallets:
-        await update.message.reply_text("❌ No wallets file found or it is corrupted.")
+    user = await load_user(user_id)
+    if not user or "settings" not in user:
+        await update.message.reply_text("❌ No settings found for this user.")
         return
 
     if referral_code == user_id:
@@ -1212,25 +1936,21 @@ async def process_referral_code(update: Update, context: ContextTypes.DEFAULT_TY
         await sent_message.delete()
         return
     
-    if user_id in wallets and "settings" in wallets[user_id] and "friend_code" in wallets[user_id]["settings"]:
+    if "friend_code" in user["settings"]:
         sent_message = await update.message.reply_text("❌ You have already entered a referral code.")
         await asyncio.sleep(5)
         await sent_message.delete()
         return
 
-    if referral_code not in wallets:
+    if not await user_exists(referral_code):
         sent_message = await update.message.reply_text("❌ Invalid referral code. Please check the code and try again.")
         await asyncio.sleep(5)
         await sent_message.delete()
         return
     
-    wallets[user_id]["settings"]["friend_code"] = referral_code
-    if "referral" in wallets[referral_code]["settings"]:
-        wallets[referral_code]["settings"]["referral"] += 1
-    else:
-        wallets[referral_code]["settings"]["referral"] = 1
+    await update_settings(user_id, friend_code=referral_code)
+    await increment_setting(referral_code, "referral", 1)
 
-    await save_wallets(wallets)
     sent_message = await update.message.reply_text(f"✅ Referral code {referral_code} successfully added!")
     await asyncio.sleep(5)
     await sent_message.delete()
@@ -1251,18 +1971,17 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         message = update.message
 
     user_id = str(update.effective_user.id)
-    wallets = await load_wallets()
-    if not wallets:
-        wallets = {}
-
-    if user_id not in wallets:
-        wallets[user_id] = {"wallets": {}}
+    user = await load_user(user_id)
+    if not user:
+        user = {"wallets": {}}
     
     # Default parameters for all users
-    if 'settings' not in wallets[user_id]:
-        wallets[user_id]['settings'] = {
+    if 'settings' not in user:
+        user['settings'] = {
             'slippage': 2,  
             'auto_slippage': 'disabled',
+            'wsol_mode': EPHEMERAL_WSOL,
+            'fee_tier': DEFAULT_FEE_TIER,
             'language': 'en',  
             'referral_code': user_id,  
             'pro_version': False,
@@ -1271,7 +1990,7 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
             'referral':0
         }
 
-        await save_wallets(wallets)
+        await save_user(user_id, user)
 
     image_path = os.path.join(os.getcwd(), "images", "image.jpeg") 
     intro_message = """
@@ -1315,16 +2034,12 @@ async def button(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
     user_id = str(update.effective_user.id)
-    wallets = await load_wallets()
-    if not wallets:
-        await query.message.reply_text("❌ No data file found or it is corrupted.")
-        return
-
-    if user_id not in wallets or "settings" not in wallets[user_id]:
+    user = await load_user(user_id)
+    if not user or "settings" not in user:
         await query.message.reply_text("❌ No settings found for this user.")
         return
 
-    user_settings = wallets[user_id]["settings"]
+    user_settings = user["settings"]
     pro_version = user_settings.get('pro_version', False)
 
     if query.data == 'wallet':
@@ -1337,6 +2052,8 @@ async def button(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await settings_menu(update, context)
     elif query.data == 'assets':
         await assets_menu(update, context) 
+    elif query.data == 'history':
+        await history_menu(update, context)
     elif query.data in ['sniper', 'copytrade', 'aitrading']:
         if not pro_version:
             pro_message = (
@@ -1350,6 +2067,10 @@ async def button(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 "To upgrade to MoonBot Pro, use the command /upgrade."
             )
             await query.message.reply_text(pro_message, parse_mode="HTML")
+        elif query.data == 'copytrade':
+            await copy_trade_menu(update, context)
+        elif query.data == 'sniper':
+            await sniper_menu(update, context)
         else:
             await query.message.reply_text("🛠️ This feature is under development.", parse_mode="HTML")
     elif query.data == 'languages':
@@ -1358,22 +2079,15 @@ async def button(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def upgrade(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = str(update.effective_user.id)
-    wallets = await load_wallets()
-    if not wallets:
-        if update.message:
-            await update.message.reply_text("❌ No wallets file found or it is corrupted.")
-        else:
-            await update.callback_query.message.reply_text("❌ No wallets file found or it is corrupted.")
-        return
-
-    if user_id not in wallets or "settings" not in wallets[user_id]:
+    user = await load_user(user_id)
+    if not user or "settings" not in user:
         if update.message:
             await update.message.reply_text("❌ No settings found for this user.")
         else:
             await update.callback_query.message.reply_text("❌ No settings found for this user.")
         return
 
-    user_settings = wallets[user_id]["settings"]
+    user_settings = user["settings"]
     pro_version = user_settings.get('pro_version', False)
 
     if pro_version:
@@ -1398,30 +2112,94 @@ async def upgrade(update: Update, context: ContextTypes.DEFAULT_TYPE):
 """            Main              """
 """------------------------------"""
 
-async def load_wallets():
-    try:
-        with open(WALLETS_FILE, "r") as file:
-            return json.load(file)
-    except (FileNotFoundError, json.JSONDecodeError):
-        return {}
-
-async def save_wallets(wallets):
-    with open(WALLETS_FILE, "w") as file:
-        json.dump(wallets, file, indent=4)
-
+async def load_user(user_id):
+    return user_store.get(str(user_id))
+
+async def save_user(user_id, user_data):
+    user_store.put(str(user_id), user_data)
+
+async def user_exists(user_id):
+    return user_store.exists(str(user_id))
+
+async def update_settings(user_id, **fields):
+    return user_store.update_settings(str(user_id), **fields)
+
+async def increment_setting(user_id, key, delta=1):
+    return user_store.increment_setting(str(user_id), key, delta)
+
+async def add_wallet(user_id, wallet_type, wallet):
+    return user_store.add_wallet(str(user_id), wallet_type, wallet)
+
+async def remove_wallet(user_id, wallet_type):
+    return user_store.remove_wallet(str(user_id), wallet_type)
+
+def migrate_legacy_users():
+    # First start on the SQLite backend: import the old users.json once
+    if USER_STORE_BACKEND == "sqlite" and user_store.count() == 0 and os.path.exists(WALLETS_FILE):
+        migrated = migrate_json_to_sqlite(WALLETS_FILE, USER_STORE_PATH)
+        if migrated:
+            print(f"Migrated {migrated} users from {WALLETS_FILE} to {USER_STORE_PATH}")
+
+
+async def on_startup(application):
+    await init_clients()
+    pool_keys_cache.load()
+    pool_index.load()
+    pool_index.start()
+    blockhash_service.start()
+    priority_fee_estimator.start()
+    auto_slippage_engine.start()
+    sol_price_service.start()
+    users = user_store.all()
+    copy_trade_engine.load(users)
+    sniper_engine.load(users)
+    order_engine.load()
+    dca_scheduler.load()
+    copy_trade_engine.start(lambda user_id, follow, trade: submit_copy_trade(application.bot, user_id, follow, trade))
+    sniper_engine.start(lambda target, new_pool: fire_snipe(application.bot, target, new_pool))
+    order_engine.start(lambda order, price: submit_order(application.bot, order, price))
+    dca_scheduler.start(dca_buyer, lambda schedule, result, amount_out, txn_sig: dca_done(application.bot, schedule, result, amount_out, txn_sig))
+
+async def on_shutdown(application):
+    await blockhash_service.stop()
+    await confirmation_service.stop()
+    await priority_fee_estimator.stop()
+    await auto_slippage_engine.stop()
+    await sol_price_service.stop()
+    await copy_trade_engine.stop()
+    await sniper_engine.stop()
+    await order_engine.stop()
+    await dca_scheduler.stop()
+    await pool_index.stop()
+    pool_keys_cache.save()
+    pool_index.save()
+    await close_clients()
 
 def main():
-    application = Application.builder().token(TOKEN).build()
+    migrate_legacy_users()
+    application = Application.builder().token(TOKEN).post_init(on_startup).post_shutdown(on_shutdown).build()
 
     application.add_handler(CommandHandler("start", start))
     application.add_handler(CommandHandler("upgrade", upgrade))
     application.add_handler(CommandHandler("wallet", display_wallet))
+    application.add_handler(CommandHandler("copy", copy_command))
+    application.add_handler(CommandHandler("uncopy", uncopy_command))
+    application.add_handler(CommandHandler("snipe", snipe_command))
+    application.add_handler(CommandHandler("unsnipe", unsnipe_command))
+    application.add_handler(CommandHandler(["tp", "sl", "limit"], place_order_command))
+    application.add_handler(CommandHandler("orders", orders_command))
+    application.add_handler(CommandHandler("dca", dca_command))
     application.add_handler(CallbackQueryHandler(button, pattern="^(buyorsell|wallet|assets|history|sniper|copytrade|aitrading|moonbotpro|languages|settings)$"))
     application.add_handler(CallbackQueryHandler(wallet_action, pattern="^(create_wallet|import_wallet|delete_wallet|back_to_main|getPrivate_.*)$"))
     application.add_handler(CallbackQueryHandler(confirm_delete_wallet, pattern="^delete_.*$"))
     application.add_handler(CallbackQueryHandler(handle_buy_sell, pattern="^(buy_.*|sell_.*)$")) 
     application.add_handler(CallbackQueryHandler(button_assets, pattern="^(back_to_main|refresh_assets)$"))
-    application.add_handler(CallbackQueryHandler(settings_button, pattern="^(set_slippage|auto_slippage|referral|claim_sol|gift|demo_mode|help|back_to_main)$")) 
+    application.add_handler(CallbackQueryHandler(history_button, pattern="^history_(older|newer)_[0-9]+$"))
+    application.add_handler(CallbackQueryHandler(uncopy_button, pattern="^uncopy_[A-Za-z0-9]{32,44}$"))
+    application.add_handler(CallbackQueryHandler(unsnipe_button, pattern="^unsnipe_[A-Za-z0-9]{32,44}$"))
+    application.add_handler(CallbackQueryHandler(orders_button, pattern="^(orders_[A-Za-z0-9]{32,44}|cancel_order_[0-9]+)$"))
+    application.add_handler(CallbackQueryHandler(cancel_dca_button, pattern="^cancel_dca_[0-9]+$"))
+    application.add_handler(CallbackQueryHandler(settings_button, pattern="^(set_slippage|auto_slippage|wsol_mode|fee_tier|referral|claim_sol|gift|demo_mode|help|back_to_main)$")) 
 
 
     application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND & filters.Regex(r'^[A-Za-z0-9]{32,}$'), process_token_address))
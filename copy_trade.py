@@ -0,0 +1,326 @@
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+from dataclasses import dataclass
+
+import base58
+
+from raydiumFolder.raydium_py.raydium.constants import RAYDIUM_AMM_V4, WSOL
+from raydiumFolder.raydium_py.utils.clients import rpc_request
+from raydiumFolder.raydium_py.utils.txn_parser import AmmV4Swap, decode_amm_v4_swaps, fetch_transaction
+from metrics import LatencyTracker
+
+"""---------------------------------"""
+"""           Copy Trade            """
+"""---------------------------------"""
+
+# Each leader wallet is polled once per tick with an incremental getSignaturesForAddress
+# cursor ("until" the last signature seen), whatever the number of followers, paged
+# backwards with "before" when a leader made more transactions than one page. New
+# transactions are decoded for Raydium AMM v4 swaps signed by the leader and every
+# swap is handed to on_trade once per follower. Signatures whose transaction could not
+# be read are retried on the next ticks. The first poll of a leader only sets the
+# cursor: trades made before the follow are never copied.
+
+COPY_TRADE_POLL_SECONDS = float(os.getenv("COPY_TRADE_POLL_SECONDS", "1"))
+COPY_TRADE_MAX_AGE_SECONDS = 30
+COPY_TRADE_SIGNATURES_LIMIT = 50
+COPY_TRADE_MAX_PAGES = 10
+COPY_TRADE_MAX_RETRIES = 5
+COPY_TRADE_MAX_CONCURRENT_REQUESTS = 20
+TRANSACTION_FETCH_ATTEMPTS = 3
+
+
+@dataclass
+class LeaderTrade:
+    leader: str
+    signature: str
+    swap: AmmV4Swap
+    seen_at: float    # time.monotonic() when the poll found it
+
+
+def follower_trade_size(follow: dict, trade: LeaderTrade) -> float:
+    # SOL to spend on a buy, percentage of the follower's tokens on a sell.
+    # follow = {"max_sol": SOL per buy, "ratio": % of the leader's SOL or None for a fixed size}
+    if trade.swap.side == "buy":
+        if follow.get("ratio"):
+            return min(follow["max_sol"], trade.swap.sol_amount / 1e9 * follow["ratio"] / 100)
+        return follow["max_sol"]
+    return trade.swap.sold_percentage()
+
+
+class CopyTradeEngine:
+    def __init__(self, request=rpc_request, poll_seconds: float = COPY_TRADE_POLL_SECONDS,
+                 max_age_seconds: float = COPY_TRADE_MAX_AGE_SECONDS, max_concurrent_requests: int = COPY_TRADE_MAX_CONCURRENT_REQUESTS):
+        self.request = request
+        self.poll_seconds = poll_seconds
+        self.max_age_seconds = max_age_seconds
+        self.on_trade = None   # on_trade(follower_id, follow, LeaderTrade), must not block
+        self._leaders = {}     # leader -> {"cursor": signature or None, "initialized": bool, "retry": {signature: info}, "followers": {user_id: follow}}
+        self._semaphore = asyncio.Semaphore(max_concurrent_requests)
+        self._task = None
+
+    def follow(self, user_id, leader: str, follow: dict):
+        entry = self._leaders.setdefault(leader, {"cursor": None, "initialized": False, "retry": {}, "followers": {}})
+        entry["followers"][str(user_id)] = follow
+
+    def unfollow(self, user_id, leader: str):
+        entry = self._leaders.get(leader)
+        if entry is None:
+            return
+        entry["followers"].pop(str(user_id), None)
+        if not entry["followers"]:
+            del self._leaders[leader]
+
+    def load(self, users: dict):
+        # Follows are kept in each user's settings: {"copy_trade": {leader: follow}}
+        for user_id, user in users.items():
+            for leader, follow in (user.get("settings") or {}).get("copy_trade", {}).items():
+                self.follow(user_id, leader, follow)
+
+    @property
+    def leaders(self) -> list:
+        return list(self._leaders)
+
+    async def poll(self):
+        await asyncio.gather(*(self.poll_leader(leader) for leader in self.leaders))
+
+    async def poll_leader(self, leader: str):
+        entry = self._leaders.get(leader)
+        if entry is None:
+            return
+        signatures = await self._new_signatures(leader, entry["cursor"])
+        if signatures:
+            entry["cursor"] = signatures[0]["signature"]
+        # The first read of a leader only sets the cursor, a leader without history has none yet
+        if not entry["initialized"]:
+            entry["initialized"] = signatures is not None
+            return
+
+        # Oldest first: the retries of the previous ticks, then the new signatures
+        now = time.time()
+        pending = list(entry["retry"].values()) + [
+            {"signature": signature["signature"], "blockTime": signature.get("blockTime"), "attempts": 0}
+            for signature in reversed(signatures or []) if signature.get("err") is None
+        ]
+        fresh = [
+            signature for signature in pending
+            if signature["blockTime"] is None or now - signature["blockTime"] <= self.max_age_seconds
+        ]
+        entry["retry"] = {}
+        if not fresh:
+            return
+        seen_at = time.monotonic()
+        transactions = await asyncio.gather(*(self._fetch(signature["signature"]) for signature in fresh))
+        for signature, transaction in zip(fresh, transactions):
+            if transaction is None:
+                if signature["attempts"] + 1 < COPY_TRADE_MAX_RETRIES:
+                    entry["retry"][signature["signature"]] = dict(signature, attempts=signature["attempts"] + 1)
+                else:
+                    print(f"[ERROR] Copy trade could not read {signature['signature']} of {leader}")
+                continue
+            for swap in decode_amm_v4_swaps(transaction):
+                if swap.owner == leader:
+                    self._fan_out(LeaderTrade(leader, signature["signature"], swap, seen_at))
+
+    async def _new_signatures(self, leader: str, cursor) -> list | None:
+        # Newest first, paged backwards with "before" until the cursor is reached.
+        # None when a page could not be read: the cursor stays and the next tick asks again.
+        params = {"limit": COPY_TRADE_SIGNATURES_LIMIT, "commitment": "confirmed"}
+        if cursor is not None:
+            params["until"] = cursor
+        signatures = []
+        for _ in range(COPY_TRADE_MAX_PAGES):
+            async with self._semaphore:
+                response = await self.request("getSignaturesForAddress", [leader, params])
+            page = (response or {}).get("result")
+            if page is None:
+                return None
+            signatures += page
+            if cursor is None or len(page) < COPY_TRADE_SIGNATURES_LIMIT:
+                return signatures
+            params = dict(params, before=page[-1]["signature"])
+        print(f"[ERROR] Copy trade of {leader} skipped the signatures older than {signatures[-1]['signature']} (over {len(signatures)} new in one tick)")
+        return signatures
+
+    async def _fetch(self, signature: str):
+        # A signature can be listed a moment before getTransaction serves it
+        for attempt in range(TRANSACTION_FETCH_ATTEMPTS):
+            async with self._semaphore:
+                transaction = await fetch_transaction(signature, self.request)
+            if transaction is not None:
+                return transaction
+            await asyncio.sleep(0.2 * (attempt + 1))
+        return None
+
+    def _fan_out(self, trade: LeaderTrade):
+        entry = self._leaders.get(trade.leader)
+        if entry is None or self.on_trade is None:
+            return
+        for user_id, follow in list(entry["followers"].items()):
+            try:
+                self.on_trade(user_id, follow, trade)
+            except Exception as e:
+                print(f"[ERROR] Copy trade for user {user_id} failed: {e}")
+
+    async def _run(self):
+        while True:
+            started_at = time.monotonic()
+            try:
+                await self.poll()
+            except Exception as e:
+                print(f"[ERROR] Copy trade poll failed: {e}")
+            await asyncio.sleep(max(0.0, self.poll_seconds - (time.monotonic() - started_at)))
+
+    def start(self, on_trade):
+        self.on_trade = on_trade
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+copy_trade_engine = CopyTradeEngine()
+
+
+"""---------------------------------"""
+"""          Replay Harness         """
+"""---------------------------------"""
+
+class FakeLeaderRpc:
+    # Serves getSignaturesForAddress / getTransaction from transactions published
+    # during the replay, in the shapes the RPC returns them
+    def __init__(self, latency: float = 0.02):
+        self.latency = latency
+        self.signatures = {}     # leader -> [signature, ...] oldest first
+        self.transactions = {}   # signature -> getTransaction result
+        self.published_at = {}   # signature -> time.monotonic()
+        self.calls = {}
+
+    def publish(self, leader: str, signature: str, transaction: dict):
+        self.signatures.setdefault(leader, []).append(signature)
+        self.transactions[signature] = transaction
+        self.published_at[signature] = time.monotonic()
+
+    async def __call__(self, method: str, params: list) -> dict:
+        self.calls[method] = self.calls.get(method, 0) + 1
+        await asyncio.sleep(self.latency)
+        if method == "getSignaturesForAddress":
+            leader, options = params
+            signatures = self.signatures.get(leader, [])
+            if options.get("until") in signatures:
+                signatures = signatures[signatures.index(options["until"]) + 1:]
+            if options.get("before") in signatures:
+                signatures = signatures[:signatures.index(options["before"])]
+            newest_first = list(reversed(signatures))[:options.get("limit", 1000)]
+            return {"result": [{"signature": signature, "err": None, "blockTime": int(time.time())} for signature in newest_first]}
+        if method == "getTransaction":
+            return {"result": self.transactions.get(params[0])}
+        raise ValueError(f"FakeLeaderRpc does not implement {method}")
+
+
+def _random_address() -> str:
+    return base58.b58encode(random.randbytes(32)).decode("utf-8")
+
+
+def fake_swap_transaction(leader: str, side: str, sol_amount: int, token_amount: int, source_balance: int) -> dict:
+    # A getTransaction result with one 18-account swap_base_in of the leader on a WSOL/token pool
+    mint = _random_address()
+    amm, base_vault, quote_vault, source, destination = (_random_address() for _ in range(5))
+    others = [_random_address() for _ in range(12)]
+    keys = [leader, source, destination, amm, base_vault, quote_vault] + others + [str(RAYDIUM_AMM_V4)]
+    accounts = [keys.index(key) for key in (others[0], amm, others[1], others[2], others[3], base_vault, quote_vault,
+                                            others[4], others[5], others[6], others[7], others[8], others[9], others[10],
+                                            others[11], source, destination, leader)]
+    sol_reserve, token_reserve = 500 * 10**9, 10**15
+    sol_delta, token_delta = (sol_amount, -token_amount) if side == "buy" else (-sol_amount, token_amount)
+    source_mint = str(WSOL) if side == "buy" else mint
+
+    def balance(index, mint, amount):
+        return {"accountIndex": index, "mint": mint, "uiTokenAmount": {"amount": str(amount)}}
+
+    data = bytes([9]) + (sol_amount if side == "buy" else token_amount).to_bytes(8, "little") + (0).to_bytes(8, "little")
+    return {
+        "slot": 1,
+        "transaction": {"message": {
+            "accountKeys": keys,
+            "instructions": [{"programIdIndex": len(keys) - 1, "accounts": accounts, "data": base58.b58encode(data).decode("utf-8")}],
+        }},
+        "meta": {
+            "err": None,
+            "fee": 5000,
+            "preTokenBalances": [balance(4, str(WSOL), sol_reserve), balance(5, mint, token_reserve), balance(1, source_mint, source_balance)],
+            "postTokenBalances": [balance(4, str(WSOL), sol_reserve + sol_delta), balance(5, mint, token_reserve + token_delta)],
+            "innerInstructions": [],
+        },
+    }
+
+
+async def replay(leaders: int = 20, followers_per_leader: int = 50, trades: int = 200, interval: float = 0.05,
+                 recorded: list | None = None, poll_seconds: float = 0.25) -> dict:
+    # Leader trades are published on the fake RPC while the engine polls it. The latency
+    # is from publication to the follower job being handed off (on_trade).
+    fake_rpc = FakeLeaderRpc()
+    engine = CopyTradeEngine(request=fake_rpc, poll_seconds=poll_seconds)
+    if recorded:
+        leader_addresses = sorted({decode_amm_v4_swaps(transaction)[0].owner for transaction in recorded})
+    else:
+        leader_addresses = [_random_address() for _ in range(leaders)]
+    for index, leader in enumerate(leader_addresses):
+        fake_rpc.publish(leader, f"history-{index}", fake_swap_transaction(leader, "buy", 10**9, 10**12, 0))
+        for follower in range(followers_per_leader):
+            engine.follow(f"{index}-{follower}", leader, {"max_sol": 0.1, "ratio": 10})
+
+    latency = LatencyTracker("copy trade", window=trades * followers_per_leader, report_every=0)
+    handed_off = {"jobs": 0}
+
+    def on_trade(follower_id, follow, trade):
+        follower_trade_size(follow, trade)
+        handed_off["jobs"] += 1
+        latency.record(time.monotonic() - fake_rpc.published_at[trade.signature])
+
+    engine.start(on_trade)
+    await asyncio.sleep(poll_seconds * 2)
+    for index in range(trades):
+        if recorded:
+            transaction = recorded[index % len(recorded)]
+            leader = decode_amm_v4_swaps(transaction)[0].owner
+        else:
+            leader = random.choice(leader_addresses)
+            side = random.choice(("buy", "sell"))
+            transaction = fake_swap_transaction(leader, side, random.randint(10**8, 5 * 10**9), random.randint(10**9, 10**12), 2 * 10**12)
+        fake_rpc.publish(leader, f"trade-{index}", transaction)
+        await asyncio.sleep(interval)
+    await asyncio.sleep(poll_seconds * 3)
+    await engine.stop()
+
+    p50, p95 = latency.percentiles()
+    return {
+        "leader_trades": trades,
+        "follower_jobs": handed_off["jobs"],
+        "p50_ms": round(p50 * 1000),
+        "p95_ms": round(p95 * 1000),
+        "rpc_calls": fake_rpc.calls,
+    }
+
+
+if __name__ == "__main__":
+    if len(sys.argv) in (2, 3) and sys.argv[1] == "replay":
+        recorded = None
+        if len(sys.argv) == 3:
+            # A JSON list of getTransaction results (encoding "json") containing leader swaps
+            with open(sys.argv[2], "r") as file:
+                recorded = json.load(file)
+        print(asyncio.run(replay(recorded=recorded)))
+    else:
+        print("Usage: python copy_trade.py replay [recorded_transactions.json]")
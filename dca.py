@@ -0,0 +1,363 @@
+import os
+import re
+import sys
+import time
+import heapq
+import random
+import sqlite3
+import asyncio
+import threading
+from typing import Optional
+from dataclasses import dataclass, replace
+
+from solders.keypair import Keypair  # type: ignore
+from solders.pubkey import Pubkey  # type: ignore
+from spl.token.instructions import get_associated_token_address
+
+from raydiumFolder.raydium_py.raydium.amm_v4 import SwapState, buy_with_state_async, get_token_mint, EPHEMERAL_WSOL, PERSISTENT_WSOL
+from raydiumFolder.raydium_py.raydium.amm_v4_quote import quote_buy
+from raydiumFolder.raydium_py.raydium.constants import SOL_DECIMAL, WSOL
+from raydiumFolder.raydium_py.utils.accounts import fetch_token_amounts_async
+from raydiumFolder.raydium_py.utils.chain_state import blockhash_service
+from raydiumFolder.raydium_py.utils.pool_cache import get_pool_keys_async
+from raydiumFolder.raydium_py.utils.pool_utils import AmmV4PoolKeys
+from raydiumFolder.raydium_py.utils.priority_fees import DEFAULT_FEE_TIER
+
+"""---------------------------------"""
+"""          DCA Scheduler          """
+"""---------------------------------"""
+
+# Recurring buys: every schedule sits in one heap ordered by its next run, and a single
+# loop pops what is due each tick (no task per schedule). Due runs are grouped by pool:
+# a group reads its pool keys from the cache, the two vaults and the persistent WSOL
+# accounts of its buyers in one getMultipleAccounts, and warms the shared blockhash once.
+# Each buyer of a group quotes against the reserves the previous buys leave. Buys of all
+# groups share a semaphore so a busy tick cannot flood the RPC.
+#
+# A run is rescheduled when it is popped, before the buy: a failed buy is not retried and
+# runs missed while the bot was down are skipped, not replayed.
+
+DCA_PATH = os.getenv("DCA_PATH", "users.db")
+DCA_TICK_SECONDS = float(os.getenv("DCA_TICK_SECONDS", "1"))
+DCA_MAX_CONCURRENT_BUYS = int(os.getenv("DCA_MAX_CONCURRENT_BUYS", "8"))
+DCA_MIN_INTERVAL_SECONDS = 60
+INTERVAL_UNITS = {"m": 60, "h": 3600, "d": 86400}
+
+
+@dataclass
+class Schedule:
+    id: int
+    user_id: str
+    pool: str
+    sol_amount: float
+    interval_seconds: int
+    runs_left: Optional[int]   # None = until cancelled
+    next_run: float            # time.time() of the next buy
+    created_at: float
+
+
+@dataclass
+class DcaBuyer:
+    payer: Keypair
+    slippage: Optional[float]
+    wsol_mode: str
+    fee_tier: str
+
+
+def parse_interval(text: str) -> Optional[int]:
+    # "30m", "1h", "1d" -> seconds, None when invalid or shorter than the minimum
+    match = re.fullmatch(r"([0-9]+)([mhd])", text.strip().lower())
+    if match is None:
+        return None
+    seconds = int(match.group(1)) * INTERVAL_UNITS[match.group(2)]
+    return seconds if seconds >= DCA_MIN_INTERVAL_SECONDS else None
+
+def format_interval(seconds: int) -> str:
+    for unit in ("d", "h", "m"):
+        if seconds % INTERVAL_UNITS[unit] == 0:
+            return f"{seconds // INTERVAL_UNITS[unit]}{unit}"
+    return f"{seconds}s"
+
+def reserves_after_buy(pool_keys: AmmV4PoolKeys, base_vault_amount: int, quote_vault_amount: int, lamports_in: int) -> tuple:
+    # Vault amounts once a buy of lamports_in has gone through, the fee stays in the pool
+    quote = quote_buy(pool_keys, base_vault_amount, quote_vault_amount, lamports_in)
+    if pool_keys.base_mint == WSOL:
+        return base_vault_amount + lamports_in, quote_vault_amount - quote.amount_out
+    return base_vault_amount - quote.amount_out, quote_vault_amount + lamports_in
+
+
+class DcaScheduler:
+    def __init__(self, path: str = DCA_PATH, tick_seconds: float = DCA_TICK_SECONDS, max_concurrent_buys: int = DCA_MAX_CONCURRENT_BUYS,
+                 get_pool_keys=get_pool_keys_async, fetch_amounts=fetch_token_amounts_async,
+                 get_blockhash=blockhash_service.get_async, buy=buy_with_state_async):
+        self.path = path
+        self.tick_seconds = tick_seconds
+        self.get_pool_keys = get_pool_keys
+        self.fetch_amounts = fetch_amounts
+        self.get_blockhash = get_blockhash
+        self.buy = buy
+        self.buyer_of = None   # async buyer_of(user_id) -> DcaBuyer or None
+        self.on_done = None    # async on_done(Schedule, result, amount_out, txn_sig)
+        self._schedules = {}   # schedule id -> Schedule
+        self._heap = []        # (next_run, schedule id), stale entries are skipped when popped
+        self._semaphore = asyncio.Semaphore(max_concurrent_buys)
+        self._groups = set()
+        self._task = None
+        self._lock = threading.Lock()
+        self._conn = None
+        if path:
+            self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS dca_schedules ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, user_id TEXT NOT NULL, pool TEXT NOT NULL, sol_amount REAL NOT NULL, "
+                "interval_seconds INTEGER NOT NULL, runs_left INTEGER, next_run REAL NOT NULL, created_at REAL NOT NULL)"
+            )
+        self._next_id = 1
+
+    def load(self) -> int:
+        if self._conn is None:
+            return 0
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, user_id, pool, sol_amount, interval_seconds, runs_left, next_run, created_at FROM dca_schedules"
+            ).fetchall()
+        for row in rows:
+            self._push(Schedule(*row))
+        return len(rows)
+
+    def add(self, user_id, pool: str, sol_amount: float, interval_seconds: int, runs: Optional[int] = None) -> Schedule:
+        # The first buy is one interval from now
+        created_at = time.time()
+        next_run = created_at + interval_seconds
+        if self._conn is not None:
+            with self._lock:
+                cursor = self._conn.execute(
+                    "INSERT INTO dca_schedules (user_id, pool, sol_amount, interval_seconds, runs_left, next_run, created_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (str(user_id), pool, sol_amount, interval_seconds, runs, next_run, created_at),
+                )
+            schedule_id = cursor.lastrowid
+        else:
+            schedule_id = self._next_id
+            self._next_id += 1
+        schedule = Schedule(schedule_id, str(user_id), pool, sol_amount, interval_seconds, runs, next_run, created_at)
+        self._push(schedule)
+        return schedule
+
+    def cancel(self, user_id, schedule_id: int) -> bool:
+        schedule = self._schedules.get(schedule_id)
+        if schedule is None or schedule.user_id != str(user_id):
+            return False
+        # Its heap entry goes stale and is dropped when popped
+        del self._schedules[schedule_id]
+        if self._conn is not None:
+            with self._lock:
+                self._conn.execute("DELETE FROM dca_schedules WHERE id = ?", (schedule_id,))
+        return True
+
+    def schedules_of(self, user_id) -> list:
+        return sorted((schedule for schedule in self._schedules.values() if schedule.user_id == str(user_id)), key=lambda schedule: schedule.id)
+
+    def _push(self, schedule: Schedule):
+        self._schedules[schedule.id] = schedule
+        heapq.heappush(self._heap, (schedule.next_run, schedule.id))
+
+    def pop_due(self, now: Optional[float] = None) -> list:
+        # Due schedules, already rescheduled (or removed after their last run)
+        now = time.time() if now is None else now
+        due, updated, finished = [], [], []
+        while self._heap and self._heap[0][0] <= now:
+            next_run, schedule_id = heapq.heappop(self._heap)
+            schedule = self._schedules.get(schedule_id)
+            if schedule is None or schedule.next_run != next_run:
+                continue
+            due.append(replace(schedule))
+            if schedule.runs_left is not None:
+                schedule.runs_left -= 1
+                if schedule.runs_left <= 0:
+                    del self._schedules[schedule_id]
+                    finished.append((schedule_id,))
+                    continue
+            # Next slot of the schedule's cadence after now
+            schedule.next_run = next_run + schedule.interval_seconds * ((now - next_run) // schedule.interval_seconds + 1)
+            heapq.heappush(self._heap, (schedule.next_run, schedule_id))
+            updated.append((schedule.next_run, schedule.runs_left, schedule_id))
+
+        if self._conn is not None and (updated or finished):
+            with self._lock:
+                self._conn.execute("BEGIN IMMEDIATE")
+                self._conn.executemany("UPDATE dca_schedules SET next_run = ?, runs_left = ? WHERE id = ?", updated)
+                self._conn.executemany("DELETE FROM dca_schedules WHERE id = ?", finished)
+                self._conn.execute("COMMIT")
+        return due
+
+    def tick(self, now: Optional[float] = None) -> list:
+        # Starts one task per pool with due schedules, returns them
+        groups = {}
+        for schedule in self.pop_due(now):
+            groups.setdefault(schedule.pool, []).append(schedule)
+        tasks = []
+        for pool, schedules in groups.items():
+            task = asyncio.create_task(self._run_group(pool, schedules))
+            self._groups.add(task)
+            task.add_done_callback(self._groups.discard)
+            tasks.append(task)
+        return tasks
+
+    async def _run_group(self, pool: str, schedules: list):
+        try:
+            pool_keys = await self.get_pool_keys(pool)
+            if pool_keys is None:
+                print(f"[ERROR] DCA could not read pool {pool}")
+                return
+            buyers = await asyncio.gather(*(self.buyer_of(schedule.user_id) for schedule in schedules))
+            jobs = [(schedule, buyer) for schedule, buyer in zip(schedules, buyers) if buyer is not None]
+            if not jobs:
+                return
+
+            mint = get_token_mint(pool_keys)
+            wsol_accounts = [get_associated_token_address(buyer.payer.pubkey(), WSOL) for _, buyer in jobs]
+            persistent = [index for index, (_, buyer) in enumerate(jobs) if buyer.wsol_mode == PERSISTENT_WSOL]
+            amounts = await self.fetch_amounts([pool_keys.base_vault, pool_keys.quote_vault, *(wsol_accounts[index] for index in persistent)])
+            wsol_amounts = dict(zip(persistent, amounts[2:]))
+            await self.get_blockhash()
+        except Exception as e:
+            print(f"[ERROR] DCA run on {pool} failed: {e}")
+            return
+
+        base_vault_amount, quote_vault_amount = amounts[0], amounts[1]
+        buys = []
+        for index, (schedule, buyer) in enumerate(jobs):
+            swap_state = SwapState(
+                pool_keys, get_associated_token_address(buyer.payer.pubkey(), mint), base_vault_amount, quote_vault_amount,
+                None, wsol_accounts[index], wsol_amounts.get(index),
+            )
+            buys.append(self._buy(schedule, buyer, swap_state))
+            base_vault_amount, quote_vault_amount = reserves_after_buy(
+                pool_keys, base_vault_amount, quote_vault_amount, round(schedule.sol_amount * SOL_DECIMAL)
+            )
+        await asyncio.gather(*buys)
+
+    async def _buy(self, schedule: Schedule, buyer: DcaBuyer, swap_state: SwapState):
+        try:
+            async with self._semaphore:
+                result, amount_out, txn_sig = await self.buy(
+                    schedule.pool, buyer.payer, swap_state, schedule.sol_amount, buyer.slippage, buyer.wsol_mode, buyer.fee_tier
+                )
+        except Exception as e:
+            print(f"[ERROR] DCA buy {schedule.id} of user {schedule.user_id} failed: {e}")
+            result, amount_out, txn_sig = False, 0, ""
+        if self.on_done is not None:
+            try:
+                await self.on_done(schedule, result, amount_out, txn_sig)
+            except Exception as e:
+                print(f"[ERROR] DCA buy {schedule.id} could not be reported: {e}")
+
+    async def _run(self):
+        while True:
+            try:
+                self.tick()
+            except Exception as e:
+                print(f"[ERROR] DCA tick failed: {e}")
+            await asyncio.sleep(self.tick_seconds)
+
+    def start(self, buyer_of, on_done):
+        self.buyer_of = buyer_of
+        self.on_done = on_done
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for task in list(self._groups):
+            task.cancel()
+        await asyncio.gather(*self._groups, return_exceptions=True)
+
+
+dca_scheduler = DcaScheduler()
+
+
+"""---------------------------------"""
+"""            Benchmark            """
+"""---------------------------------"""
+
+def _fake_pool_keys(amm_id: Pubkey) -> AmmV4PoolKeys:
+    addresses = [Pubkey.new_unique() for _ in range(14)]
+    return AmmV4PoolKeys(amm_id, Pubkey.new_unique(), WSOL, 6, 9, *addresses)
+
+async def benchmark(schedules: int = 10_000, pools: int = 500, users: int = 2_000, latency: float = 0.005,
+                    max_concurrent_buys: int = DCA_MAX_CONCURRENT_BUYS) -> dict:
+    # Every schedule due in the same tick against a fake RPC: RPC calls of the grouped
+    # run vs one buy_async per schedule, and the concurrency the semaphore lets through
+    calls = {"getMultipleAccounts": 0, "getLatestBlockhash": 0}
+    in_flight = {"now": 0, "max": 0}
+    pool_keys = {str(amm_id): _fake_pool_keys(amm_id) for amm_id in (Pubkey.new_unique() for _ in range(pools))}
+    buyers = {str(user): DcaBuyer(Keypair(), 1.0, random.choice((EPHEMERAL_WSOL, PERSISTENT_WSOL)), DEFAULT_FEE_TIER) for user in range(users)}
+
+    async def get_pool_keys(pool):
+        return pool_keys[pool]
+
+    async def fetch_amounts(accounts):
+        calls["getMultipleAccounts"] += 1
+        await asyncio.sleep(latency)
+        return [500 * 10**9, 10**15] + [random.choice((None, 10**8)) for _ in accounts[2:]]
+
+    async def get_blockhash():
+        calls["getLatestBlockhash"] += 1
+
+    async def buyer_of(user_id):
+        return buyers[user_id]
+
+    async def buy(pool, payer, swap_state, sol_in, slippage, wsol_mode, fee_tier):
+        in_flight["now"] += 1
+        in_flight["max"] = max(in_flight["max"], in_flight["now"])
+        await asyncio.sleep(latency)
+        in_flight["now"] -= 1
+        return True, 1.0, "fake"
+
+    done = {"count": 0}
+
+    async def on_done(schedule, result, amount_out, txn_sig):
+        done["count"] += 1
+
+    scheduler = DcaScheduler(path=None, max_concurrent_buys=max_concurrent_buys, get_pool_keys=get_pool_keys,
+                             fetch_amounts=fetch_amounts, get_blockhash=get_blockhash, buy=buy)
+    scheduler.buyer_of, scheduler.on_done = buyer_of, on_done
+    pool_addresses = list(pool_keys)
+    for index in range(schedules):
+        scheduler.add(str(index % users), random.choice(pool_addresses), 0.1, 3600)
+
+    now = time.time() + 3600
+    start = time.perf_counter()
+    tasks = scheduler.tick(now)
+    pop_ms = (time.perf_counter() - start) * 1000
+    await asyncio.gather(*tasks)
+    run_s = time.perf_counter() - start
+
+    return {
+        "schedules": schedules,
+        "pools": len(tasks),
+        "buys": done["count"],
+        "pop_ms": round(pop_ms, 1),
+        "run_s": round(run_s, 2),
+        "rpc_calls": calls,
+        # buy_async reads the vaults and the wallet with one getMultipleAccounts per schedule
+        "get_multiple_accounts_one_by_one": schedules,
+        "max_concurrent_buys": in_flight["max"],
+        "next_runs_queued": len(scheduler._heap),
+    }
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 2 and sys.argv[1] == "bench":
+        print(asyncio.run(benchmark()))
+    else:
+        print("Usage: python dca.py bench")
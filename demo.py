@@ -0,0 +1,262 @@
+import os
+import sys
+import time
+import random
+import asyncio
+import tempfile
+from types import SimpleNamespace
+from typing import Optional
+from dataclasses import dataclass
+
+from solders.pubkey import Pubkey  # type: ignore
+
+from raydiumFolder.raydium_py.raydium.amm_v4 import get_token_mint
+from raydiumFolder.raydium_py.raydium.amm_v4_quote import Quote, quote_buy, quote_sell, sell_amount, sol_and_token_reserves, token_decimals
+from raydiumFolder.raydium_py.raydium.constants import SOL_DECIMAL, WSOL
+from raydiumFolder.raydium_py.utils.accounts import fetch_token_amounts_async
+from raydiumFolder.raydium_py.utils.pool_cache import get_pool_keys_async
+from raydiumFolder.raydium_py.utils.pool_utils import AmmV4PoolKeys
+from metrics import LatencyTracker
+
+"""---------------------------------"""
+"""            Demo Mode            """
+"""---------------------------------"""
+
+# Paper trading: demo trades are filled by an in-process copy of the AMM v4 pools.
+# A pool is seeded from its on-chain vault amounts the first time it is traded, then
+# every demo trade moves the simulated reserves with the same constant-product quote
+# and swap fee as the real swaps, so the impact of demo users adds up until the pool
+# is reseeded (DEMO_RESEED_SECONDS). Nothing trades against the simulation between the
+# quote and the fill: slippage never fails a demo trade.
+#
+# The virtual wallet is kept in the user's settings (demo_balance): lamports and raw
+# token amounts by mint.
+
+DEMO_START_SOL = float(os.getenv("DEMO_START_SOL", "10"))
+DEMO_RESEED_SECONDS = float(os.getenv("DEMO_RESEED_SECONDS", "300"))
+DEMO_FEE_LAMPORTS = 5000   # signature fee charged on every demo trade
+
+
+def new_demo_balance(sol: float = DEMO_START_SOL) -> dict:
+    return {"sol": round(sol * SOL_DECIMAL), "tokens": {}}
+
+def demo_sol_and_token(balance: dict, mint: str) -> tuple:
+    # (SOL, tokens of mint) of a virtual wallet as displayed amounts
+    token = balance["tokens"].get(mint)
+    return balance["sol"] / SOL_DECIMAL, token["amount"] / 10**token["decimals"] if token else 0.0
+
+async def seed_from_chain(pair_address: str) -> Optional[tuple]:
+    # (pool keys, base vault amount, quote vault amount) read from the RPC
+    pool_keys = await get_pool_keys_async(pair_address)
+    if pool_keys is None:
+        return None
+    base_vault_amount, quote_vault_amount = await fetch_token_amounts_async([pool_keys.base_vault, pool_keys.quote_vault])
+    if not base_vault_amount or not quote_vault_amount:
+        return None
+    return pool_keys, base_vault_amount, quote_vault_amount
+
+
+@dataclass
+class SimulatedPool:
+    pool_keys: AmmV4PoolKeys
+    base_vault_amount: int
+    quote_vault_amount: int
+    seeded_at: float
+
+    def reserves(self) -> tuple:
+        return sol_and_token_reserves(self.pool_keys, self.base_vault_amount, self.quote_vault_amount)
+
+    def _move(self, sol_delta: int, token_delta: int):
+        if self.pool_keys.base_mint == WSOL:
+            self.base_vault_amount += sol_delta
+            self.quote_vault_amount += token_delta
+        else:
+            self.base_vault_amount += token_delta
+            self.quote_vault_amount += sol_delta
+
+    def apply_buy(self, lamports_in: int) -> Quote:
+        # The fee stays in the pool like on chain
+        quote = quote_buy(self.pool_keys, self.base_vault_amount, self.quote_vault_amount, lamports_in)
+        self._move(lamports_in, -quote.amount_out)
+        return quote
+
+    def apply_sell(self, tokens_in: int) -> Quote:
+        quote = quote_sell(self.pool_keys, self.base_vault_amount, self.quote_vault_amount, tokens_in)
+        self._move(-quote.amount_out, tokens_in)
+        return quote
+
+
+class AmmSimulator:
+    def __init__(self, seed=seed_from_chain, reseed_seconds: float = DEMO_RESEED_SECONDS):
+        self.seed = seed
+        self.reseed_seconds = reseed_seconds
+        self._pools = {}   # pair address -> SimulatedPool
+
+    async def pool(self, pair_address: str) -> Optional[SimulatedPool]:
+        simulated = self._pools.get(pair_address)
+        if simulated is not None and (not self.reseed_seconds or time.monotonic() - simulated.seeded_at < self.reseed_seconds):
+            return simulated
+        try:
+            seeded = await self.seed(pair_address)
+        except Exception as e:
+            print(f"[ERROR] Demo pool {pair_address} could not be seeded: {e}")
+            seeded = None
+        if seeded is None:
+            # A stale simulation is still better than no trade
+            return simulated
+        simulated = SimulatedPool(*seeded, time.monotonic())
+        self._pools[pair_address] = simulated
+        return simulated
+
+    async def buy(self, balance: dict, pair_address: str, sol_in: float) -> tuple:
+        # (result, token amount out, new balance), like buy_async without a signature
+        lamports_in = round(sol_in * SOL_DECIMAL)
+        simulated = await self.pool(pair_address)
+        if simulated is None or lamports_in <= 0 or lamports_in + DEMO_FEE_LAMPORTS > balance["sol"]:
+            return False, 0, balance
+        quote = simulated.apply_buy(lamports_in)
+        if quote.amount_out <= 0:
+            return False, 0, balance
+
+        mint = str(get_token_mint(simulated.pool_keys))
+        decimals = token_decimals(simulated.pool_keys)
+        tokens = dict(balance["tokens"])
+        held = tokens.get(mint, {"amount": 0, "decimals": decimals})
+        tokens[mint] = {"amount": held["amount"] + quote.amount_out, "decimals": decimals}
+        new_balance = {"sol": balance["sol"] - lamports_in - DEMO_FEE_LAMPORTS, "tokens": tokens}
+        return True, quote.amount_out / 10**decimals, new_balance
+
+    async def sell(self, balance: dict, pair_address: str, percentage: float) -> tuple:
+        # (result, token amount in, SOL out, new balance), like sell_async without a signature
+        simulated = await self.pool(pair_address)
+        if simulated is None or not (1 <= percentage <= 100) or balance["sol"] < DEMO_FEE_LAMPORTS:
+            return False, 0, 0, balance
+        mint = str(get_token_mint(simulated.pool_keys))
+        held = balance["tokens"].get(mint)
+        tokens_in = sell_amount(held["amount"], percentage) if held else 0
+        if tokens_in <= 0:
+            return False, 0, 0, balance
+        quote = simulated.apply_sell(tokens_in)
+
+        tokens = dict(balance["tokens"])
+        if held["amount"] - tokens_in > 0:
+            tokens[mint] = {"amount": held["amount"] - tokens_in, "decimals": held["decimals"]}
+        else:
+            del tokens[mint]
+        new_balance = {"sol": balance["sol"] + quote.amount_out - DEMO_FEE_LAMPORTS, "tokens": tokens}
+        return True, tokens_in / 10**held["decimals"], quote.amount_out / SOL_DECIMAL, new_balance
+
+
+demo_simulator = AmmSimulator()
+
+
+"""---------------------------------"""
+"""            Load Test            """
+"""---------------------------------"""
+
+# The demo path touches no RPC once its pools are seeded, so seeding them offline
+# turns it into a load test of the whole bot: the real handlers, trade queue and
+# user store, with Telegram replaced by the fakes below.
+
+class FakeMessage:
+    def __init__(self, chat):
+        self.chat = chat
+
+    async def reply_text(self, text, **kwargs):
+        self.chat.replies.append(text)
+        self.chat.replied.set()
+        return FakeMessage(self.chat)
+
+    async def edit_text(self, text, **kwargs):
+        return self
+
+    async def delete(self):
+        pass
+
+
+class FakeCallbackQuery:
+    def __init__(self, chat, data: str):
+        self.data = data
+        self.message = FakeMessage(chat)
+
+    async def answer(self, *args, **kwargs):
+        pass
+
+
+class FakeChat:
+    # One Telegram user clicking buttons: an Update and a context per click
+    def __init__(self, user_id: int):
+        self.user_id = user_id
+        self.user_data = {}
+        self.replies = []
+        self.replied = asyncio.Event()
+
+    def click(self, data: str) -> tuple:
+        update = SimpleNamespace(effective_user=SimpleNamespace(id=self.user_id), message=None, callback_query=FakeCallbackQuery(self, data))
+        return update, SimpleNamespace(user_data=self.user_data)
+
+
+def offline_pool_keys() -> AmmV4PoolKeys:
+    return AmmV4PoolKeys(Pubkey.new_unique(), Pubkey.new_unique(), WSOL, 6, 9, *(Pubkey.new_unique() for _ in range(14)))
+
+async def load_test(users: int = 500, clicks_per_user: int = 20, pools: int = 50) -> dict:
+    # Every user buys a random pool then sells it all, each click waiting for
+    # the reply of the previous one. Latency is from the click to the trade reply.
+    import MoonMapper
+    # Token on the base side, 1B tokens against 500 SOL
+    offline_pools = {str(pool_keys.amm_id): (pool_keys, 10**15, 500 * 10**9) for pool_keys in (offline_pool_keys() for _ in range(pools))}
+
+    async def offline_seed(pair_address):
+        return offline_pools[pair_address]
+
+    MoonMapper.demo_simulator.seed = offline_seed
+    MoonMapper.demo_simulator.reseed_seconds = 0
+    for user_id in range(users):
+        await MoonMapper.save_user(user_id, {
+            "wallets": {"created": {"public_address": str(Pubkey.new_unique()), "private_key": "", "mnemonic": ""}},
+            "settings": {"demo_mode": "enabled", "demo_balance": new_demo_balance(100)},
+        })
+
+    latency = LatencyTracker("demo click", window=users * clicks_per_user, report_every=0)
+    pool_addresses = list(offline_pools)
+
+    async def user_session(user_id):
+        chat = FakeChat(user_id)
+        for click in range(clicks_per_user):
+            if click % 2 == 0:
+                pool = random.choice(pool_addresses)
+            data = f"buy_0.1_{pool}" if click % 2 == 0 else f"sell_100_{pool}"
+            chat.replied.clear()
+            started_at = time.perf_counter()
+            await MoonMapper.handle_buy_sell(*chat.click(data))
+            await chat.replied.wait()
+            latency.record(time.perf_counter() - started_at)
+        return chat.replies
+
+    start = time.perf_counter()
+    replies = await asyncio.gather(*(user_session(user_id) for user_id in range(users)))
+    elapsed = time.perf_counter() - start
+
+    executed = sum(reply.startswith("🎮") for chat in replies for reply in chat)
+    p50, p95 = latency.percentiles()
+    return {
+        "users": users,
+        "clicks": users * clicks_per_user,
+        "executed": executed,
+        "failed": users * clicks_per_user - executed,
+        "clicks_per_second": round(users * clicks_per_user / elapsed),
+        "p50_ms": round(p50 * 1000, 1),
+        "p95_ms": round(p95 * 1000, 1),
+    }
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 2 and sys.argv[1] == "loadtest":
+        # Every store of the bot goes to a throwaway database
+        path = os.path.join(tempfile.mkdtemp(), "loadtest.db")
+        for name in ("USER_STORE_PATH", "TRADE_LEDGER_PATH", "ORDERS_PATH", "DCA_PATH"):
+            os.environ[name] = path
+        os.environ["USER_STORE_BACKEND"] = "sqlite"
+        print(asyncio.run(load_test()))
+    else:
+        print("Usage: python demo.py loadtest")
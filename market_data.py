@@ -0,0 +1,194 @@
+import sys
+import time
+import json
+import random
+import asyncio
+
+from raydiumFolder.raydium_py.utils.clients import get_http_session
+
+"""---------------------------------"""
+"""           Market Data           """
+"""---------------------------------"""
+
+# DexScreener pairs of a token, shared by every user who looks at it:
+# - answered from memory while younger than MARKET_DATA_TTL,
+# - answered from memory and refreshed in the background until MARKET_DATA_STALE_TTL,
+# - lookups arriving within BATCH_WINDOW_SECONDS go out as one comma-separated request,
+#   and a token already being fetched is never fetched twice,
+# - on HTTP 429 every request waits (Retry-After or exponential backoff).
+
+DEXSCREENER_TOKENS_URL = "https://api.dexscreener.com/latest/dex/tokens/"
+MARKET_DATA_TTL = 10
+MARKET_DATA_STALE_TTL = 120
+MARKET_DATA_CACHE_SIZE = 10_000
+MAX_ADDRESSES_PER_CALL = 30
+BATCH_WINDOW_SECONDS = 0.02
+BACKOFF_START_SECONDS = 1.0
+BACKOFF_MAX_SECONDS = 30.0
+
+
+class MarketDataService:
+    def __init__(self, base_url: str = DEXSCREENER_TOKENS_URL, ttl: float = MARKET_DATA_TTL, stale_ttl: float = MARKET_DATA_STALE_TTL,
+                 session_factory=get_http_session, max_size: int = MARKET_DATA_CACHE_SIZE):
+        self.base_url = base_url
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.session_factory = session_factory
+        self.max_size = max_size
+        self.http_calls = 0
+        self._entries = {}     # mint -> (fetched_at, pairs)
+        self._in_flight = {}   # mint -> future
+        self._queue = []
+        self._flush_task = None
+        self._backoff = 0.0
+        self._blocked_until = 0.0
+
+    async def get_pairs(self, mint: str) -> list | None:
+        # All DexScreener pairs of the token, None when they could not be fetched
+        entry = self._entries.get(mint)
+        if entry is not None:
+            age = time.monotonic() - entry[0]
+            if age < self.ttl:
+                return entry[1]
+            if age < self.stale_ttl:
+                self._request(mint)
+                return entry[1]
+        return await asyncio.shield(self._request(mint))
+
+    async def get_many(self, mints: list) -> dict:
+        results = await asyncio.gather(*(self.get_pairs(mint) for mint in mints))
+        return dict(zip(mints, results))
+
+    def _request(self, mint: str) -> asyncio.Future:
+        future = self._in_flight.get(mint)
+        if future is None:
+            future = asyncio.get_running_loop().create_future()
+            self._in_flight[mint] = future
+            self._queue.append(mint)
+            if self._flush_task is None or self._flush_task.done():
+                self._flush_task = asyncio.create_task(self._flush())
+        return future
+
+    async def _flush(self):
+        await asyncio.sleep(BATCH_WINDOW_SECONDS)
+        while self._queue:
+            wait = self._blocked_until - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            batch, self._queue = self._queue[:MAX_ADDRESSES_PER_CALL], self._queue[MAX_ADDRESSES_PER_CALL:]
+            status, pairs = await self._fetch(batch)
+            if status == 429:
+                self._queue = batch + self._queue
+                continue
+            for mint in batch:
+                result = None
+                if status == 200:
+                    result = [pair for pair in pairs if mint in (pair.get("baseToken", {}).get("address"), pair.get("quoteToken", {}).get("address"))]
+                    self._store(mint, result)
+                future = self._in_flight.pop(mint, None)
+                if future is not None and not future.done():
+                    # A failed refresh keeps answering with the stale pairs
+                    if result is None and mint in self._entries:
+                        result = self._entries[mint][1]
+                    future.set_result(result)
+
+    async def _fetch(self, batch: list) -> tuple:
+        self.http_calls += 1
+        try:
+            async with self.session_factory().get(self.base_url + ",".join(batch)) as response:
+                if response.status == 429:
+                    retry_after = response.headers.get("Retry-After")
+                    self._backoff = min(BACKOFF_MAX_SECONDS, self._backoff * 2 or BACKOFF_START_SECONDS)
+                    delay = float(retry_after) if retry_after and retry_after.isdigit() else self._backoff
+                    self._blocked_until = time.monotonic() + delay
+                    print(f"[ERROR] DexScreener rate limit, waiting {delay:.1f}s")
+                    return 429, None
+                if response.status != 200:
+                    print(f"[ERROR] DexScreener request failed with status {response.status}")
+                    return response.status, None
+                self._backoff = 0.0
+                data = await response.json()
+                pairs = data.get("pairs") if isinstance(data, dict) else None
+                return 200, pairs if isinstance(pairs, list) else []
+        except Exception as e:
+            print(f"[ERROR] DexScreener request failed: {e}")
+            return None, None
+
+    def _store(self, mint: str, pairs: list):
+        self._entries.pop(mint, None)
+        self._entries[mint] = (time.monotonic(), pairs)
+        while len(self._entries) > self.max_size:
+            del self._entries[next(iter(self._entries))]
+
+
+market_data = MarketDataService()
+
+
+"""---------------------------------"""
+"""      Stub Server / Load Test    """
+"""---------------------------------"""
+
+async def run_stub_server(port: int, latency: float = 0.2, rate_limit_every: int = 0):
+    # Local DexScreener stand-in: one fake pair per requested token, a 429 every
+    # rate_limit_every requests. Returns (runner, stats).
+    from aiohttp import web
+
+    stats = {"requests": 0, "tokens": 0}
+
+    async def tokens(request):
+        stats["requests"] += 1
+        if rate_limit_every and stats["requests"] % rate_limit_every == 0:
+            return web.Response(status=429, headers={"Retry-After": "1"})
+        addresses = request.match_info["addresses"].split(",")
+        stats["tokens"] += len(addresses)
+        await asyncio.sleep(latency)
+        pairs = [{
+            "dexId": "raydium",
+            "pairAddress": f"pair-{address}",
+            "baseToken": {"address": address, "name": address, "symbol": address[:4]},
+            "quoteToken": {"address": "So11111111111111111111111111111111111111112"},
+            "priceNative": "0.001",
+            "priceUsd": "0.2",
+            "liquidity": {"usd": 10_000},
+            "fdv": 100_000,
+        } for address in addresses]
+        return web.Response(text=json.dumps({"pairs": pairs}), content_type="application/json")
+
+    app = web.Application()
+    app.router.add_get("/latest/dex/tokens/{addresses}", tokens)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", port).start()
+    return runner, stats
+
+
+async def load_test(lookups: int = 2_000, tokens: int = 50, port: int = 8765) -> dict:
+    # Users pasting a few trending tokens: how many HTTP calls reach the API
+    import aiohttp
+
+    runner, stats = await run_stub_server(port, rate_limit_every=25)
+    session = aiohttp.ClientSession()
+    service = MarketDataService(base_url=f"http://127.0.0.1:{port}/latest/dex/tokens/", session_factory=lambda: session)
+    mints = [f"mint{index:04d}" for index in range(tokens)]
+    try:
+        start = time.perf_counter()
+        results = []
+        for _ in range(lookups // 100):
+            results += await asyncio.gather(*(service.get_pairs(random.choice(mints)) for _ in range(100)))
+        elapsed = time.perf_counter() - start
+    finally:
+        await session.close()
+        await runner.cleanup()
+    return {
+        "lookups": lookups,
+        "answered": sum(1 for result in results if result),
+        "http_requests": stats["requests"],
+        "seconds": round(elapsed, 2),
+    }
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 2 and sys.argv[1] == "loadtest":
+        print(asyncio.run(load_test()))
+    else:
+        print("Usage: python market_data.py loadtest")
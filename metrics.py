@@ -0,0 +1,31 @@
+from collections import deque
+
+"""---------------------------------"""
+"""         Latency Metrics         """
+"""---------------------------------"""
+
+# Rolling latency percentiles of the user-facing paths, printed every report_every samples
+LATENCY_WINDOW = 500
+LATENCY_REPORT_EVERY = 100
+
+
+class LatencyTracker:
+    def __init__(self, name: str, window: int = LATENCY_WINDOW, report_every: int = LATENCY_REPORT_EVERY):
+        self.name = name
+        self.report_every = report_every
+        self._samples = deque(maxlen=window)
+        self._count = 0
+
+    def record(self, seconds: float):
+        self._samples.append(seconds)
+        self._count += 1
+        if self.report_every and self._count % self.report_every == 0:
+            p50, p95 = self.percentiles()
+            print(f"[METRICS] {self.name}: p50 {p50 * 1000:.0f} ms | p95 {p95 * 1000:.0f} ms | {len(self._samples)} samples")
+
+    def percentiles(self) -> tuple:
+        if not self._samples:
+            return 0.0, 0.0
+        ordered = sorted(self._samples)
+        return ordered[int(0.50 * (len(ordered) - 1))], ordered[int(0.95 * (len(ordered) - 1))]
+
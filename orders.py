@@ -0,0 +1,312 @@
+import os
+import sys
+import time
+import bisect
+import random
+import sqlite3
+import asyncio
+import threading
+from dataclasses import dataclass
+
+from raydiumFolder.raydium_py.raydium.amm_v4 import sol_vault, token_vault
+from raydiumFolder.raydium_py.raydium.amm_v4_quote import token_decimals
+from raydiumFolder.raydium_py.utils.accounts import fetch_token_amounts_async
+from raydiumFolder.raydium_py.utils.pool_cache import get_pool_keys_async
+
+"""---------------------------------"""
+"""        Conditional Orders       """
+"""---------------------------------"""
+
+# Take profit, stop loss and limit buy orders, stored per pool. Each pool keeps its
+# orders in two lists sorted by trigger price: the ones that fire when the price rises
+# to their trigger (take profit) and the ones that fire when it falls to it (stop loss,
+# limit buy). A price update bisects both lists and only touches the crossed orders.
+#
+# One watcher serves every pool: each tick reads the SOL and token vaults of all the
+# pools with open orders in batched getMultipleAccounts calls (8-byte amount slices)
+# and prices them with the constant product reserves.
+
+ORDERS_PATH = os.getenv("ORDERS_PATH", "users.db")
+ORDERS_POLL_SECONDS = float(os.getenv("ORDERS_POLL_SECONDS", "2"))
+
+TAKE_PROFIT = "take_profit"
+STOP_LOSS = "stop_loss"
+LIMIT_BUY = "limit_buy"
+ORDER_KINDS = (TAKE_PROFIT, STOP_LOSS, LIMIT_BUY)
+
+
+@dataclass
+class Order:
+    id: int
+    user_id: str
+    pool: str
+    kind: str
+    trigger_price: float   # SOL per whole token
+    amount: float          # percentage of the tokens to sell, SOL to spend for a limit buy
+    created_at: float
+
+    @property
+    def side(self) -> str:
+        return "buy" if self.kind == LIMIT_BUY else "sell"
+
+    @property
+    def fires_above(self) -> bool:
+        return self.kind == TAKE_PROFIT
+
+
+class PoolOrders:
+    def __init__(self):
+        self.above = []   # (trigger_price, order_id) ascending, fire when price >= trigger
+        self.below = []   # (trigger_price, order_id) ascending, fire when price <= trigger
+
+    def __len__(self) -> int:
+        return len(self.above) + len(self.below)
+
+    def add(self, order: Order):
+        bisect.insort(self.above if order.fires_above else self.below, (order.trigger_price, order.id))
+
+    def remove(self, order: Order) -> bool:
+        entries = self.above if order.fires_above else self.below
+        key = (order.trigger_price, order.id)
+        index = bisect.bisect_left(entries, key)
+        if index < len(entries) and entries[index] == key:
+            del entries[index]
+            return True
+        return False
+
+    def pop_crossed(self, price: float) -> list:
+        # Ids of the orders crossed by price, removed from the lists
+        end = bisect.bisect_right(self.above, (price, float("inf")))
+        crossed = [order_id for _, order_id in self.above[:end]]
+        del self.above[:end]
+        start = bisect.bisect_left(self.below, (price, -1))
+        crossed += [order_id for _, order_id in self.below[start:]]
+        del self.below[start:]
+        return crossed
+
+
+class OrderEngine:
+    def __init__(self, path: str = ORDERS_PATH, poll_seconds: float = ORDERS_POLL_SECONDS,
+                 fetch_amounts=fetch_token_amounts_async, get_pool_keys=get_pool_keys_async):
+        self.path = path
+        self.poll_seconds = poll_seconds
+        self.fetch_amounts = fetch_amounts
+        self.get_pool_keys = get_pool_keys
+        self.on_trigger = None   # on_trigger(Order, price), must not block
+        self._orders = {}        # order id -> Order
+        self._pools = {}         # pool -> PoolOrders
+        self._by_user = {}       # user id -> set of order ids
+        self._vaults = {}        # pool -> (sol vault, token vault, token decimals)
+        self._prices = {}        # pool -> last price
+        self._task = None
+        self._lock = threading.Lock()
+        self._conn = None
+        if path:
+            self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS orders ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, user_id TEXT NOT NULL, pool TEXT NOT NULL, kind TEXT NOT NULL, "
+                "trigger_price REAL NOT NULL, amount REAL NOT NULL, created_at REAL NOT NULL)"
+            )
+        self._next_id = 1
+
+    def load(self) -> int:
+        if self._conn is None:
+            return 0
+        with self._lock:
+            rows = self._conn.execute("SELECT id, user_id, pool, kind, trigger_price, amount, created_at FROM orders").fetchall()
+        for row in rows:
+            self._index(Order(*row))
+        return len(rows)
+
+    def place(self, user_id, pool: str, kind: str, trigger_price: float, amount: float) -> Order:
+        if kind not in ORDER_KINDS:
+            raise ValueError(f"Unknown order kind: {kind}")
+        created_at = time.time()
+        if self._conn is not None:
+            with self._lock:
+                cursor = self._conn.execute(
+                    "INSERT INTO orders (user_id, pool, kind, trigger_price, amount, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                    (str(user_id), pool, kind, trigger_price, amount, created_at),
+                )
+            order_id = cursor.lastrowid
+        else:
+            order_id = self._next_id
+            self._next_id += 1
+        order = Order(order_id, str(user_id), pool, kind, trigger_price, amount, created_at)
+        self._index(order)
+        return order
+
+    def cancel(self, user_id, order_id: int) -> bool:
+        order = self._orders.get(order_id)
+        if order is None or order.user_id != str(user_id):
+            return False
+        self._unindex(order)
+        self._delete(order.id)
+        return True
+
+    def orders_of(self, user_id, pool: str | None = None) -> list:
+        orders = [self._orders[order_id] for order_id in self._by_user.get(str(user_id), ())]
+        return sorted((order for order in orders if pool is None or order.pool == pool), key=lambda order: order.id)
+
+    def last_price(self, pool: str) -> float | None:
+        return self._prices.get(pool)
+
+    def _index(self, order: Order):
+        self._orders[order.id] = order
+        self._pools.setdefault(order.pool, PoolOrders()).add(order)
+        self._by_user.setdefault(order.user_id, set()).add(order.id)
+
+    def _unindex(self, order: Order):
+        self._orders.pop(order.id, None)
+        pool_orders = self._pools.get(order.pool)
+        if pool_orders is not None:
+            pool_orders.remove(order)
+            if not len(pool_orders):
+                del self._pools[order.pool]
+                self._vaults.pop(order.pool, None)
+        user_orders = self._by_user.get(order.user_id)
+        if user_orders is not None:
+            user_orders.discard(order.id)
+            if not user_orders:
+                del self._by_user[order.user_id]
+
+    def _delete(self, order_id: int):
+        if self._conn is not None:
+            with self._lock:
+                self._conn.execute("DELETE FROM orders WHERE id = ?", (order_id,))
+
+    def update_price(self, pool: str, price: float) -> list:
+        # Fires and removes the orders of the pool crossed by price
+        self._prices[pool] = price
+        pool_orders = self._pools.get(pool)
+        if pool_orders is None:
+            return []
+        triggered = [self._orders[order_id] for order_id in pool_orders.pop_crossed(price)]
+        for order in triggered:
+            # Already out of the sorted lists, _unindex drops the rest
+            self._unindex(order)
+            self._delete(order.id)
+            if self.on_trigger is not None:
+                try:
+                    self.on_trigger(order, price)
+                except Exception as e:
+                    print(f"[ERROR] Order {order.id} could not be submitted: {e}")
+        return triggered
+
+    async def current_price(self, pool: str) -> float | None:
+        vaults = await self._pool_vaults(pool)
+        if vaults is None:
+            return None
+        sol_amount, token_amount = await self.fetch_amounts([vaults[0], vaults[1]])
+        return self._price(vaults[2], sol_amount, token_amount)
+
+    async def _pool_vaults(self, pool: str):
+        vaults = self._vaults.get(pool)
+        if vaults is None:
+            pool_keys = await self.get_pool_keys(pool)
+            if pool_keys is None:
+                return None
+            vaults = (sol_vault(pool_keys), token_vault(pool_keys), token_decimals(pool_keys))
+            self._vaults[pool] = vaults
+        return vaults
+
+    @staticmethod
+    def _price(decimals: int, sol_amount, token_amount) -> float | None:
+        if not sol_amount or not token_amount:
+            return None
+        return (sol_amount / 1e9) / (token_amount / 10**decimals)
+
+    async def poll(self):
+        pools = list(self._pools)
+        if not pools:
+            return
+        all_vaults = await asyncio.gather(*(self._pool_vaults(pool) for pool in pools))
+        watched = [(pool, vaults) for pool, vaults in zip(pools, all_vaults) if vaults is not None]
+        amounts = await self.fetch_amounts([vault for _, vaults in watched for vault in vaults[:2]])
+        for index, (pool, vaults) in enumerate(watched):
+            price = self._price(vaults[2], amounts[2 * index], amounts[2 * index + 1])
+            if price is not None:
+                self.update_price(pool, price)
+
+    async def _run(self):
+        while True:
+            started_at = time.monotonic()
+            try:
+                await self.poll()
+            except Exception as e:
+                print(f"[ERROR] Order watcher poll failed: {e}")
+            await asyncio.sleep(max(0.0, self.poll_seconds - (time.monotonic() - started_at)))
+
+    def start(self, on_trigger):
+        self.on_trigger = on_trigger
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+order_engine = OrderEngine()
+
+
+"""---------------------------------"""
+"""            Benchmark            """
+"""---------------------------------"""
+
+def benchmark(orders: int = 50_000, pools: int = 200, updates: int = 20_000) -> dict:
+    # Random walk prices on pools holding orders around the start price: cost of a
+    # price update with the sorted lists vs checking every order of the pool
+    engine = OrderEngine(path=None)
+    prices = {f"pool{index}": 1.0 for index in range(pools)}
+    fired = {"count": 0}
+    engine.on_trigger = lambda order, price: fired.__setitem__("count", fired["count"] + 1)
+    for index in range(orders):
+        pool = f"pool{index % pools}"
+        kind = random.choice(ORDER_KINDS)
+        trigger = random.uniform(1.01, 3.0) if kind == TAKE_PROFIT else random.uniform(0.3, 0.99)
+        engine.place(index % 5_000, pool, kind, trigger, 50)
+    all_orders = {}
+    for order in engine._orders.values():
+        all_orders.setdefault(order.pool, []).append((order.trigger_price, order.fires_above))
+
+    walk = []
+    for _ in range(updates):
+        pool = f"pool{random.randrange(pools)}"
+        prices[pool] *= random.uniform(0.97, 1.03)
+        walk.append((pool, prices[pool]))
+
+    start = time.perf_counter()
+    for pool, price in walk:
+        engine.update_price(pool, price)
+    sorted_us = (time.perf_counter() - start) / updates * 1e6
+
+    # Checking every order of the pool on each update, for comparison
+    start = time.perf_counter()
+    for pool, price in walk:
+        [trigger for trigger, fires_above in all_orders.get(pool, ()) if (price >= trigger if fires_above else price <= trigger)]
+    linear_us = (time.perf_counter() - start) / updates * 1e6
+
+    return {
+        "orders": orders,
+        "pools": pools,
+        "fired": fired["count"],
+        "sorted_us_per_update": round(sorted_us, 2),
+        "linear_us_per_update": round(linear_us, 2),
+    }
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 2 and sys.argv[1] == "bench":
+        for orders in (10_000, 50_000):
+            print(benchmark(orders=orders))
+    else:
+        print("Usage: python orders.py bench")
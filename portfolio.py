@@ -0,0 +1,103 @@
+import time
+import asyncio
+
+from raydiumFolder.raydium_py.utils.clients import rpc_request
+
+"""---------------------------------"""
+"""            Portfolio            """
+"""---------------------------------"""
+
+# Balances of all the wallets of a user in one snapshot: every SOL balance in one
+# getMultipleAccounts call, the token accounts of each wallet for SPL Token and
+# Token-2022 concurrently. Snapshots are kept a few seconds per user so repeated
+# Refresh taps do not hit the RPC again.
+
+TOKEN_PROGRAM_ID = "TokenkegQfeZyiNwAJbNbGKPFXCWuBvf9Ss623VQ5DA"
+TOKEN_2022_PROGRAM_ID = "TokenzQdBNbLqP5VEhdkAS6EPFLC1PHnBqCXEpPxuEb"
+PORTFOLIO_TTL = 5
+MAX_ACCOUNTS_PER_REQUEST = 100
+
+
+async def fetch_sol_balances(addresses: list) -> dict:
+    # address -> SOL, only the lamports are transferred (zero-length data slice)
+    balances = {}
+    for start in range(0, len(addresses), MAX_ACCOUNTS_PER_REQUEST):
+        chunk = addresses[start:start + MAX_ACCOUNTS_PER_REQUEST]
+        data = await rpc_request("getMultipleAccounts", [chunk, {"encoding": "base64", "dataSlice": {"offset": 0, "length": 0}}])
+        accounts = (data or {}).get("result", {}).get("value") or [None] * len(chunk)
+        for address, account in zip(chunk, accounts):
+            balances[address] = account["lamports"] / 1e9 if account else 0
+    return balances
+
+async def fetch_token_balances(address: str, program_id: str) -> dict:
+    params = [address, {"programId": program_id}, {"encoding": "jsonParsed"}]
+    data = await rpc_request("getTokenAccountsByOwner", params)
+    if data is None:
+        return {}
+
+    tokens = {}
+    for account in data.get("result", {}).get("value", []):
+        token_info = account.get("account", {}).get("data", {}).get("parsed", {}).get("info", {})
+        mint = token_info.get("mint", "Unknown")
+        balance = int(token_info.get("tokenAmount", {}).get("amount", 0))
+        decimals = int(token_info.get("tokenAmount", {}).get("decimals", 0))
+        tokens[mint] = tokens.get(mint, 0) + balance / (10 ** decimals)
+    return tokens
+
+async def fetch_all_token_balances(address: str) -> dict:
+    legacy, token_2022 = await asyncio.gather(
+        fetch_token_balances(address, TOKEN_PROGRAM_ID),
+        fetch_token_balances(address, TOKEN_2022_PROGRAM_ID),
+    )
+    for mint, balance in token_2022.items():
+        legacy[mint] = legacy.get(mint, 0) + balance
+    return legacy
+
+
+class PortfolioCache:
+    def __init__(self, ttl: float = PORTFOLIO_TTL):
+        self.ttl = ttl
+        self._snapshots = {}   # (user_id, addresses, with tokens) -> (fetched_at, snapshot)
+        self._in_flight = {}
+
+    async def get(self, user_id, addresses: list, include_tokens: bool = True) -> dict:
+        # address -> {"sol": float, "tokens": {mint: amount}} ("tokens" empty without include_tokens)
+        key = (str(user_id), tuple(addresses), include_tokens)
+        entry = self._snapshots.get(key)
+        if entry is not None and time.monotonic() - entry[0] < self.ttl:
+            return entry[1]
+
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._fetch(addresses, include_tokens))
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        snapshot = await asyncio.shield(task)
+        self._snapshots[key] = (time.monotonic(), snapshot)
+        self._evict()
+        return snapshot
+
+    def invalidate(self, user_id):
+        # After a trade the balances changed, the next screen must not show the old ones
+        for key in [key for key in self._snapshots if key[0] == str(user_id)]:
+            del self._snapshots[key]
+
+    async def _fetch(self, addresses: list, include_tokens: bool) -> dict:
+        jobs = [fetch_sol_balances(addresses)]
+        if include_tokens:
+            jobs += [fetch_all_token_balances(address) for address in addresses]
+        results = await asyncio.gather(*jobs)
+        sol_balances = results[0]
+        token_balances = results[1:] if include_tokens else [{} for _ in addresses]
+        return {
+            address: {"sol": sol_balances.get(address, 0), "tokens": tokens}
+            for address, tokens in zip(addresses, token_balances)
+        }
+
+    def _evict(self):
+        now = time.monotonic()
+        for key in [key for key, (fetched_at, _) in self._snapshots.items() if now - fetched_at >= self.ttl]:
+            del self._snapshots[key]
+
+
+portfolio_cache = PortfolioCache()
@@ -0,0 +1,198 @@
+import sys
+import time
+import struct
+from types import SimpleNamespace
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from raydiumFolder.raydium_py.layouts.amm_v4 import LIQUIDITY_STATE_LAYOUT_V4, MARKET_STATE_LAYOUT_V3
+
+# Precompiled decoders for the layouts of amm_v4.py. Same field names, but a parse only
+# wraps the bytes: each field is unpacked at its fixed offset the first time it is read.
+
+U64 = struct.Struct("<Q")
+U128 = struct.Struct("<QQ")
+
+LIQUIDITY_STATE_V4_FIELDS = [(name, "u64") for name in (
+    "status", "nonce", "orderNum", "depth", "coinDecimals", "pcDecimals", "state", "resetFlag",
+    "minSize", "volMaxCutRatio", "amountWaveRatio", "coinLotSize", "pcLotSize",
+    "minPriceMultiplier", "maxPriceMultiplier", "systemDecimalsValue",
+    "minSeparateNumerator", "minSeparateDenominator", "tradeFeeNumerator", "tradeFeeDenominator",
+    "pnlNumerator", "pnlDenominator", "swapFeeNumerator", "swapFeeDenominator",
+    "needTakePnlCoin", "needTakePnlPc", "totalPnlPc", "totalPnlCoin",
+    "poolOpenTime", "punishPcAmount", "punishCoinAmount", "orderbookToInitTime",
+)] + [
+    ("swapCoinInAmount", "u128"),
+    ("swapPcOutAmount", "u128"),
+    ("swapCoin2PcFee", "u64"),
+    ("swapPcInAmount", "u128"),
+    ("swapCoinOutAmount", "u128"),
+    ("swapPc2CoinFee", "u64"),
+] + [(name, "pubkey") for name in (
+    "poolCoinTokenAccount", "poolPcTokenAccount", "coinMintAddress", "pcMintAddress",
+    "lpMintAddress", "ammOpenOrders", "serumMarket", "serumProgramId", "ammTargetOrders",
+    "poolWithdrawQueue", "poolTempLpTokenAccount", "ammOwner", "pnlOwner",
+)]
+
+MARKET_STATE_V3_FIELDS = [
+    (None, 5),
+    ("account_flags", "flags"),
+    ("own_address", "pubkey"),
+    ("vault_signer_nonce", "u64"),
+    ("base_mint", "pubkey"),
+    ("quote_mint", "pubkey"),
+    ("base_vault", "pubkey"),
+    ("base_deposits_total", "u64"),
+    ("base_fees_accrued", "u64"),
+    ("quote_vault", "pubkey"),
+    ("quote_deposits_total", "u64"),
+    ("quote_fees_accrued", "u64"),
+    ("quote_dust_threshold", "u64"),
+    ("request_queue", "pubkey"),
+    ("event_queue", "pubkey"),
+    ("bids", "pubkey"),
+    ("asks", "pubkey"),
+    ("base_lot_size", "u64"),
+    ("quote_lot_size", "u64"),
+    ("fee_rate_bps", "u64"),
+    ("referrer_rebate_accrued", "u64"),
+    (None, 7),
+]
+
+ACCOUNT_FLAGS = ("initialized", "market", "open_orders", "request_queue", "event_queue", "bids", "asks")
+FIELD_SIZES = {"u64": 8, "u128": 16, "pubkey": 32, "flags": 8}
+
+
+def _decode_u64(data, offset):
+    return U64.unpack_from(data, offset)[0]
+
+def _decode_u128(data, offset):
+    low, high = U128.unpack_from(data, offset)
+    return low | (high << 64)
+
+def _decode_pubkey(data, offset):
+    return bytes(data[offset:offset + 32])
+
+def _decode_flags(data, offset):
+    value = U64.unpack_from(data, offset)[0]
+    return SimpleNamespace(**{flag: bool(value >> bit & 1) for bit, flag in enumerate(ACCOUNT_FLAGS)})
+
+DECODERS = {"u64": _decode_u64, "u128": _decode_u128, "pubkey": _decode_pubkey, "flags": _decode_flags}
+
+
+class FastLayout:
+    def __init__(self, name: str, fields: list):
+        self.offsets = {}
+        offset = 0
+        properties = {"__slots__": ("_data",)}
+        for field_name, kind in fields:
+            if field_name is None:
+                offset += kind
+                continue
+            self.offsets[field_name] = (offset, kind)
+            properties[field_name] = self._make_property(offset, DECODERS[kind])
+            offset += FIELD_SIZES[kind]
+        self.size = offset
+        self.fields = [field_name for field_name, _ in fields if field_name is not None]
+        self.view_class = type(name, (_LayoutView,), properties)
+
+    @staticmethod
+    def _make_property(offset, decoder):
+        return property(lambda view: decoder(view._data, offset))
+
+    def parse(self, data: bytes):
+        if len(data) < self.size:
+            raise ValueError(f"Expected at least {self.size} bytes, got {len(data)}")
+        return self.view_class(memoryview(data))
+
+    def numpy_dtype(self):
+        if np is None:
+            raise ImportError("numpy is required for batch decoding")
+        names, formats, offsets = [], [], []
+        for field_name, (offset, kind) in self.offsets.items():
+            names.append(field_name)
+            formats.append({"u64": "<u8", "u128": ("<u8", (2,)), "pubkey": ("u1", (32,)), "flags": "<u8"}[kind])
+            offsets.append(offset)
+        return np.dtype({"names": names, "formats": formats, "offsets": offsets, "itemsize": self.size})
+
+    def parse_many(self, blobs: list):
+        # All accounts decoded in one vectorized pass into a NumPy structured array.
+        # u128 fields come back as [low, high] u64 pairs, pubkeys as 32 uint8.
+        dtype = self.numpy_dtype()
+        buffer = b"".join(bytes(blob[:self.size]) for blob in blobs)
+        return np.frombuffer(buffer, dtype=dtype)
+
+
+class _LayoutView:
+    __slots__ = ()
+
+    def __init__(self, data):
+        self._data = data
+
+    def __getitem__(self, name):
+        return getattr(self, name)
+
+
+LIQUIDITY_STATE_V4_FAST = FastLayout("LiquidityStateV4", LIQUIDITY_STATE_V4_FIELDS)
+MARKET_STATE_V3_FAST = FastLayout("MarketStateV3", MARKET_STATE_V3_FIELDS)
+
+
+"""---------------------------------"""
+"""      Equivalence / Benchmark    """
+"""---------------------------------"""
+
+def check_equivalence(fast_layout: FastLayout, construct_layout, blob: bytes) -> list:
+    # Names of the fields whose fast value differs from the construct one
+    parsed = construct_layout.parse(blob)
+    view = fast_layout.parse(blob)
+    mismatches = []
+    for field_name in fast_layout.fields:
+        expected = parsed[field_name]
+        actual = getattr(view, field_name)
+        if field_name == "account_flags":
+            expected = {flag: expected[flag] for flag in ACCOUNT_FLAGS}
+            actual = vars(actual)
+        if expected != actual:
+            mismatches.append(field_name)
+    return mismatches
+
+def market_blob(blob: bytes) -> bytes:
+    # A market account from any bytes: the construct layout only accepts the 7 known
+    # account flags, the rest of the flags word must be zero
+    blob = bytearray(blob[:MARKET_STATE_V3_FAST.size].ljust(MARKET_STATE_V3_FAST.size, b"\0"))
+    blob[5:13] = U64.pack(blob[5] & 0x7F)
+    return bytes(blob)
+
+def benchmark(blob: bytes, runs: int = 20_000) -> tuple:
+    # Microseconds per decode of the fields used to build pool keys
+    used_fields = ("coinDecimals", "pcDecimals", "serumMarket", "poolCoinTokenAccount", "poolPcTokenAccount", "ammOpenOrders", "ammTargetOrders")
+    start = time.perf_counter()
+    for _ in range(runs):
+        parsed = LIQUIDITY_STATE_LAYOUT_V4.parse(blob)
+        [parsed[field_name] for field_name in used_fields]
+    construct_time = (time.perf_counter() - start) / runs * 1e6
+    start = time.perf_counter()
+    for _ in range(runs):
+        view = LIQUIDITY_STATE_V4_FAST.parse(blob)
+        [getattr(view, field_name) for field_name in used_fields]
+    fast_time = (time.perf_counter() - start) / runs * 1e6
+    return construct_time, fast_time
+
+
+if __name__ == "__main__":
+    # python -m raydiumFolder.raydium_py.layouts.amm_v4_fast [recorded_amm_account.bin ...]
+    blobs = [open(path, "rb").read() for path in sys.argv[1:]] or [bytes(range(256)) * 2 + bytes(240)]
+    for blob in blobs:
+        print("Mismatching fields:", check_equivalence(LIQUIDITY_STATE_V4_FAST, LIQUIDITY_STATE_LAYOUT_V4, blob) or "none")
+    market = market_blob(bytes(range(1, 256)) * 2)
+    print("Mismatching market fields:", check_equivalence(MARKET_STATE_V3_FAST, MARKET_STATE_LAYOUT_V3, market) or "none")
+    construct_time, fast_time = benchmark(blobs[0])
+    print(f"construct: {construct_time:.2f} us/parse | fast: {fast_time:.2f} us/parse")
+    if np is not None:
+        batch = blobs[0:1] * 10_000
+        start = time.perf_counter()
+        LIQUIDITY_STATE_V4_FAST.parse_many(batch)
+        print(f"numpy batch of {len(batch)} pools: {(time.perf_counter() - start) * 1000:.2f} ms")
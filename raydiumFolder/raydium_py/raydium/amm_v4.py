@@ -1,144 +1,471 @@
+import asyncio
 import base64
 import os
+from dataclasses import dataclass
 from typing import Optional
 from solders.keypair import Keypair #type: ignore
-from solana.rpc.commitment import Processed
-from solana.rpc.types import TokenAccountOpts, TxOpts
+from solana.rpc.types import TxOpts
 from solders.compute_budget import set_compute_unit_limit, set_compute_unit_price  # type: ignore
 from solders.message import MessageV0  # type: ignore
 from solders.pubkey import Pubkey  # type: ignore
 from solders.system_program import (
     CreateAccountWithSeedParams,
+    TransferParams,
     create_account_with_seed,
+    transfer,
 )
 from solders.transaction import VersionedTransaction  # type: ignore
-from spl.token.client import Token
 from spl.token.instructions import (
     CloseAccountParams,
     InitializeAccountParams,
+    SyncNativeParams,
     close_account,
-    create_associated_token_account,
+    create_idempotent_associated_token_account,
     get_associated_token_address,
     initialize_account,
+    sync_native,
 )
-from raydiumFolder.raydium_py.utils.common_utils import confirm_txn, get_token_balance
+from raydiumFolder.raydium_py.layouts.amm_v4_fast import LIQUIDITY_STATE_V4_FAST
+from raydiumFolder.raydium_py.raydium.amm_v4_quote import minimum_out, quote_buy, quote_sell, sell_amount, sol_and_token_reserves, token_decimals
+from raydiumFolder.raydium_py.utils.accounts import (
+    decode_token_amount,
+    fetch_accounts_raw,
+    fetch_accounts_raw_async,
+    fetch_token_amounts,
+    fetch_token_amounts_async,
+)
+from raydiumFolder.raydium_py.utils.auto_slippage import auto_slippage
+from raydiumFolder.raydium_py.utils.chain_state import (
+    blockhash_service,
+    get_rent_exempt_minimum,
+    get_rent_exempt_minimum_async,
+)
+from raydiumFolder.raydium_py.utils.common_utils import confirm_txn
+from raydiumFolder.raydium_py.utils.compute_units import (
+    CU_PREFLIGHT_SIMULATION,
+    compute_unit_cache,
+    instruction_shape,
+    with_compute_unit_limit,
+)
+from raydiumFolder.raydium_py.utils.confirmation import confirmation_service
+from raydiumFolder.raydium_py.utils.pool_cache import pool_keys_cache
+from raydiumFolder.raydium_py.utils.priority_fees import DEFAULT_FEE_TIER, FALLBACK_UNIT_PRICE, priority_fee_estimator
+from raydiumFolder.raydium_py.utils.token_account_cache import known_token_accounts
 from raydiumFolder.raydium_py.utils.pool_utils import (
     AmmV4PoolKeys,
-    fetch_amm_v4_pool_keys,
-    get_amm_v4_reserves,
-    make_amm_v4_swap_instruction
+    decode_amm_v4_pool_keys,
+    make_amm_v4_swap_instruction,
 )
-from solana.rpc.api import Client
+from raydiumFolder.raydium_py.utils.clients import get_rpc_client, get_async_rpc_client
 from raydiumFolder.raydium_py.raydium.constants import ACCOUNT_LAYOUT_LEN, SOL_DECIMAL, TOKEN_PROGRAM_ID, WSOL
 
-UNIT_BUDGET =  150_000
-UNIT_PRICE =  1_000_000
-RPC = "https://mainnet.helius-rpc.com/?api-key=..." # Your RPC link
-client = Client(RPC)
-
-def buy(pair_address: str, payer_keypair: str, sol_in: float , slippage: int) -> bool:
-    payer_keypairB58 = Keypair.from_base58_string(payer_keypair)
-    try:
-        pool_keys: Optional[AmmV4PoolKeys] = fetch_amm_v4_pool_keys(pair_address)
-        if pool_keys is None:
-            return False, 0, ""
-
-        mint = (
-            pool_keys.base_mint if pool_keys.base_mint != WSOL else pool_keys.quote_mint
+UNIT_BUDGET =  150_000  # requested until the swap shape has been simulated once
+UNIT_PRICE =  FALLBACK_UNIT_PRICE  # used when no priority fee estimate is passed
+# ephemeral: a seeded WSOL account is created and closed in every swap
+# persistent: the wallet keeps its WSOL associated token account between swaps
+EPHEMERAL_WSOL = "ephemeral"
+PERSISTENT_WSOL = "persistent"
+client = get_rpc_client()
+async_client = get_async_rpc_client()
+
+@dataclass
+class SwapState:
+    pool_keys: AmmV4PoolKeys
+    token_account: Pubkey
+    base_vault_amount: Optional[int]
+    quote_vault_amount: Optional[int]
+    token_amount: Optional[int]   # None when the token account does not exist or was not read
+    wsol_account: Pubkey
+    wsol_amount: Optional[int]    # None when the WSOL account does not exist or was not read
+
+def get_token_mint(pool_keys: AmmV4PoolKeys) -> Pubkey:
+    return pool_keys.base_mint if pool_keys.base_mint != WSOL else pool_keys.quote_mint
+
+def fetch_swap_state(pair_address: str, owner: Pubkey, read_token_account: bool = True, read_wsol_account: bool = True) -> Optional[SwapState]:
+    # Everything a swap needs in 1 round trip when the pool keys are cached, 2 otherwise.
+    # Owner accounts that are not read are left as None in the SwapState.
+    # A cold pool is read by one caller at a time (single flight of the pool keys cache).
+    wsol_account = get_associated_token_address(owner, WSOL)
+    pool_keys, swap_state = pool_keys_cache.fetch_once_sync(
+        pair_address, lambda: _fetch_pool_and_swap_state(pair_address, owner, wsol_account, read_token_account, read_wsol_account)
+    )
+    if swap_state is not None or pool_keys is None:
+        return swap_state
+    token_account = get_associated_token_address(owner, get_token_mint(pool_keys))
+    owner_accounts = _owner_accounts(token_account, wsol_account, read_token_account, read_wsol_account)
+    amounts = fetch_token_amounts([pool_keys.base_vault, pool_keys.quote_vault, *owner_accounts])
+    return _make_swap_state(pool_keys, token_account, wsol_account, amounts, read_token_account, read_wsol_account)
+
+async def fetch_swap_state_async(pair_address: str, owner: Pubkey, read_token_account: bool = True, read_wsol_account: bool = True) -> Optional[SwapState]:
+    # Same as fetch_swap_state on the AsyncClient
+    wsol_account = get_associated_token_address(owner, WSOL)
+    pool_keys, swap_state = await pool_keys_cache.fetch_once(
+        pair_address, lambda: _fetch_pool_and_swap_state_async(pair_address, owner, wsol_account, read_token_account, read_wsol_account)
+    )
+    if swap_state is not None or pool_keys is None:
+        return swap_state
+    token_account = get_associated_token_address(owner, get_token_mint(pool_keys))
+    owner_accounts = _owner_accounts(token_account, wsol_account, read_token_account, read_wsol_account)
+    amounts = await fetch_token_amounts_async([pool_keys.base_vault, pool_keys.quote_vault, *owner_accounts])
+    return _make_swap_state(pool_keys, token_account, wsol_account, amounts, read_token_account, read_wsol_account)
+
+def _fetch_pool_and_swap_state(pair_address: str, owner: Pubkey, wsol_account: Pubkey, read_token_account: bool, read_wsol_account: bool) -> tuple:
+    # Cache miss: (pool keys, swap state), the market and the vaults in the same getMultipleAccounts
+    amm_id = Pubkey.from_string(pair_address)
+    amm_data = fetch_accounts_raw([amm_id])[0]
+    if amm_data is None:
+        return None, None
+    amm_data_decoded = LIQUIDITY_STATE_V4_FAST.parse(amm_data)
+    token_account = get_associated_token_address(owner, _token_mint_of_amm(amm_data_decoded))
+    owner_accounts = _owner_accounts(token_account, wsol_account, read_token_account, read_wsol_account)
+    datas = fetch_accounts_raw(_swap_state_accounts(amm_data_decoded) + owner_accounts)
+    pool_keys = decode_amm_v4_pool_keys(amm_id, amm_data_decoded, datas[0])
+    amounts = [decode_token_amount(data) for data in datas[1:]]
+    return pool_keys, _make_swap_state(pool_keys, token_account, wsol_account, amounts, read_token_account, read_wsol_account)
+
+async def _fetch_pool_and_swap_state_async(pair_address: str, owner: Pubkey, wsol_account: Pubkey, read_token_account: bool, read_wsol_account: bool) -> tuple:
+    amm_id = Pubkey.from_string(pair_address)
+    amm_data = (await fetch_accounts_raw_async([amm_id]))[0]
+    if amm_data is None:
+        return None, None
+    amm_data_decoded = LIQUIDITY_STATE_V4_FAST.parse(amm_data)
+    token_account = get_associated_token_address(owner, _token_mint_of_amm(amm_data_decoded))
+    owner_accounts = _owner_accounts(token_account, wsol_account, read_token_account, read_wsol_account)
+    datas = await fetch_accounts_raw_async(_swap_state_accounts(amm_data_decoded) + owner_accounts)
+    pool_keys = decode_amm_v4_pool_keys(amm_id, amm_data_decoded, datas[0])
+    amounts = [decode_token_amount(data) for data in datas[1:]]
+    return pool_keys, _make_swap_state(pool_keys, token_account, wsol_account, amounts, read_token_account, read_wsol_account)
+
+def _token_mint_of_amm(amm_data_decoded) -> Pubkey:
+    coin_mint = Pubkey.from_bytes(amm_data_decoded.coinMintAddress)
+    return coin_mint if coin_mint != WSOL else Pubkey.from_bytes(amm_data_decoded.pcMintAddress)
+
+def _swap_state_accounts(amm_data_decoded) -> list:
+    return [
+        Pubkey.from_bytes(amm_data_decoded.serumMarket),
+        Pubkey.from_bytes(amm_data_decoded.poolCoinTokenAccount),
+        Pubkey.from_bytes(amm_data_decoded.poolPcTokenAccount),
+    ]
+
+def _owner_accounts(token_account: Pubkey, wsol_account: Pubkey, read_token_account: bool, read_wsol_account: bool) -> list:
+    accounts = []
+    if read_token_account:
+        accounts.append(token_account)
+    if read_wsol_account:
+        accounts.append(wsol_account)
+    return accounts
+
+def _make_swap_state(pool_keys, token_account, wsol_account, amounts, read_token_account, read_wsol_account) -> SwapState:
+    # amounts: base vault, quote vault, then the owner accounts that were read
+    base_vault_amount, quote_vault_amount, *owner_amounts = amounts
+    token_amount = owner_amounts.pop(0) if read_token_account else None
+    wsol_amount = owner_amounts.pop(0) if read_wsol_account else None
+    return SwapState(pool_keys, token_account, base_vault_amount, quote_vault_amount, token_amount, wsol_account, wsol_amount)
+
+def make_wsol_top_up_instructions(payer_pubkey: Pubkey, wsol_account: Pubkey, wsol_amount: Optional[int], amount_in: int) -> list:
+    # Persistent mode: create the WSOL account once, then only wrap what is missing for this swap
+    instructions = []
+    if wsol_amount is None:
+        instructions.append(create_idempotent_associated_token_account(payer_pubkey, payer_pubkey, WSOL))
+        wsol_amount = 0
+    if wsol_amount < amount_in:
+        instructions.append(transfer(TransferParams(from_pubkey=payer_pubkey, to_pubkey=wsol_account, lamports=amount_in - wsol_amount)))
+        instructions.append(sync_native(SyncNativeParams(program_id=TOKEN_PROGRAM_ID, account=wsol_account)))
+    return instructions
+
+def make_ephemeral_wsol_instructions(payer_pubkey: Pubkey, lamports: int) -> tuple:
+    # Seeded WSOL account funded with lamports: (account, [create, init], close)
+    seed = base64.urlsafe_b64encode(os.urandom(24)).decode("utf-8")
+    wsol_token_account = Pubkey.create_with_seed(
+        payer_pubkey, seed, TOKEN_PROGRAM_ID
+    )
+
+    create_wsol_account_instruction = create_account_with_seed(
+        CreateAccountWithSeedParams(
+            from_pubkey=payer_pubkey,
+            to_pubkey=wsol_token_account,
+            base=payer_pubkey,
+            seed=seed,
+            lamports=int(lamports),
+            space=ACCOUNT_LAYOUT_LEN,
+            owner=TOKEN_PROGRAM_ID,
         )
+    )
 
-        amount_in = int(sol_in * SOL_DECIMAL)
-
-        base_reserve, quote_reserve, token_decimal = get_amm_v4_reserves(pool_keys)
-        amount_out = sol_for_tokens(sol_in, base_reserve, quote_reserve)
-
-        slippage_adjustment = 1 - (slippage / 100)
-        amount_out_with_slippage = amount_out * slippage_adjustment
-        minimum_amount_out = int(amount_out_with_slippage * 10**token_decimal)
-
-        token_account_check = client.get_token_accounts_by_owner(
-            payer_keypairB58.pubkey(), TokenAccountOpts(mint), Processed
+    init_wsol_account_instruction = initialize_account(
+        InitializeAccountParams(
+            program_id=TOKEN_PROGRAM_ID,
+            account=wsol_token_account,
+            mint=WSOL,
+            owner=payer_pubkey,
         )
-        if token_account_check.value:
-            token_account = token_account_check.value[0].pubkey
-            create_token_account_instruction = None
-        else:
-            token_account = get_associated_token_address(payer_keypairB58.pubkey(), mint)
-            create_token_account_instruction = create_associated_token_account(
-                payer_keypairB58.pubkey(), payer_keypairB58.pubkey(), mint
-            )
+    )
 
-        seed = base64.urlsafe_b64encode(os.urandom(24)).decode("utf-8")
-        wsol_token_account = Pubkey.create_with_seed(
-            payer_keypairB58.pubkey(), seed, TOKEN_PROGRAM_ID
-        )
-        balance_needed = Token.get_min_balance_rent_for_exempt_for_account(client)
-
-        create_wsol_account_instruction = create_account_with_seed(
-            CreateAccountWithSeedParams(
-                from_pubkey=payer_keypairB58.pubkey(),
-                to_pubkey=wsol_token_account,
-                base=payer_keypairB58.pubkey(),
-                seed=seed,
-                lamports=int(balance_needed + amount_in),
-                space=ACCOUNT_LAYOUT_LEN,
-                owner=TOKEN_PROGRAM_ID,
-            )
+    close_wsol_account_instruction = close_account(
+        CloseAccountParams(
+            program_id=TOKEN_PROGRAM_ID,
+            account=wsol_token_account,
+            dest=payer_pubkey,
+            owner=payer_pubkey,
         )
-
-        init_wsol_account_instruction = initialize_account(
-            InitializeAccountParams(
-                program_id=TOKEN_PROGRAM_ID,
-                account=wsol_token_account,
-                mint=WSOL,
-                owner=payer_keypairB58.pubkey(),
-            )
+    )
+    return wsol_token_account, [create_wsol_account_instruction, init_wsol_account_instruction], close_wsol_account_instruction
+
+def make_buy_instructions(
+    payer_pubkey: Pubkey,
+    pool_keys: AmmV4PoolKeys,
+    amount_in: int,
+    minimum_amount_out: int,
+    token_account: Pubkey,
+    create_token_account_instruction,
+    balance_needed: int,
+    wsol_mode: str = EPHEMERAL_WSOL,
+    wsol_amount: Optional[int] = None,
+    unit_price: int = UNIT_PRICE,
+) -> list:
+    instructions = [
+        set_compute_unit_limit(UNIT_BUDGET),
+        set_compute_unit_price(unit_price),
+    ]
+
+    close_wsol_account_instruction = None
+    if wsol_mode == PERSISTENT_WSOL:
+        wsol_token_account = get_associated_token_address(payer_pubkey, WSOL)
+        instructions.extend(make_wsol_top_up_instructions(payer_pubkey, wsol_token_account, wsol_amount, amount_in))
+    else:
+        wsol_token_account, wsol_instructions, close_wsol_account_instruction = make_ephemeral_wsol_instructions(
+            payer_pubkey, balance_needed + amount_in
         )
-
-        swap_instruction = make_amm_v4_swap_instruction(
-            amount_in=amount_in,
-            minimum_amount_out=minimum_amount_out,
-            token_account_in=wsol_token_account,
-            token_account_out=token_account,
-            accounts=pool_keys,
-            owner=payer_keypairB58.pubkey(),
+        instructions.extend(wsol_instructions)
+
+    if create_token_account_instruction:
+        instructions.append(create_token_account_instruction)
+
+    swap_instruction = make_amm_v4_swap_instruction(
+        amount_in=amount_in,
+        minimum_amount_out=minimum_amount_out,
+        token_account_in=wsol_token_account,
+        token_account_out=token_account,
+        accounts=pool_keys,
+        owner=payer_pubkey,
+    )
+    instructions.append(swap_instruction)
+
+    if close_wsol_account_instruction:
+        instructions.append(close_wsol_account_instruction)
+    return instructions
+
+def make_sell_instructions(
+    payer_pubkey: Pubkey,
+    pool_keys: AmmV4PoolKeys,
+    amount_in: int,
+    minimum_amount_out: int,
+    token_account: Pubkey,
+    balance_needed: int,
+    close_token_account: bool,
+    wsol_mode: str = EPHEMERAL_WSOL,
+    wsol_amount: Optional[int] = None,
+    unit_price: int = UNIT_PRICE,
+) -> list:
+    instructions = [
+        set_compute_unit_limit(UNIT_BUDGET),
+        set_compute_unit_price(unit_price),
+    ]
+
+    close_wsol_account_instruction = None
+    if wsol_mode == PERSISTENT_WSOL:
+        # The SOL received stays wrapped in the WSOL account for the next buy
+        wsol_token_account = get_associated_token_address(payer_pubkey, WSOL)
+        if wsol_amount is None:
+            instructions.append(create_idempotent_associated_token_account(payer_pubkey, payer_pubkey, WSOL))
+    else:
+        wsol_token_account, wsol_instructions, close_wsol_account_instruction = make_ephemeral_wsol_instructions(
+            payer_pubkey, balance_needed
         )
+        instructions.extend(wsol_instructions)
+
+    swap_instructions = make_amm_v4_swap_instruction(
+        amount_in=amount_in,
+        minimum_amount_out=minimum_amount_out,
+        token_account_in=token_account,
+        token_account_out=wsol_token_account,
+        accounts=pool_keys,
+        owner=payer_pubkey,
+    )
+    instructions.append(swap_instructions)
+
+    if close_wsol_account_instruction:
+        instructions.append(close_wsol_account_instruction)
 
-        close_wsol_account_instruction = close_account(
+    if close_token_account:
+        close_token_account_instruction = close_account(
             CloseAccountParams(
                 program_id=TOKEN_PROGRAM_ID,
-                account=wsol_token_account,
-                dest=payer_keypairB58.pubkey(),
-                owner=payer_keypairB58.pubkey(),
+                account=token_account,
+                dest=payer_pubkey,
+                owner=payer_pubkey,
             )
         )
+        instructions.append(close_token_account_instruction)
+    return instructions
+
+def apply_slippage(swap_state: SwapState, quote, slippage: Optional[float]) -> int:
+    # slippage None = auto: tolerance from the pool's price impact, volatility and past shortfalls
+    pair_address = str(swap_state.pool_keys.amm_id)
+    auto_slippage.record_reserves(
+        pair_address, *sol_and_token_reserves(swap_state.pool_keys, swap_state.base_vault_amount, swap_state.quote_vault_amount)
+    )
+    if slippage is None:
+        slippage = auto_slippage.slippage_for(pair_address, quote.price_impact)
+    return minimum_out(quote.amount_out, slippage)
+
+def prepare_buy(swap_state: SwapState, payer_pubkey: Pubkey, sol_in: float, slippage: Optional[float], balance_needed: int, wsol_mode: str, unit_price: int = UNIT_PRICE) -> tuple:
+    # (instructions, expected token amount out, quote)
+    pool_keys = swap_state.pool_keys
+    amount_in = round(sol_in * SOL_DECIMAL)
+
+    quote = quote_buy(pool_keys, swap_state.base_vault_amount, swap_state.quote_vault_amount, amount_in)
+    amount_out = quote.amount_out / 10**token_decimals(pool_keys)
+    minimum_amount_out = apply_slippage(swap_state, quote, slippage)
+
+    # The output account is never read before a buy: if it is not known to exist,
+    # the idempotent create is a no-op when it does
+    if swap_state.token_amount is not None or known_token_accounts.contains(payer_pubkey, swap_state.token_account):
+        create_token_account_instruction = None
+    else:
+        create_token_account_instruction = create_idempotent_associated_token_account(
+            payer_pubkey, payer_pubkey, get_token_mint(pool_keys)
+        )
 
-        instructions = [
-            set_compute_unit_limit(UNIT_BUDGET),
-            set_compute_unit_price(UNIT_PRICE),
-            create_wsol_account_instruction,
-            init_wsol_account_instruction,
-        ]
-
-        if create_token_account_instruction:
-            instructions.append(create_token_account_instruction)
-
-        instructions.append(swap_instruction)
-        instructions.append(close_wsol_account_instruction)
+    instructions = make_buy_instructions(
+        payer_pubkey,
+        pool_keys,
+        amount_in,
+        minimum_amount_out,
+        swap_state.token_account,
+        create_token_account_instruction,
+        balance_needed,
+        wsol_mode,
+        swap_state.wsol_amount,
+        unit_price,
+    )
+    return instructions, amount_out, quote
+
+def prepare_sell(swap_state: SwapState, payer_pubkey: Pubkey, percentage: float, slippage: Optional[float], balance_needed: int, wsol_mode: str, unit_price: int = UNIT_PRICE) -> Optional[tuple]:
+    # (instructions, token amount sold, expected SOL out, quote, token account closed), None when there is nothing to sell
+    if not swap_state.token_amount:
+        known_token_accounts.discard(payer_pubkey, swap_state.token_account)
+        return None
+    known_token_accounts.add(payer_pubkey, swap_state.token_account)
+    pool_keys = swap_state.pool_keys
+
+    amount_in = sell_amount(swap_state.token_amount, percentage)
+    closes = amount_in == swap_state.token_amount
+    token_balance = amount_in / 10**token_decimals(pool_keys)
+
+    quote = quote_sell(pool_keys, swap_state.base_vault_amount, swap_state.quote_vault_amount, amount_in)
+    amount_out = quote.amount_out / SOL_DECIMAL
+    minimum_amount_out = apply_slippage(swap_state, quote, slippage)
+
+    instructions = make_sell_instructions(
+        payer_pubkey,
+        pool_keys,
+        amount_in,
+        minimum_amount_out,
+        swap_state.token_account,
+        balance_needed,
+        closes,
+        wsol_mode,
+        swap_state.wsol_amount,
+        unit_price,
+    )
+    return instructions, token_balance, amount_out, quote, closes
+
+def sol_vault(pool_keys: AmmV4PoolKeys) -> Pubkey:
+    return pool_keys.base_vault if pool_keys.base_mint == WSOL else pool_keys.quote_vault
+
+def token_vault(pool_keys: AmmV4PoolKeys) -> Pubkey:
+    return pool_keys.quote_vault if pool_keys.base_mint == WSOL else pool_keys.base_vault
+
+def track_auto_slippage(pair_address: str, slippage: Optional[float], confirmed: Optional[bool], txn_sig, out_vault: Pubkey, quote):
+    # Auto-slippage trades feed back how far the realized output landed from the quote
+    if slippage is not None:
+        return
+    if confirmed:
+        asyncio.create_task(auto_slippage.record_realized_output(pair_address, txn_sig, out_vault, quote.amount_out))
+    elif confirmed is False:
+        auto_slippage.record_result(pair_address, quote.amount_out, None)
+
+def update_known_token_accounts(owner: Pubkey, token_account: Pubkey, confirmed: bool, closed: bool):
+    # A confirmed swap leaves the token account open unless the sell closed it.
+    # After a failed or unconfirmed swap its state is unknown again.
+    if confirmed and not closed:
+        known_token_accounts.add(owner, token_account)
+    else:
+        known_token_accounts.discard(owner, token_account)
+
+def right_size_compute_units(pair_address: str, payer_keypairB58: Keypair, instructions: list, blockhash) -> list:
+    # Unit limit from the cache, measured with one simulateTransaction the first time a shape is seen
+    shape = instruction_shape(instructions)
+    units = compute_unit_cache.get(pair_address, shape)
+    if units is None and CU_PREFLIGHT_SIMULATION:
+        try:
+            simulation = client.simulate_transaction(compile_transaction(payer_keypairB58, instructions, blockhash)).value
+            units = record_simulation(pair_address, shape, simulation)
+        except Exception as e:
+            print(f"[ERROR] Could not simulate swap for {pair_address}: {e}")
+    return with_compute_unit_limit(instructions, units) if units else instructions
+
+async def right_size_compute_units_async(pair_address: str, payer_keypairB58: Keypair, instructions: list, blockhash) -> list:
+    shape = instruction_shape(instructions)
+    units = compute_unit_cache.get(pair_address, shape)
+    if units is None and CU_PREFLIGHT_SIMULATION:
+        try:
+            simulation = (await async_client.simulate_transaction(compile_transaction(payer_keypairB58, instructions, blockhash))).value
+            units = record_simulation(pair_address, shape, simulation)
+        except Exception as e:
+            print(f"[ERROR] Could not simulate swap for {pair_address}: {e}")
+    return with_compute_unit_limit(instructions, units) if units else instructions
+
+def record_simulation(pair_address: str, shape: tuple, simulation) -> Optional[int]:
+    # A failed simulation (slippage, balance...) says nothing about the cost of the swap
+    if simulation.err is not None or not simulation.units_consumed:
+        return None
+    compute_unit_cache.record(pair_address, shape, simulation.units_consumed)
+    return compute_unit_cache.get(pair_address, shape)
+
+def compile_transaction(payer_keypairB58: Keypair, instructions: list, blockhash) -> VersionedTransaction:
+    compiled_message = MessageV0.try_compile(
+        payer_keypairB58.pubkey(),
+        instructions,
+        [],
+        blockhash,
+    )
+    return VersionedTransaction(compiled_message, [payer_keypairB58])
+
+def buy(pair_address: str, payer_keypair: str, sol_in: float , slippage: Optional[float], wsol_mode: str = EPHEMERAL_WSOL, fee_tier: str = DEFAULT_FEE_TIER) -> bool:
+    payer_keypairB58 = Keypair.from_base58_string(payer_keypair)
+    try:
+        swap_state = fetch_swap_state(
+            pair_address, payer_keypairB58.pubkey(), read_token_account=False, read_wsol_account=wsol_mode == PERSISTENT_WSOL
+        )
+        if swap_state is None:
+            return False, 0, ""
 
-        compiled_message = MessageV0.try_compile(
-            payer_keypairB58.pubkey(),
-            instructions,
-            [],
-            client.get_latest_blockhash().value.blockhash,
+        instructions, amount_out, quote = prepare_buy(
+            swap_state, payer_keypairB58.pubkey(), sol_in, slippage, get_rent_exempt_minimum(), wsol_mode,
+            priority_fee_estimator.estimate(pair_address, fee_tier),
         )
 
+        blockhash, _ = blockhash_service.get_sync()
+        instructions = right_size_compute_units(pair_address, payer_keypairB58, instructions, blockhash)
         txn_sig = client.send_transaction(
-            txn=VersionedTransaction(compiled_message, [payer_keypairB58]),
+            txn=compile_transaction(payer_keypairB58, instructions, blockhash),
             opts=TxOpts(skip_preflight=True),
         ).value
 
         confirmed = confirm_txn(txn_sig)
+        update_known_token_accounts(payer_keypairB58.pubkey(), swap_state.token_account, confirmed, False)
 
         return confirmed, amount_out, txn_sig
 
@@ -146,7 +473,7 @@ def buy(pair_address: str, payer_keypair: str, sol_in: float , slippage: int) ->
         print("Error occurred during transaction:", e)
         return False, 0 ,""
 
-def sell(pair_address: str, payer_keypair: str, percentage: int, slippage: int) -> bool:
+def sell(pair_address: str, payer_keypair: str, percentage: int, slippage: Optional[float], wsol_mode: str = EPHEMERAL_WSOL, fee_tier: str = DEFAULT_FEE_TIER) -> bool:
     payer_keypairB58 = Keypair.from_base58_string(payer_keypair)
     payer_pubkey = payer_keypairB58.pubkey()  # Utilisation correcte de la clé publique
 
@@ -154,127 +481,103 @@ def sell(pair_address: str, payer_keypair: str, percentage: int, slippage: int)
         if not (1 <= percentage <= 100):
             return False, 0, 0, ""
 
-        pool_keys: Optional[AmmV4PoolKeys] = fetch_amm_v4_pool_keys(pair_address)
-        if pool_keys is None:
+        swap_state = fetch_swap_state(pair_address, payer_pubkey)
+        if swap_state is None:
             return False, 0, 0, ""
 
-        mint = (
-            pool_keys.base_mint if pool_keys.base_mint != WSOL else pool_keys.quote_mint
+        prepared = prepare_sell(
+            swap_state, payer_pubkey, percentage, slippage, get_rent_exempt_minimum(), wsol_mode,
+            priority_fee_estimator.estimate(pair_address, fee_tier),
         )
+        if prepared is None:
+            # Nothing to sell: no transaction, txn_sig is None instead of ""
+            return False, 0, 0, None
+        instructions, token_balance, amount_out, quote, closes = prepared
 
-        token_balance = get_token_balance(str(mint), payer_keypair)
-
-        if token_balance == 0 or token_balance is None:
-            return False, 0, 0, ""
-
-        token_balance = token_balance * (percentage / 100)
-
-        base_reserve, quote_reserve, token_decimal = get_amm_v4_reserves(pool_keys)
-        amount_out = tokens_for_sol(token_balance, base_reserve, quote_reserve)
+        blockhash, _ = blockhash_service.get_sync()
+        instructions = right_size_compute_units(pair_address, payer_keypairB58, instructions, blockhash)
+        txn_sig = client.send_transaction(
+            txn=compile_transaction(payer_keypairB58, instructions, blockhash),
+            opts=TxOpts(skip_preflight=True),
+        ).value
 
-        slippage_adjustment = 1 - (slippage / 100)
-        amount_out_with_slippage = amount_out * slippage_adjustment
-        minimum_amount_out = int(amount_out_with_slippage * SOL_DECIMAL)
+        confirmed = confirm_txn(txn_sig)
+        update_known_token_accounts(payer_pubkey, swap_state.token_account, confirmed, closes)
+        return confirmed, token_balance, amount_out, txn_sig
 
-        amount_in = int(token_balance * 10**token_decimal)
-        token_account = get_associated_token_address(payer_pubkey, mint)
+    except Exception as e:
+        print("Error occurred during transaction:", e)
+        return False, 0, 0, ""
 
-        seed = base64.urlsafe_b64encode(os.urandom(24)).decode("utf-8")
-        wsol_token_account = Pubkey.create_with_seed(
-            payer_pubkey, seed, TOKEN_PROGRAM_ID
-        )
-        balance_needed = Token.get_min_balance_rent_for_exempt_for_account(client)
-
-        create_wsol_account_instruction = create_account_with_seed(
-            CreateAccountWithSeedParams(
-                from_pubkey=payer_pubkey,
-                to_pubkey=wsol_token_account,
-                base=payer_pubkey,
-                seed=seed,
-                lamports=int(balance_needed),
-                space=ACCOUNT_LAYOUT_LEN,
-                owner=TOKEN_PROGRAM_ID,
-            )
+async def buy_async(pair_address: str, payer_keypair: str, sol_in: float , slippage: Optional[float], wsol_mode: str = EPHEMERAL_WSOL, fee_tier: str = DEFAULT_FEE_TIER) -> bool:
+    # Same steps as buy() but every RPC call is awaited on the AsyncClient
+    payer_keypairB58 = Keypair.from_base58_string(payer_keypair)
+    try:
+        swap_state = await fetch_swap_state_async(
+            pair_address, payer_keypairB58.pubkey(), read_token_account=False, read_wsol_account=wsol_mode == PERSISTENT_WSOL
         )
+        if swap_state is None:
+            return False, 0, ""
+        return await buy_with_state_async(pair_address, payer_keypairB58, swap_state, sol_in, slippage, wsol_mode, fee_tier)
 
-        init_wsol_account_instruction = initialize_account(
-            InitializeAccountParams(
-                program_id=TOKEN_PROGRAM_ID,
-                account=wsol_token_account,
-                mint=WSOL,
-                owner=payer_pubkey,
-            )
-        )
+    except Exception as e:
+        print("Error occurred during transaction:", e)
+        return False, 0 ,""
 
-        swap_instructions = make_amm_v4_swap_instruction(
-            amount_in=amount_in,
-            minimum_amount_out=minimum_amount_out,
-            token_account_in=token_account,
-            token_account_out=wsol_token_account,
-            accounts=pool_keys,
-            owner=payer_pubkey,
-        )
+async def buy_with_state_async(pair_address: str, payer_keypairB58: Keypair, swap_state: SwapState, sol_in: float, slippage: Optional[float],
+                               wsol_mode: str = EPHEMERAL_WSOL, fee_tier: str = DEFAULT_FEE_TIER, on_sent=None) -> tuple:
+    # The send/confirm half of buy_async, for callers that already hold the swap state
+    # (the sniper builds it from the pool creation). on_sent(txn_sig) runs right after the send.
+    instructions, amount_out, quote = prepare_buy(
+        swap_state, payer_keypairB58.pubkey(), sol_in, slippage, await get_rent_exempt_minimum_async(), wsol_mode,
+        priority_fee_estimator.estimate(pair_address, fee_tier),
+    )
+
+    blockhash, last_valid_block_height = await blockhash_service.get_async()
+    instructions = await right_size_compute_units_async(pair_address, payer_keypairB58, instructions, blockhash)
+    raw_txn = bytes(compile_transaction(payer_keypairB58, instructions, blockhash))
+    txn_sig = (await async_client.send_raw_transaction(raw_txn, opts=TxOpts(skip_preflight=True))).value
+    if on_sent is not None:
+        on_sent(txn_sig)
+
+    confirmed = await confirmation_service.confirm(txn_sig, raw_txn, last_valid_block_height)
+    update_known_token_accounts(payer_keypairB58.pubkey(), swap_state.token_account, confirmed, False)
+    track_auto_slippage(pair_address, slippage, confirmed, txn_sig, token_vault(swap_state.pool_keys), quote)
+
+    return confirmed, amount_out, txn_sig
+
+async def sell_async(pair_address: str, payer_keypair: str, percentage: int, slippage: Optional[float], wsol_mode: str = EPHEMERAL_WSOL, fee_tier: str = DEFAULT_FEE_TIER) -> bool:
+    # Same steps as sell() but every RPC call is awaited on the AsyncClient
+    payer_keypairB58 = Keypair.from_base58_string(payer_keypair)
+    payer_pubkey = payer_keypairB58.pubkey()
 
-        close_wsol_account_instruction = close_account(
-            CloseAccountParams(
-                program_id=TOKEN_PROGRAM_ID,
-                account=wsol_token_account,
-                dest=payer_pubkey,
-                owner=payer_pubkey,
-            )
-        )
+    try:
+        if not (1 <= percentage <= 100):
+            return False, 0, 0, ""
 
-        instructions = [
-            set_compute_unit_limit(UNIT_BUDGET),
-            set_compute_unit_price(UNIT_PRICE),
-            create_wsol_account_instruction,
-            init_wsol_account_instruction,
-            swap_instructions,
-            close_wsol_account_instruction,
-        ]
-
-        if percentage == 100:
-            close_token_account_instruction = close_account(
-                CloseAccountParams(
-                    program_id=TOKEN_PROGRAM_ID,
-                    account=token_account,
-                    dest=payer_pubkey,
-                    owner=payer_pubkey,
-                )
-            )
-            instructions.append(close_token_account_instruction)
+        swap_state = await fetch_swap_state_async(pair_address, payer_pubkey)
+        if swap_state is None:
+            return False, 0, 0, ""
 
-        compiled_message = MessageV0.try_compile(
-            payer_pubkey,
-            instructions,
-            [],
-            client.get_latest_blockhash().value.blockhash,
+        prepared = prepare_sell(
+            swap_state, payer_pubkey, percentage, slippage, await get_rent_exempt_minimum_async(), wsol_mode,
+            priority_fee_estimator.estimate(pair_address, fee_tier),
         )
-
-        txn_sig = client.send_transaction(
-            txn=VersionedTransaction(compiled_message, [payer_keypairB58]),
-            opts=TxOpts(skip_preflight=True),
-        ).value
-
-        confirmed = confirm_txn(txn_sig)
+        if prepared is None:
+            # Nothing to sell: no transaction, txn_sig is None instead of ""
+            return False, 0, 0, None
+        instructions, token_balance, amount_out, quote, closes = prepared
+
+        blockhash, last_valid_block_height = await blockhash_service.get_async()
+        instructions = await right_size_compute_units_async(pair_address, payer_keypairB58, instructions, blockhash)
+        raw_txn = bytes(compile_transaction(payer_keypairB58, instructions, blockhash))
+        txn_sig = (await async_client.send_raw_transaction(raw_txn, opts=TxOpts(skip_preflight=True))).value
+
+        confirmed = await confirmation_service.confirm(txn_sig, raw_txn, last_valid_block_height)
+        update_known_token_accounts(payer_pubkey, swap_state.token_account, confirmed, closes)
+        track_auto_slippage(pair_address, slippage, confirmed, txn_sig, sol_vault(swap_state.pool_keys), quote)
         return confirmed, token_balance, amount_out, txn_sig
 
     except Exception as e:
         print("Error occurred during transaction:", e)
         return False, 0, 0, ""
-    
-
-
-def sol_for_tokens(sol_amount, base_vault_balance, quote_vault_balance, swap_fee=0.25):
-    effective_sol_used = sol_amount - (sol_amount * (swap_fee / 100))
-    constant_product = base_vault_balance * quote_vault_balance
-    updated_base_vault_balance = constant_product / (quote_vault_balance + effective_sol_used)
-    tokens_received = base_vault_balance - updated_base_vault_balance
-    return round(tokens_received, 9)
-
-def tokens_for_sol(token_amount, base_vault_balance, quote_vault_balance, swap_fee=0.25):
-    effective_tokens_sold = token_amount * (1 - (swap_fee / 100))
-    constant_product = base_vault_balance * quote_vault_balance
-    updated_quote_vault_balance = constant_product / (base_vault_balance + effective_tokens_sold)
-    sol_received = quote_vault_balance - updated_quote_vault_balance
-    return round(sol_received, 9)
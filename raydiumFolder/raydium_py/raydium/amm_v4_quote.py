@@ -0,0 +1,165 @@
+import sys
+import time
+import random
+from dataclasses import dataclass
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from raydiumFolder.raydium_py.raydium.constants import WSOL
+
+# Constant-product quotes computed like the AMM v4 program does (swap_base_in), on raw
+# u64 amounts with the pool's own swap fee:
+#   fee        = ceil(amount_in * swapFeeNumerator / swapFeeDenominator)
+#   amount_out = reserve_out * (amount_in - fee) // (reserve_in + amount_in - fee)
+# Reserves are the vault amounts; the PnL the AMM still has to take is ignored.
+DEFAULT_SWAP_FEE_NUMERATOR = 25
+DEFAULT_SWAP_FEE_DENOMINATOR = 10_000
+
+
+@dataclass
+class Quote:
+    amount_in: int
+    amount_out: int
+    minimum_amount_out: int
+    fee: int
+    price_impact: float  # % of the spot price lost to the pool curve, fee excluded
+
+
+def swap_fee(amount_in: int, fee_numerator: int = DEFAULT_SWAP_FEE_NUMERATOR, fee_denominator: int = DEFAULT_SWAP_FEE_DENOMINATOR) -> int:
+    return -(-amount_in * fee_numerator // fee_denominator)
+
+def minimum_out(amount_out: int, slippage: float) -> int:
+    # slippage in %, applied in basis points so the result stays an integer
+    slippage_bps = max(0, min(10_000, round(slippage * 100)))
+    return amount_out * (10_000 - slippage_bps) // 10_000
+
+def sell_amount(token_amount: int, percentage: float) -> int:
+    # percentage of a raw token balance in basis points, the balance does not fit a float
+    if percentage >= 100:
+        return token_amount
+    return token_amount * max(0, round(percentage * 100)) // 10_000
+
+def quote_exact_in(amount_in: int, reserve_in: int, reserve_out: int, slippage: float = 0.0,
+                   fee_numerator: int = DEFAULT_SWAP_FEE_NUMERATOR, fee_denominator: int = DEFAULT_SWAP_FEE_DENOMINATOR) -> Quote:
+    fee = swap_fee(amount_in, fee_numerator, fee_denominator)
+    amount_in_after_fee = amount_in - fee
+    if reserve_in <= 0 or reserve_out <= 0 or amount_in_after_fee <= 0:
+        return Quote(amount_in, 0, 0, fee, 0.0)
+    amount_out = reserve_out * amount_in_after_fee // (reserve_in + amount_in_after_fee)
+    price_impact = amount_in_after_fee / (reserve_in + amount_in_after_fee) * 100
+    return Quote(amount_in, amount_out, minimum_out(amount_out, slippage), fee, price_impact)
+
+def token_decimals(pool_keys) -> int:
+    return pool_keys.quote_decimals if pool_keys.base_mint == WSOL else pool_keys.base_decimals
+
+def sol_and_token_reserves(pool_keys, base_vault_amount: int, quote_vault_amount: int) -> tuple:
+    # Raw (SOL reserve, token reserve) whatever side of the pool WSOL is on
+    if pool_keys.base_mint == WSOL:
+        return base_vault_amount, quote_vault_amount
+    return quote_vault_amount, base_vault_amount
+
+def quote_buy(pool_keys, base_vault_amount: int, quote_vault_amount: int, lamports_in: int, slippage: float = 0.0) -> Quote:
+    sol_reserve, token_reserve = sol_and_token_reserves(pool_keys, base_vault_amount, quote_vault_amount)
+    return quote_exact_in(lamports_in, sol_reserve, token_reserve, slippage, pool_keys.swap_fee_numerator, pool_keys.swap_fee_denominator)
+
+def quote_sell(pool_keys, base_vault_amount: int, quote_vault_amount: int, tokens_in: int, slippage: float = 0.0) -> Quote:
+    sol_reserve, token_reserve = sol_and_token_reserves(pool_keys, base_vault_amount, quote_vault_amount)
+    return quote_exact_in(tokens_in, token_reserve, sol_reserve, slippage, pool_keys.swap_fee_numerator, pool_keys.swap_fee_denominator)
+
+
+def quote_many(amounts_in, reserves_in, reserves_out, fee_numerators=DEFAULT_SWAP_FEE_NUMERATOR, fee_denominators=DEFAULT_SWAP_FEE_DENOMINATOR) -> tuple:
+    # Every size of amounts_in (S,) against every pool of reserves_* (P,) in one pass.
+    # Returns (amount_out, price_impact %) arrays of shape (P, S). Computed in float64, so
+    # amounts can be off by a few units on large reserves: previews only, trades use quote_exact_in.
+    if np is None:
+        raise ImportError("numpy is required for batch quoting")
+    amounts_in = np.asarray(amounts_in, dtype=np.float64)[np.newaxis, :]
+    reserves_in = np.asarray(reserves_in, dtype=np.float64)[:, np.newaxis]
+    reserves_out = np.asarray(reserves_out, dtype=np.float64)[:, np.newaxis]
+    fee_numerators = np.asarray(fee_numerators, dtype=np.float64).reshape(-1, 1)
+    fee_denominators = np.asarray(fee_denominators, dtype=np.float64).reshape(-1, 1)
+
+    amounts_after_fee = amounts_in - np.ceil(amounts_in * fee_numerators / fee_denominators)
+    denominators = reserves_in + amounts_after_fee
+    with np.errstate(divide="ignore", invalid="ignore"):
+        amounts_out = np.floor(reserves_out * amounts_after_fee / denominators)
+        price_impacts = amounts_after_fee / denominators * 100
+    valid = (reserves_in > 0) & (reserves_out > 0) & (amounts_after_fee > 0)
+    return np.where(valid, amounts_out, 0.0), np.where(valid, price_impacts, 0.0)
+
+
+"""---------------------------------"""
+"""     Property Tests / Benchmark  """
+"""---------------------------------"""
+
+def on_chain_swap_base_in(amount_in: int, reserve_in: int, reserve_out: int, fee_numerator: int, fee_denominator: int) -> int:
+    # Step by step port of the program's swap_base_in (u128 checked math, ceil-div fee)
+    U128_MAX = 2**128 - 1
+    product = amount_in * fee_numerator
+    assert product <= U128_MAX
+    fee = (product + fee_denominator - 1) // fee_denominator
+    amount_in_after_fee = amount_in - fee
+    numerator = reserve_out * amount_in_after_fee
+    assert numerator <= U128_MAX
+    return numerator // (reserve_in + amount_in_after_fee)
+
+def check_properties(samples: int = 100_000, seed: int = 0) -> list:
+    # Random u64 pools and sizes; returns the failing cases
+    rng = random.Random(seed)
+    failures = []
+    for _ in range(samples):
+        reserve_in = max(1, rng.randint(1, 2**64 - 1) >> rng.randint(0, 60))
+        reserve_out = max(1, rng.randint(1, 2**64 - 1) >> rng.randint(0, 60))
+        amount_in = max(1, rng.randint(1, 2**64 - 1) >> rng.randint(0, 63))
+        fee_numerator, fee_denominator = rng.choice(((25, 10_000), (30, 10_000), (0, 10_000), (1, 100)))
+        quote = quote_exact_in(amount_in, reserve_in, reserve_out, 1.0, fee_numerator, fee_denominator)
+        expected = on_chain_swap_base_in(amount_in, reserve_in, reserve_out, fee_numerator, fee_denominator)
+        bigger = quote_exact_in(amount_in + 1, reserve_in, reserve_out, 1.0, fee_numerator, fee_denominator)
+        checks = (
+            quote.amount_out == expected,
+            quote.amount_out < reserve_out,
+            quote.minimum_amount_out <= quote.amount_out,
+            bigger.amount_out >= quote.amount_out,
+            # k never decreases
+            (reserve_in + amount_in) * (reserve_out - quote.amount_out) >= reserve_in * reserve_out,
+        )
+        if not all(checks):
+            failures.append((amount_in, reserve_in, reserve_out, fee_numerator, fee_denominator, checks))
+    return failures
+
+def benchmark(pools: int = 10_000, sizes: int = 8) -> tuple:
+    # Quotes per second of the exact scalar path and of the vectorized path
+    rng = random.Random(1)
+    reserves_in = [rng.randint(10**9, 10**13) for _ in range(pools)]
+    reserves_out = [rng.randint(10**12, 10**18) for _ in range(pools)]
+    amounts_in = [int(10**9 * size / 10) for size in range(1, sizes + 1)]
+
+    start = time.perf_counter()
+    for reserve_in, reserve_out in zip(reserves_in, reserves_out):
+        for amount_in in amounts_in:
+            quote_exact_in(amount_in, reserve_in, reserve_out, 1.0)
+    scalar_rate = pools * sizes / (time.perf_counter() - start)
+
+    vector_rate = None
+    if np is not None:
+        start = time.perf_counter()
+        quote_many(amounts_in, reserves_in, reserves_out)
+        vector_rate = pools * sizes / (time.perf_counter() - start)
+    return scalar_rate, vector_rate
+
+
+if __name__ == "__main__":
+    # python -m raydiumFolder.raydium_py.raydium.amm_v4_quote check|bench
+    if len(sys.argv) == 2 and sys.argv[1] == "check":
+        failures = check_properties()
+        print(f"{len(failures)} failing cases" + (f", first: {failures[0]}" if failures else ""))
+    elif len(sys.argv) == 2 and sys.argv[1] == "bench":
+        scalar_rate, vector_rate = benchmark()
+        print(f"exact: {scalar_rate:,.0f} quotes/s")
+        if vector_rate is not None:
+            print(f"numpy: {vector_rate:,.0f} quotes/s")
+    else:
+        print("Usage: python -m raydiumFolder.raydium_py.raydium.amm_v4_quote check|bench")
@@ -0,0 +1,52 @@
+import struct
+import asyncio
+from typing import Optional
+
+from solana.rpc.commitment import Processed
+from solana.rpc.types import DataSliceOpts
+from solders.pubkey import Pubkey  # type: ignore
+
+from raydiumFolder.raydium_py.utils.clients import get_rpc_client, get_async_rpc_client
+
+# Raw account access: getMultipleAccounts with base64 encoding, decoded to bytes by solders.
+# Amounts are read as exact u64 integers instead of json-parsed float uiAmount.
+MAX_ACCOUNTS_PER_REQUEST = 100
+TOKEN_ACCOUNT_AMOUNT_OFFSET = 64
+TOKEN_AMOUNT_SLICE = DataSliceOpts(offset=TOKEN_ACCOUNT_AMOUNT_OFFSET, length=8)
+
+client = get_rpc_client()
+async_client = get_async_rpc_client()
+
+
+def _chunks(pubkeys: list) -> list:
+    return [pubkeys[i:i + MAX_ACCOUNTS_PER_REQUEST] for i in range(0, len(pubkeys), MAX_ACCOUNTS_PER_REQUEST)]
+
+def fetch_accounts_raw(pubkeys: list[Pubkey], data_slice: Optional[DataSliceOpts] = None) -> list[Optional[bytes]]:
+    datas = []
+    for chunk in _chunks(pubkeys):
+        response = client.get_multiple_accounts(chunk, Processed, encoding="base64", data_slice=data_slice)
+        datas.extend(account.data if account is not None else None for account in response.value)
+    return datas
+
+async def fetch_accounts_raw_async(pubkeys: list[Pubkey], data_slice: Optional[DataSliceOpts] = None) -> list[Optional[bytes]]:
+    responses = await asyncio.gather(*[
+        async_client.get_multiple_accounts(chunk, Processed, encoding="base64", data_slice=data_slice)
+        for chunk in _chunks(pubkeys)
+    ])
+    return [account.data if account is not None else None for response in responses for account in response.value]
+
+def decode_u64(data: bytes, offset: int = 0) -> int:
+    return struct.unpack_from("<Q", data, offset)[0]
+
+def decode_token_amount(data: Optional[bytes], sliced: bool = False) -> Optional[int]:
+    # Full SPL token account data, or the 8 bytes returned with TOKEN_AMOUNT_SLICE
+    if data is None:
+        return None
+    return decode_u64(data, 0 if sliced else TOKEN_ACCOUNT_AMOUNT_OFFSET)
+
+def fetch_token_amounts(token_accounts: list[Pubkey]) -> list[Optional[int]]:
+    return [decode_token_amount(data, sliced=True) for data in fetch_accounts_raw(token_accounts, TOKEN_AMOUNT_SLICE)]
+
+async def fetch_token_amounts_async(token_accounts: list[Pubkey]) -> list[Optional[int]]:
+    datas = await fetch_accounts_raw_async(token_accounts, TOKEN_AMOUNT_SLICE)
+    return [decode_token_amount(data, sliced=True) for data in datas]
@@ -0,0 +1,147 @@
+import math
+import time
+import asyncio
+from collections import deque
+from typing import Optional
+
+from solders.pubkey import Pubkey  # type: ignore
+
+from raydiumFolder.raydium_py.raydium.amm_v4_quote import sol_and_token_reserves
+from raydiumFolder.raydium_py.utils.accounts import fetch_token_amounts_async
+from raydiumFolder.raydium_py.utils.pool_cache import pool_keys_cache
+from raydiumFolder.raydium_py.utils.txn_parser import fetch_transaction, token_balance_delta
+
+# Slippage tolerance per trade instead of a fixed percentage:
+#   tolerance = floor + share of the trade's price impact
+#             + volatility of the pool price over the time a swap takes to land
+#             + how much worse than quoted the last swaps on the pool came out
+# Reserve snapshots come from the swaps themselves and from a background sampler of the
+# pools users are looking at, so computing the tolerance never waits on the RPC.
+MIN_SLIPPAGE = 0.5
+MAX_SLIPPAGE = 30.0
+PRICE_IMPACT_SHARE = 0.5
+LANDING_SECONDS = 5          # horizon the volatility buffer has to cover
+VOLATILITY_Z = 2.33          # ~99% of the price moves over that horizon
+SNAPSHOT_WINDOW_SECONDS = 300
+SNAPSHOT_MAX_SAMPLES = 300
+SAMPLE_SECONDS = 2
+WATCHED_POOL_SECONDS = 15 * 60
+SHORTFALL_EWMA_ALPHA = 0.3
+FAILED_TRADE_SHORTFALL = 2.0  # % added to the shortfall estimate when an auto-slippage trade fails
+
+
+class AutoSlippage:
+    def __init__(self):
+        self._snapshots = {}   # pool -> deque of (time, sol reserve, token reserve)
+        self._shortfalls = {}  # pool -> EWMA of (quoted - realized) / quoted, in %
+        self._watched = {}
+        self._task = None
+
+    def watch(self, pair_address: str):
+        self._watched[pair_address] = time.monotonic()
+
+    def record_reserves(self, pair_address: str, sol_reserve: int, token_reserve: int):
+        if not sol_reserve or not token_reserve:
+            return
+        snapshots = self._snapshots.get(pair_address)
+        if snapshots is None:
+            snapshots = deque(maxlen=SNAPSHOT_MAX_SAMPLES)
+            self._snapshots[pair_address] = snapshots
+        now = time.monotonic()
+        snapshots.append((now, sol_reserve, token_reserve))
+        while snapshots and now - snapshots[0][0] > SNAPSHOT_WINDOW_SECONDS:
+            snapshots.popleft()
+
+    def volatility(self, pair_address: str) -> float:
+        # Standard deviation (%) of the pool price over LANDING_SECONDS, from the log returns of the snapshots
+        snapshots = self._snapshots.get(pair_address)
+        if not snapshots or len(snapshots) < 2:
+            return 0.0
+        squared_returns = 0.0
+        elapsed = 0.0
+        previous = None
+        for timestamp, sol_reserve, token_reserve in snapshots:
+            price = sol_reserve / token_reserve
+            if previous is not None:
+                squared_returns += math.log(price / previous[1]) ** 2
+                elapsed += timestamp - previous[0]
+            previous = (timestamp, price)
+        if elapsed <= 0:
+            return 0.0
+        return math.sqrt(squared_returns / elapsed * LANDING_SECONDS) * 100
+
+    def slippage_for(self, pair_address: str, price_impact: float) -> float:
+        tolerance = (
+            MIN_SLIPPAGE
+            + price_impact * PRICE_IMPACT_SHARE
+            + VOLATILITY_Z * self.volatility(pair_address)
+            + self._shortfalls.get(pair_address, 0.0)
+        )
+        return round(min(MAX_SLIPPAGE, tolerance), 2)
+
+    def record_result(self, pair_address: str, quoted_amount_out: int, realized_amount_out: Optional[int]):
+        # realized_amount_out None means the trade failed
+        if realized_amount_out is None:
+            shortfall = self._shortfalls.get(pair_address, 0.0) + FAILED_TRADE_SHORTFALL
+        elif quoted_amount_out > 0:
+            shortfall = max(0.0, (quoted_amount_out - realized_amount_out) / quoted_amount_out * 100)
+        else:
+            return
+        previous = self._shortfalls.get(pair_address)
+        self._shortfalls[pair_address] = shortfall if previous is None else previous + SHORTFALL_EWMA_ALPHA * (shortfall - previous)
+
+    async def record_realized_output(self, pair_address: str, txn_sig, out_vault: Pubkey, quoted_amount_out: int):
+        # The pool vault the output left from tells exactly how much the swap paid out
+        try:
+            transaction = await fetch_transaction(txn_sig)
+            if transaction is None:
+                return
+            vault_delta = token_balance_delta(transaction, out_vault)
+            if vault_delta is not None:
+                self.record_result(pair_address, quoted_amount_out, -vault_delta)
+        except Exception as e:
+            print(f"[ERROR] Could not read realized output of {txn_sig}: {e}")
+
+    async def sample(self):
+        # One batched read of the vaults of every watched pool whose keys are cached
+        now = time.monotonic()
+        pools = []
+        for pair_address, last_used in list(self._watched.items()):
+            if now - last_used > WATCHED_POOL_SECONDS:
+                del self._watched[pair_address]
+                continue
+            pool_keys = pool_keys_cache.get(pair_address)
+            if pool_keys is not None:
+                pools.append((pair_address, pool_keys))
+        if not pools:
+            return
+        vaults = [vault for _, pool_keys in pools for vault in (pool_keys.base_vault, pool_keys.quote_vault)]
+        amounts = await fetch_token_amounts_async(vaults)
+        for index, (pair_address, pool_keys) in enumerate(pools):
+            base_vault_amount, quote_vault_amount = amounts[2 * index], amounts[2 * index + 1]
+            if base_vault_amount is not None and quote_vault_amount is not None:
+                self.record_reserves(pair_address, *sol_and_token_reserves(pool_keys, base_vault_amount, quote_vault_amount))
+
+    async def _run(self):
+        while True:
+            try:
+                await self.sample()
+            except Exception as e:
+                print(f"[ERROR] Could not sample pool reserves: {e}")
+            await asyncio.sleep(SAMPLE_SECONDS)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+auto_slippage = AutoSlippage()
@@ -0,0 +1,95 @@
+import time
+import asyncio
+from typing import Optional
+
+from solana.rpc.commitment import Confirmed
+
+from raydiumFolder.raydium_py.raydium.constants import ACCOUNT_LAYOUT_LEN
+from raydiumFolder.raydium_py.utils.clients import get_rpc_client, get_async_rpc_client
+
+# Values every transaction builder needs, kept in memory instead of fetched per trade.
+# A blockhash stays valid for ~150 blocks (~60s); we refresh it well before that.
+BLOCKHASH_REFRESH_SECONDS = 5
+BLOCKHASH_MAX_AGE_SECONDS = 30
+
+client = get_rpc_client()
+async_client = get_async_rpc_client()
+
+
+class BlockhashService:
+    def __init__(self, refresh_seconds: float = BLOCKHASH_REFRESH_SECONDS, max_age_seconds: float = BLOCKHASH_MAX_AGE_SECONDS):
+        self.refresh_seconds = refresh_seconds
+        self.max_age_seconds = max_age_seconds
+        self._blockhash = None
+        self._last_valid_block_height = None
+        self._fetched_at = 0.0
+        self._task = None
+
+    def get(self) -> Optional[tuple]:
+        # (blockhash, last_valid_block_height) from memory, None when missing or too old
+        if self._blockhash is None or time.monotonic() - self._fetched_at > self.max_age_seconds:
+            return None
+        return self._blockhash, self._last_valid_block_height
+
+    def _store(self, response):
+        self._blockhash = response.value.blockhash
+        self._last_valid_block_height = response.value.last_valid_block_height
+        self._fetched_at = time.monotonic()
+
+    def get_sync(self) -> tuple:
+        cached = self.get()
+        if cached is not None:
+            return cached
+        self._store(client.get_latest_blockhash(Confirmed))
+        return self._blockhash, self._last_valid_block_height
+
+    async def get_async(self) -> tuple:
+        cached = self.get()
+        if cached is not None:
+            return cached
+        await self.refresh()
+        return self._blockhash, self._last_valid_block_height
+
+    async def refresh(self):
+        self._store(await async_client.get_latest_blockhash(Confirmed))
+
+    async def _run(self):
+        try:
+            await get_rent_exempt_minimum_async()
+        except Exception as e:
+            print(f"[ERROR] Could not fetch rent-exempt minimum: {e}")
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                print(f"[ERROR] Could not refresh blockhash: {e}")
+            await asyncio.sleep(self.refresh_seconds)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+blockhash_service = BlockhashService()
+
+# Rent-exempt minimum by account size, it only changes with a cluster feature activation
+_rent_exempt_minimums = {}
+
+def get_rent_exempt_minimum(size: int = ACCOUNT_LAYOUT_LEN) -> int:
+    if size not in _rent_exempt_minimums:
+        _rent_exempt_minimums[size] = client.get_minimum_balance_for_rent_exemption(size).value
+    return _rent_exempt_minimums[size]
+
+async def get_rent_exempt_minimum_async(size: int = ACCOUNT_LAYOUT_LEN) -> int:
+    if size not in _rent_exempt_minimums:
+        _rent_exempt_minimums[size] = (await async_client.get_minimum_balance_for_rent_exemption(size)).value
+    return _rent_exempt_minimums[size]
@@ -0,0 +1,88 @@
+import os
+import httpx
+import aiohttp
+from solana.rpc.api import Client
+from solana.rpc.async_api import AsyncClient
+
+# One set of clients for the whole bot, so connections (TCP + TLS) are opened once and kept alive
+RPC = os.getenv("RPC_URL", "https://mainnet.helius-rpc.com/?api-key=...") # Your RPC link
+WS_RPC = os.getenv("WS_URL", RPC.replace("https://", "wss://", 1).replace("http://", "ws://", 1)) # Websocket of the same RPC
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "10"))
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_CONNECTIONS_PER_HOST = int(os.getenv("HTTP_MAX_CONNECTIONS_PER_HOST", "20"))
+HTTP_KEEPALIVE_SECONDS = 60
+DNS_CACHE_SECONDS = 300
+
+try:
+    import h2  # noqa: F401  HTTP/2 for the RPC clients is only available with the h2 package
+    HTTP2 = True
+except ImportError:
+    HTTP2 = False
+
+_rpc_client = None
+_async_rpc_client = None
+_http_session = None
+
+
+def _rpc_limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=HTTP_MAX_CONNECTIONS_PER_HOST,
+        max_keepalive_connections=HTTP_MAX_CONNECTIONS_PER_HOST,
+        keepalive_expiry=HTTP_KEEPALIVE_SECONDS,
+    )
+
+def get_rpc_client() -> Client:
+    global _rpc_client
+    if _rpc_client is None:
+        _rpc_client = Client(RPC, timeout=HTTP_TIMEOUT)
+        _rpc_client._provider.session = httpx.Client(timeout=HTTP_TIMEOUT, limits=_rpc_limits(), http2=HTTP2)
+    return _rpc_client
+
+def get_async_rpc_client() -> AsyncClient:
+    global _async_rpc_client
+    if _async_rpc_client is None:
+        _async_rpc_client = AsyncClient(RPC, timeout=HTTP_TIMEOUT)
+        _async_rpc_client._provider.session = httpx.AsyncClient(timeout=HTTP_TIMEOUT, limits=_rpc_limits(), http2=HTTP2)
+    return _async_rpc_client
+
+def get_http_session() -> aiohttp.ClientSession:
+    # Shared aiohttp session for the HTTP APIs (DexScreener, CoinGecko, raw JSON-RPC)
+    global _http_session
+    if _http_session is None or _http_session.closed:
+        connector = aiohttp.TCPConnector(
+            limit=HTTP_MAX_CONNECTIONS,
+            limit_per_host=HTTP_MAX_CONNECTIONS_PER_HOST,
+            ttl_dns_cache=DNS_CACHE_SECONDS,
+            keepalive_timeout=HTTP_KEEPALIVE_SECONDS,
+        )
+        _http_session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=HTTP_TIMEOUT),
+        )
+    return _http_session
+
+async def rpc_request(method: str, params: list) -> dict | None:
+    # Raw JSON-RPC call for the methods we want to read as plain JSON
+    payload = {"jsonrpc": "2.0", "id": 1, "method": method, "params": params}
+    async with get_http_session().post(RPC, json=payload) as response:
+        if response.status != 200:
+            print(f"[ERROR] RPC {method} failed with status {response.status}")
+            return None
+        return await response.json()
+
+async def init_clients():
+    get_rpc_client()
+    get_async_rpc_client()
+    get_http_session()
+
+async def close_clients():
+    global _rpc_client, _async_rpc_client, _http_session
+    if _http_session is not None:
+        await _http_session.close()
+        _http_session = None
+    if _async_rpc_client is not None:
+        await _async_rpc_client.close()
+        _async_rpc_client = None
+    if _rpc_client is not None:
+        _rpc_client._provider.session.close()
+        _rpc_client = None
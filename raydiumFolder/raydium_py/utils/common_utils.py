@@ -4,11 +4,18 @@ from solana.rpc.commitment import Confirmed, Processed
 from solana.rpc.types import TokenAccountOpts
 from solders.signature import Signature #type: ignore
 from solders.pubkey import Pubkey  # type: ignore
-from solana.rpc.api import Client
 from solders.keypair import Keypair #type: ignore
+from raydiumFolder.raydium_py.utils.clients import get_rpc_client
+client = get_rpc_client()
 
-RPC = "https://mainnet.helius-rpc.com/?api-key=..." # Your RPC link
-client = Client(RPC)
+def parse_token_balance(response) -> float | None:
+    if response.value:
+        accounts = response.value
+        if accounts:
+            token_amount = accounts[0].account.data.parsed['info']['tokenAmount']['uiAmount']
+            if token_amount:
+                return float(token_amount)
+    return None
 
 def get_token_balance(mint_str: str, payer_keypair: str) -> float | None:
     payer_keypairB58 = Keypair.from_base58_string(payer_keypair)
@@ -18,14 +25,7 @@ def get_token_balance(mint_str: str, payer_keypair: str) -> float | None:
         TokenAccountOpts(mint=mint),
         commitment=Processed
     )
-
-    if response.value:
-        accounts = response.value
-        if accounts:
-            token_amount = accounts[0].account.data.parsed['info']['tokenAmount']['uiAmount']
-            if token_amount:
-                return float(token_amount)
-    return None
+    return parse_token_balance(response)
 
 def confirm_txn(txn_sig: Signature, max_retries: int = 20, retry_interval: int = 2) -> bool:
     retries = 1
@@ -0,0 +1,56 @@
+import os
+import math
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+from solders.compute_budget import set_compute_unit_limit  # type: ignore
+
+# Compute units a swap really consumes, measured once by simulating it and reused for
+# every later swap with the same pool and the same instructions (create ATA or not,
+# WSOL top-up or not...). The priority fee is paid per requested unit, so requesting
+# what is used plus some headroom instead of a blind 150k lowers the fee of each trade.
+CU_PREFLIGHT_SIMULATION = os.getenv("CU_PREFLIGHT_SIMULATION", "1") == "1"
+CU_HEADROOM = 1.15
+CU_EXTRA_UNITS = 5_000
+MAX_COMPUTE_UNITS = 1_400_000
+COMPUTE_UNIT_CACHE_SIZE = 20_000
+
+
+def instruction_shape(instructions: list) -> tuple:
+    # Program and instruction tag of everything after the two compute budget instructions
+    return tuple((bytes(instruction.program_id), bytes(instruction.data[:1])) for instruction in instructions[2:])
+
+def units_with_headroom(units_consumed: int) -> int:
+    return min(MAX_COMPUTE_UNITS, math.ceil(units_consumed * CU_HEADROOM) + CU_EXTRA_UNITS)
+
+
+class ComputeUnitCache:
+    def __init__(self, max_size: int = COMPUTE_UNIT_CACHE_SIZE):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, pair_address: str, shape: tuple) -> Optional[int]:
+        with self._lock:
+            units = self._entries.get((pair_address, shape))
+            if units is not None:
+                self._entries.move_to_end((pair_address, shape))
+            return units
+
+    def record(self, pair_address: str, shape: tuple, units_consumed: int):
+        # Keep the highest measure seen for this shape, the cost of a swap varies a little with the pool state
+        key = (pair_address, shape)
+        with self._lock:
+            self._entries[key] = max(self._entries.get(key, 0), units_with_headroom(units_consumed))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+
+def with_compute_unit_limit(instructions: list, units: int) -> list:
+    # The builders always put set_compute_unit_limit first
+    return [set_compute_unit_limit(units), *instructions[1:]]
+
+
+compute_unit_cache = ComputeUnitCache()
@@ -0,0 +1,238 @@
+import sys
+import time
+import base64
+import random
+import asyncio
+from dataclasses import dataclass, field
+from typing import Optional
+
+from raydiumFolder.raydium_py.utils.clients import rpc_request
+
+# One background loop confirms the transactions of every user: all pending signatures
+# go into the same getSignatureStatuses calls (256 per call), each trade awaits its own
+# future. Until it lands, the signed transaction is sent again every few seconds, and
+# it is given up once the chain is past the last block height of its blockhash.
+# The block height is only read on the rebroadcast cadence, and the rebroadcasts of
+# a tick are sent concurrently (MAX_CONCURRENT_SENDS at a time).
+STATUS_POLL_SECONDS = 0.4
+REBROADCAST_SECONDS = 2.0
+MAX_CONCURRENT_SENDS = 32
+CONFIRMATION_TIMEOUT_SECONDS = 90
+MAX_SIGNATURES_PER_CALL = 256
+COMMITMENT_LEVELS = {"processed": 0, "confirmed": 1, "finalized": 2}
+
+
+@dataclass
+class PendingTxn:
+    signature: str
+    future: asyncio.Future
+    raw_txn: Optional[bytes]
+    last_valid_block_height: Optional[int]
+    deadline: float
+    last_sent: float = field(default_factory=time.monotonic)
+
+
+class ConfirmationService:
+    def __init__(self, request=rpc_request, commitment: str = "confirmed", poll_seconds: float = STATUS_POLL_SECONDS,
+                 rebroadcast_seconds: float = REBROADCAST_SECONDS, timeout: float = CONFIRMATION_TIMEOUT_SECONDS):
+        # request: coroutine (method, params) -> JSON-RPC response dict, rpc_request by default
+        self.request = request
+        self.commitment = commitment
+        self.poll_seconds = poll_seconds
+        self.rebroadcast_seconds = rebroadcast_seconds
+        self.timeout = timeout
+        self.status_calls = 0
+        self._pending = {}
+        self._last_rebroadcast = 0.0
+        self._send_slots = asyncio.Semaphore(MAX_CONCURRENT_SENDS)
+        self._wakeup = None
+        self._task = None
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    async def confirm(self, signature, raw_txn: Optional[bytes] = None, last_valid_block_height: Optional[int] = None) -> Optional[bool]:
+        # True once the transaction reached the commitment without error, False if it failed,
+        # None if its blockhash expired (or the timeout passed) before it landed
+        signature = str(signature)
+        pending = self._pending.get(signature)
+        if pending is None:
+            pending = PendingTxn(
+                signature,
+                asyncio.get_running_loop().create_future(),
+                raw_txn,
+                last_valid_block_height,
+                time.monotonic() + self.timeout,
+            )
+            self._pending[signature] = pending
+            self.start()
+            self._wakeup.set()
+        return await asyncio.shield(pending.future)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for pending in self._pending.values():
+            if not pending.future.done():
+                pending.future.set_result(None)
+        self._pending.clear()
+
+    async def _run(self):
+        while True:
+            if not self._pending:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+            try:
+                await self._poll_statuses()
+                await self._expire_and_rebroadcast()
+            except Exception as e:
+                print(f"[ERROR] Confirmation loop failed: {e}")
+            await asyncio.sleep(self.poll_seconds)
+
+    async def _poll_statuses(self):
+        signatures = list(self._pending)
+        for start in range(0, len(signatures), MAX_SIGNATURES_PER_CALL):
+            chunk = signatures[start:start + MAX_SIGNATURES_PER_CALL]
+            self.status_calls += 1
+            response = await self.request("getSignatureStatuses", [chunk, {"searchTransactionHistory": False}])
+            if not response or "result" not in response:
+                continue
+            for signature, status in zip(chunk, response["result"]["value"]):
+                if status is not None:
+                    self._apply_status(signature, status)
+
+    def _apply_status(self, signature: str, status: dict):
+        if status.get("err") is not None:
+            self._resolve(signature, False)
+        elif COMMITMENT_LEVELS.get(status.get("confirmationStatus"), -1) >= COMMITMENT_LEVELS[self.commitment]:
+            self._resolve(signature, True)
+
+    def _resolve(self, signature: str, result: Optional[bool]):
+        pending = self._pending.pop(signature, None)
+        if pending is not None and not pending.future.done():
+            pending.future.set_result(result)
+
+    async def _expire_and_rebroadcast(self):
+        now = time.monotonic()
+        for pending in list(self._pending.values()):
+            if now > pending.deadline:
+                self._resolve(pending.signature, None)
+        if now - self._last_rebroadcast < self.rebroadcast_seconds:
+            return
+        self._last_rebroadcast = now
+
+        if any(pending.last_valid_block_height is not None for pending in self._pending.values()):
+            response = await self.request("getBlockHeight", [{"commitment": self.commitment}])
+            if response and "result" in response:
+                block_height = response["result"]
+                for pending in list(self._pending.values()):
+                    if pending.last_valid_block_height is not None and block_height > pending.last_valid_block_height:
+                        self._resolve(pending.signature, None)
+
+        # Transactions sent during the last poll (by the trade itself) are not due yet
+        to_send = [pending for pending in self._pending.values() if pending.raw_txn and now - pending.last_sent >= self.poll_seconds]
+        for pending in to_send:
+            pending.last_sent = now
+        await asyncio.gather(*(self._send(pending.raw_txn) for pending in to_send))
+
+    async def _send(self, raw_txn: bytes):
+        async with self._send_slots:
+            encoded = base64.b64encode(raw_txn).decode("utf-8")
+            try:
+                await self.request("sendTransaction", [encoded, {"encoding": "base64", "skipPreflight": True, "maxRetries": 0}])
+            except Exception as e:
+                print(f"[ERROR] Rebroadcast failed: {e}")
+
+
+confirmation_service = ConfirmationService()
+
+
+"""---------------------------------"""
+"""         Fake RPC / Test         """
+"""---------------------------------"""
+
+class FakeRpc:
+    # Lands every transaction after confirm_delay seconds, fails fail_rate of them and
+    # drops drop_rate of them (those only land if they are rebroadcast)
+    def __init__(self, confirm_delay: float = 1.0, fail_rate: float = 0.0, drop_rate: float = 0.0, blocks_per_second: float = 2.5):
+        self.confirm_delay = confirm_delay
+        self.fail_rate = fail_rate
+        self.drop_rate = drop_rate
+        self.blocks_per_second = blocks_per_second
+        self.started_at = time.monotonic()
+        self.landing = {}
+        self.calls = {}
+
+    def block_height(self) -> int:
+        return int((time.monotonic() - self.started_at) * self.blocks_per_second)
+
+    def send(self, signature: str):
+        if signature not in self.landing and random.random() >= self.drop_rate:
+            failed = random.random() < self.fail_rate
+            self.landing[signature] = (time.monotonic() + self.confirm_delay, failed)
+
+    async def __call__(self, method: str, params: list) -> dict:
+        self.calls[method] = self.calls.get(method, 0) + 1
+        await asyncio.sleep(0.005)
+        if method == "getBlockHeight":
+            return {"result": self.block_height()}
+        if method == "sendTransaction":
+            # The fake "transaction" bytes are the signature itself
+            self.send(base64.b64decode(params[0]).decode("utf-8"))
+            return {"result": None}
+        if method == "getSignatureStatuses":
+            now = time.monotonic()
+            statuses = []
+            for signature in params[0]:
+                landing = self.landing.get(signature)
+                if landing is None or landing[0] > now:
+                    statuses.append(None)
+                else:
+                    statuses.append({"slot": 1, "confirmations": None, "err": {"InstructionError": [0, "Custom"]} if landing[1] else None, "confirmationStatus": "confirmed"})
+            return {"result": {"context": {"slot": 1}, "value": statuses}}
+        raise ValueError(f"FakeRpc does not implement {method}")
+
+
+async def simulate(trades: int = 500, confirm_delay: float = 1.0, fail_rate: float = 0.05, drop_rate: float = 0.2) -> dict:
+    fake_rpc = FakeRpc(confirm_delay, fail_rate, drop_rate)
+    service = ConfirmationService(request=fake_rpc)
+
+    async def trade(index: int):
+        signature = f"sig{index}"
+        fake_rpc.send(signature)
+        start = time.monotonic()
+        result = await service.confirm(signature, signature.encode("utf-8"), fake_rpc.block_height() + 150)
+        return result, time.monotonic() - start
+
+    results = await asyncio.gather(*(trade(index) for index in range(trades)))
+    await service.stop()
+    latencies = sorted(latency for _, latency in results)
+    return {
+        "confirmed": sum(1 for result, _ in results if result is True),
+        "failed": sum(1 for result, _ in results if result is False),
+        "expired": sum(1 for result, _ in results if result is None),
+        "p50_seconds": latencies[len(latencies) // 2],
+        "max_seconds": latencies[-1],
+        "rpc_calls": fake_rpc.calls,
+    }
+
+
+if __name__ == "__main__":
+    # python -m raydiumFolder.raydium_py.utils.confirmation simulate [trades] [confirm_delay]
+    if len(sys.argv) >= 2 and sys.argv[1] == "simulate":
+        trades = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+        confirm_delay = float(sys.argv[3]) if len(sys.argv) > 3 else 1.0
+        print(asyncio.run(simulate(trades, confirm_delay)))
+    else:
+        print("Usage: python -m raydiumFolder.raydium_py.utils.confirmation simulate [trades] [confirm_delay]")
@@ -0,0 +1,173 @@
+import os
+import json
+import time
+import asyncio
+import threading
+from collections import OrderedDict
+from dataclasses import fields
+from typing import Optional
+
+from solders.pubkey import Pubkey  # type: ignore
+
+from raydiumFolder.raydium_py.utils.pool_utils import (
+    AmmV4PoolKeys,
+    fetch_amm_v4_pool_keys,
+    fetch_amm_v4_pool_keys_async,
+)
+
+# Pool keys never change for a pool, so they are fetched once and kept in memory (LRU).
+# Concurrent requests for the same pool share one fetch.
+POOL_KEYS_CACHE_SIZE = 5_000
+POOL_KEYS_TTL = 24 * 3600
+POOL_KEYS_CACHE_FILE = os.getenv("POOL_KEYS_CACHE_FILE", "pool_keys_cache.json")
+
+
+def pool_keys_to_dict(pool_keys: AmmV4PoolKeys) -> dict:
+    values = {}
+    for field in fields(AmmV4PoolKeys):
+        value = getattr(pool_keys, field.name)
+        values[field.name] = str(value) if isinstance(value, Pubkey) else value
+    return values
+
+def pool_keys_from_dict(data: dict) -> AmmV4PoolKeys:
+    values = {}
+    for field in fields(AmmV4PoolKeys):
+        if field.name not in data:
+            # Saved before the field existed, keep its default
+            continue
+        value = data[field.name]
+        values[field.name] = Pubkey.from_string(value) if field.type is Pubkey else value
+    return AmmV4PoolKeys(**values)
+
+
+class PoolKeysCache:
+    def __init__(self, max_size: int = POOL_KEYS_CACHE_SIZE, ttl: float = POOL_KEYS_TTL, path: Optional[str] = None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.path = path
+        self._entries = OrderedDict()
+        self._in_flight = {}
+        self._sync_locks = {}
+        self._lock = threading.Lock()
+
+    def get(self, pair_address: str) -> Optional[AmmV4PoolKeys]:
+        with self._lock:
+            entry = self._entries.get(pair_address)
+            if entry is None:
+                return None
+            expires_at, pool_keys = entry
+            if expires_at < time.time():
+                del self._entries[pair_address]
+                return None
+            self._entries.move_to_end(pair_address)
+            return pool_keys
+
+    def put(self, pair_address: str, pool_keys: AmmV4PoolKeys, expires_at: Optional[float] = None):
+        with self._lock:
+            self._entries[pair_address] = (expires_at or time.time() + self.ttl, pool_keys)
+            self._entries.move_to_end(pair_address)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    async def get_or_fetch(self, pair_address: str) -> Optional[AmmV4PoolKeys]:
+        async def fetch():
+            return await fetch_amm_v4_pool_keys_async(pair_address), None
+        return (await self.fetch_once(pair_address, fetch))[0]
+
+    def get_or_fetch_sync(self, pair_address: str) -> Optional[AmmV4PoolKeys]:
+        return self.fetch_once_sync(pair_address, lambda: (fetch_amm_v4_pool_keys(pair_address), None))[0]
+
+    async def fetch_once(self, pair_address: str, fetch) -> tuple:
+        # Single flight: on a miss the first caller starts fetch() -> (pool keys, extra) as its
+        # own task, which caches the keys. The others await the same task and get (pool keys, None).
+        # extra lets a caller read more accounts in the round trip that fetches the keys.
+        # A caller timing out or being cancelled never cancels the shared fetch.
+        pool_keys = self.get(pair_address)
+        if pool_keys is not None:
+            return pool_keys, None
+
+        in_flight = self._in_flight.get(pair_address)
+        if in_flight is not None:
+            return (await asyncio.shield(in_flight))[0], None
+
+        task = asyncio.create_task(self._fetch(pair_address, fetch))
+        self._in_flight[pair_address] = task
+        task.add_done_callback(lambda done: self._fetch_done(pair_address, done))
+        return await asyncio.shield(task)
+
+    async def _fetch(self, pair_address: str, fetch) -> tuple:
+        pool_keys, extra = await fetch()
+        if pool_keys is not None:
+            self.put(pair_address, pool_keys)
+        return pool_keys, extra
+
+    def _fetch_done(self, pair_address: str, task: asyncio.Task):
+        if self._in_flight.get(pair_address) is task:
+            del self._in_flight[pair_address]
+        if not task.cancelled():
+            # Marks the exception as retrieved when every caller gave up waiting, the callers report it
+            task.exception()
+
+    def fetch_once_sync(self, pair_address: str, fetch) -> tuple:
+        # Same as fetch_once for threads: one fetch per pool, the others wait on its lock
+        pool_keys = self.get(pair_address)
+        if pool_keys is not None:
+            return pool_keys, None
+
+        with self._lock:
+            pair_lock = self._sync_locks.setdefault(pair_address, threading.Lock())
+        try:
+            with pair_lock:
+                pool_keys = self.get(pair_address)
+                if pool_keys is not None:
+                    return pool_keys, None
+                pool_keys, extra = fetch()
+                if pool_keys is not None:
+                    self.put(pair_address, pool_keys)
+                return pool_keys, extra
+        finally:
+            with self._lock:
+                self._sync_locks.pop(pair_address, None)
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r") as file:
+                entries = json.load(file)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"[ERROR] Could not load pool keys cache: {e}")
+            return
+        now = time.time()
+        for pair_address, entry in entries.items():
+            if entry["expires_at"] > now:
+                self.put(pair_address, pool_keys_from_dict(entry["pool_keys"]), entry["expires_at"])
+
+    def save(self):
+        if not self.path:
+            return
+        with self._lock:
+            entries = {
+                pair_address: {"expires_at": expires_at, "pool_keys": pool_keys_to_dict(pool_keys)}
+                for pair_address, (expires_at, pool_keys) in self._entries.items()
+            }
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as file:
+            json.dump(entries, file)
+        os.replace(tmp_path, self.path)
+
+
+pool_keys_cache = PoolKeysCache(path=POOL_KEYS_CACHE_FILE)
+
+def get_pool_keys(pair_address: str) -> Optional[AmmV4PoolKeys]:
+    return pool_keys_cache.get_or_fetch_sync(pair_address)
+
+async def get_pool_keys_async(pair_address: str) -> Optional[AmmV4PoolKeys]:
+    return await pool_keys_cache.get_or_fetch(pair_address)
+
+async def prewarm_pool_keys(pair_address: str):
+    # Called when a token card is shown, so the Buy button finds the keys in memory
+    try:
+        await pool_keys_cache.get_or_fetch(pair_address)
+    except Exception as e:
+        print(f"[ERROR] Could not prewarm pool keys for {pair_address}: {e}")
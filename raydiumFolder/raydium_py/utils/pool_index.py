@@ -0,0 +1,200 @@
+import os
+import sys
+import time
+import struct
+import asyncio
+import threading
+from typing import Optional
+
+from solana.rpc.commitment import Processed
+from solana.rpc.types import DataSliceOpts, MemcmpOpts
+from solders.pubkey import Pubkey  # type: ignore
+
+from raydiumFolder.raydium_py.raydium.constants import RAYDIUM_AMM_V4, WSOL
+from raydiumFolder.raydium_py.layouts.amm_v4_fast import LIQUIDITY_STATE_V4_FAST
+from raydiumFolder.raydium_py.utils.clients import get_rpc_client
+
+# Local index of every Raydium AMM v4 pool: mint -> pool ids answered from memory.
+# Only the 128 bytes holding the vaults and mints (offset 336) are downloaded per pool.
+POOL_INDEX_FILE = os.getenv("POOL_INDEX_FILE", "pool_index.bin")
+# The snapshot is rebuilt in the background at startup when missing or older than this
+POOL_INDEX_MAX_AGE = float(os.getenv("POOL_INDEX_MAX_AGE", "86400"))
+# Mints without any pool are not scanned again for this long
+POOL_INDEX_NEGATIVE_TTL = float(os.getenv("POOL_INDEX_NEGATIVE_TTL", "60"))
+AMM_V4_ACCOUNT_SIZE = LIQUIDITY_STATE_V4_FAST.size
+INDEX_SLICE_OFFSET = LIQUIDITY_STATE_V4_FAST.offsets["poolCoinTokenAccount"][0]
+INDEX_SLICE = DataSliceOpts(offset=INDEX_SLICE_OFFSET, length=128)
+COIN_MINT_OFFSET = LIQUIDITY_STATE_V4_FAST.offsets["coinMintAddress"][0]
+PC_MINT_OFFSET = LIQUIDITY_STATE_V4_FAST.offsets["pcMintAddress"][0]
+
+# Snapshot file: magic, record count, then one 160-byte record per pool
+# (amm id, base vault, quote vault, base mint, quote mint)
+INDEX_MAGIC = b"RAYV4IDX"
+INDEX_HEADER = struct.Struct("<8sQ")
+INDEX_RECORD = struct.Struct("<32s32s32s32s32s")
+
+client = get_rpc_client()
+
+
+class PoolIndex:
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self._pools = {}
+        self._by_mint = {}
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._missing = {}   # mint -> monotonic time until which it is known to have no pool
+        self._task = None
+
+    def __len__(self) -> int:
+        return len(self._pools)
+
+    def add(self, amm_id: bytes, base_vault: bytes, quote_vault: bytes, base_mint: bytes, quote_mint: bytes):
+        with self._lock:
+            if amm_id in self._pools:
+                return
+            self._pools[amm_id] = (base_vault, quote_vault, base_mint, quote_mint)
+            self._by_mint.setdefault(base_mint, []).append(amm_id)
+            self._by_mint.setdefault(quote_mint, []).append(amm_id)
+            self._missing.pop(base_mint, None)
+            self._missing.pop(quote_mint, None)
+            self._dirty = True
+
+    def add_sliced(self, amm_id: Pubkey, data: bytes):
+        # data is INDEX_SLICE of the pool account
+        base_vault, quote_vault, base_mint, quote_mint = data[0:32], data[32:64], data[64:96], data[96:128]
+        self.add(bytes(amm_id), bytes(base_vault), bytes(quote_vault), bytes(base_mint), bytes(quote_mint))
+
+    def pools_for_mint(self, mint: str, quote_mint: Optional[Pubkey] = WSOL) -> list:
+        # Pools trading mint against quote_mint (any pool of the mint when quote_mint is None)
+        mint_bytes = bytes(Pubkey.from_string(mint))
+        quote_bytes = bytes(quote_mint) if quote_mint is not None else None
+        pair_addresses = []
+        for amm_id in self._by_mint.get(mint_bytes, ()):
+            _, _, base_mint, pool_quote_mint = self._pools[amm_id]
+            other_mint = pool_quote_mint if base_mint == mint_bytes else base_mint
+            if quote_bytes is None or other_mint == quote_bytes:
+                pair_addresses.append(str(Pubkey.from_bytes(amm_id)))
+        return pair_addresses
+
+    def bootstrap(self) -> int:
+        # Full snapshot of the program: one getProgramAccounts with only the sliced bytes per pool
+        response = client.get_program_accounts(
+            RAYDIUM_AMM_V4,
+            commitment=Processed,
+            encoding="base64",
+            data_slice=INDEX_SLICE,
+            filters=[AMM_V4_ACCOUNT_SIZE],
+        )
+        for account in response.value:
+            self.add_sliced(account.pubkey, account.account.data)
+        return len(response.value)
+
+    def refresh_mint(self, mint: str) -> list:
+        # Incremental update for a mint missing from the index (new pool since the snapshot)
+        mint_bytes = bytes(Pubkey.from_string(mint))
+        if self._missing.get(mint_bytes, 0) > time.monotonic():
+            return []
+        failed = False
+        for offset in (COIN_MINT_OFFSET, PC_MINT_OFFSET):
+            try:
+                response = client.get_program_accounts(
+                    RAYDIUM_AMM_V4,
+                    commitment=Processed,
+                    encoding="base64",
+                    data_slice=INDEX_SLICE,
+                    filters=[AMM_V4_ACCOUNT_SIZE, MemcmpOpts(offset=offset, bytes=mint)],
+                )
+            except Exception as e:
+                print(f"[ERROR] Could not refresh pools of {mint}: {e}")
+                failed = True
+                continue
+            for account in response.value:
+                self.add_sliced(account.pubkey, account.account.data)
+        pair_addresses = self.pools_for_mint(mint)
+        if not pair_addresses and not failed:
+            with self._lock:
+                self._missing[mint_bytes] = time.monotonic() + POOL_INDEX_NEGATIVE_TTL
+        return pair_addresses
+
+    def load(self) -> int:
+        if not self.path or not os.path.exists(self.path):
+            return 0
+        with open(self.path, "rb") as file:
+            data = file.read()
+        magic, count = INDEX_HEADER.unpack_from(data, 0)
+        if magic != INDEX_MAGIC:
+            print(f"[ERROR] {self.path} is not a pool index file")
+            return 0
+        for record in INDEX_RECORD.iter_unpack(data[INDEX_HEADER.size:INDEX_HEADER.size + count * INDEX_RECORD.size]):
+            self.add(*record)
+        self._dirty = False
+        return count
+
+    def save(self, force: bool = False):
+        if not self.path or not (self._dirty or force):
+            return
+        with self._lock:
+            records = [INDEX_RECORD.pack(amm_id, *pool) for amm_id, pool in self._pools.items()]
+            self._dirty = False
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "wb") as file:
+            file.write(INDEX_HEADER.pack(INDEX_MAGIC, len(records)))
+            file.write(b"".join(records))
+        os.replace(tmp_path, self.path)
+
+    def is_stale(self) -> bool:
+        if not self.path or not os.path.exists(self.path):
+            return True
+        return time.time() - os.path.getmtime(self.path) > POOL_INDEX_MAX_AGE
+
+    async def _bootstrap_in_background(self):
+        # Lookups keep being answered from the loaded snapshot and refresh_mint meanwhile
+        start = time.perf_counter()
+        try:
+            count = await asyncio.to_thread(self.bootstrap)
+            await asyncio.to_thread(self.save, True)
+        except Exception as e:
+            print(f"[ERROR] Pool index bootstrap failed: {e}")
+            return
+        print(f"Indexed {count} pools in {time.perf_counter() - start:.1f} s")
+
+    def start(self):
+        if self._task is None and self.is_stale():
+            self._task = asyncio.create_task(self._bootstrap_in_background())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+pool_index = PoolIndex(path=POOL_INDEX_FILE)
+
+
+if __name__ == "__main__":
+    # python -m raydiumFolder.raydium_py.utils.pool_index bootstrap|bench [snapshot.bin]
+    command = sys.argv[1] if len(sys.argv) > 1 else ""
+    path = sys.argv[2] if len(sys.argv) > 2 else POOL_INDEX_FILE
+    index = PoolIndex(path=path)
+    if command == "bootstrap":
+        start = time.perf_counter()
+        count = index.bootstrap()
+        index.save(force=True)
+        print(f"Indexed {count} pools in {time.perf_counter() - start:.1f} s -> {path}")
+    elif command == "bench":
+        start = time.perf_counter()
+        count = index.load()
+        print(f"Cold start: {count} pools loaded in {(time.perf_counter() - start) * 1000:.1f} ms")
+        mints = [str(Pubkey.from_bytes(pool[2])) for pool in list(index._pools.values())[:10_000]]
+        if mints:
+            start = time.perf_counter()
+            for mint in mints:
+                index.pools_for_mint(mint, None)
+            print(f"Lookup: {(time.perf_counter() - start) / len(mints) * 1e6:.2f} us/mint")
+    else:
+        print("Usage: python -m raydiumFolder.raydium_py.utils.pool_index bootstrap|bench [snapshot.bin]")
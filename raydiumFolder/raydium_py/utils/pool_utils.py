@@ -3,20 +3,18 @@ from dataclasses import dataclass
 from enum import Enum
 from typing import Optional
 
-from solana.rpc.api import Client
-from solana.rpc.commitment import Processed
-from solana.rpc.types import MemcmpOpts
 from solders.instruction import AccountMeta, Instruction  # type: ignore
 from solders.pubkey import Pubkey  # type: ignore
 
-from raydiumFolder.raydium_py.layouts.amm_v4 import LIQUIDITY_STATE_LAYOUT_V4, MARKET_STATE_LAYOUT_V3
-from raydiumFolder.raydium_py.raydium.constants import (
-    WSOL,
-    RAYDIUM_AMM_V4,
-    DEFAULT_QUOTE_MINT,
+from raydiumFolder.raydium_py.layouts.amm_v4_fast import LIQUIDITY_STATE_V4_FAST, MARKET_STATE_V3_FAST
+from raydiumFolder.raydium_py.raydium.amm_v4_quote import DEFAULT_SWAP_FEE_NUMERATOR, DEFAULT_SWAP_FEE_DENOMINATOR
+from raydiumFolder.raydium_py.raydium.constants import RAYDIUM_AMM_V4
+from raydiumFolder.raydium_py.utils.pool_index import pool_index
+from raydiumFolder.raydium_py.utils.accounts import (
+    fetch_accounts_raw,
+    fetch_accounts_raw_async,
+    fetch_token_amounts_async,
 )
-RPC = "https://mainnet.helius-rpc.com/?api-key=..." # Your RPC link
-client = Client(RPC)
 
 @dataclass
 class AmmV4PoolKeys:
@@ -39,55 +37,75 @@ class AmmV4PoolKeys:
     ray_authority_v4: Pubkey
     open_book_program: Pubkey
     token_program_id: Pubkey
+    swap_fee_numerator: int = DEFAULT_SWAP_FEE_NUMERATOR
+    swap_fee_denominator: int = DEFAULT_SWAP_FEE_DENOMINATOR
 
 
 class DIRECTION(Enum):
     BUY = 0
     SELL = 1
 
-def fetch_amm_v4_pool_keys(pair_address: str) -> Optional[AmmV4PoolKeys]:
-    
+def decode_amm_v4_pool_keys(amm_id: Pubkey, amm_data_decoded, marketInfo: bytes) -> AmmV4PoolKeys:
+
     def bytes_of(value):
         if not (0 <= value < 2**64):
             raise ValueError("Value must be in the range of a u64 (0 to 2^64 - 1).")
         return struct.pack('<Q', value)
-   
+
+    marketId = Pubkey.from_bytes(amm_data_decoded.serumMarket)
+    market_decoded = MARKET_STATE_V3_FAST.parse(marketInfo)
+    vault_signer_nonce = market_decoded.vault_signer_nonce
+
+    ray_authority_v4=Pubkey.from_string("5Q544fKrFoe6tsEbD7S8EmxGTJYAKtTVhAW5Q5pge4j1")
+    open_book_program=Pubkey.from_string("srmqPvymJeFKQ4zGQed1GFppgkRHL9kaELCbyksJtPX")
+    token_program_id=Pubkey.from_string("TokenkegQfeZyiNwAJbNbGKPFXCWuBvf9Ss623VQ5DA")
+
+    pool_keys = AmmV4PoolKeys(
+        amm_id=amm_id,
+        base_mint=Pubkey.from_bytes(market_decoded.base_mint),
+        quote_mint=Pubkey.from_bytes(market_decoded.quote_mint),
+        base_decimals=amm_data_decoded.coinDecimals,
+        quote_decimals=amm_data_decoded.pcDecimals,
+        open_orders=Pubkey.from_bytes(amm_data_decoded.ammOpenOrders),
+        target_orders=Pubkey.from_bytes(amm_data_decoded.ammTargetOrders),
+        base_vault=Pubkey.from_bytes(amm_data_decoded.poolCoinTokenAccount),
+        quote_vault=Pubkey.from_bytes(amm_data_decoded.poolPcTokenAccount),
+        market_id=marketId,
+        market_authority=Pubkey.create_program_address(seeds=[bytes(marketId), bytes_of(vault_signer_nonce)], program_id=open_book_program),
+        market_base_vault=Pubkey.from_bytes(market_decoded.base_vault),
+        market_quote_vault=Pubkey.from_bytes(market_decoded.quote_vault),
+        bids=Pubkey.from_bytes(market_decoded.bids),
+        asks=Pubkey.from_bytes(market_decoded.asks),
+        event_queue=Pubkey.from_bytes(market_decoded.event_queue),
+        ray_authority_v4=ray_authority_v4,
+        open_book_program=open_book_program,
+        token_program_id=token_program_id,
+        swap_fee_numerator=amm_data_decoded.swapFeeNumerator,
+        swap_fee_denominator=amm_data_decoded.swapFeeDenominator,
+    )
+
+    return pool_keys
+
+def fetch_amm_v4_pool_keys(pair_address: str) -> Optional[AmmV4PoolKeys]:
     try:
         amm_id = Pubkey.from_string(pair_address)
-        amm_data = client.get_account_info_json_parsed(amm_id, commitment=Processed).value.data
-        amm_data_decoded = LIQUIDITY_STATE_LAYOUT_V4.parse(amm_data)
+        amm_data = fetch_accounts_raw([amm_id])[0]
+        amm_data_decoded = LIQUIDITY_STATE_V4_FAST.parse(amm_data)
         marketId = Pubkey.from_bytes(amm_data_decoded.serumMarket)
-        marketInfo = client.get_account_info_json_parsed(marketId, commitment=Processed).value.data
-        market_decoded = MARKET_STATE_LAYOUT_V3.parse(marketInfo)
-        vault_signer_nonce = market_decoded.vault_signer_nonce
-        
-        ray_authority_v4=Pubkey.from_string("5Q544fKrFoe6tsEbD7S8EmxGTJYAKtTVhAW5Q5pge4j1")
-        open_book_program=Pubkey.from_string("srmqPvymJeFKQ4zGQed1GFppgkRHL9kaELCbyksJtPX")
-        token_program_id=Pubkey.from_string("TokenkegQfeZyiNwAJbNbGKPFXCWuBvf9Ss623VQ5DA")
-
-        pool_keys = AmmV4PoolKeys(
-            amm_id=amm_id,
-            base_mint=Pubkey.from_bytes(market_decoded.base_mint),
-            quote_mint=Pubkey.from_bytes(market_decoded.quote_mint),
-            base_decimals=amm_data_decoded.coinDecimals,
-            quote_decimals=amm_data_decoded.pcDecimals,
-            open_orders=Pubkey.from_bytes(amm_data_decoded.ammOpenOrders),
-            target_orders=Pubkey.from_bytes(amm_data_decoded.ammTargetOrders),
-            base_vault=Pubkey.from_bytes(amm_data_decoded.poolCoinTokenAccount),
-            quote_vault=Pubkey.from_bytes(amm_data_decoded.poolPcTokenAccount),
-            market_id=marketId,
-            market_authority=Pubkey.create_program_address(seeds=[bytes(marketId), bytes_of(vault_signer_nonce)], program_id=open_book_program),
-            market_base_vault=Pubkey.from_bytes(market_decoded.base_vault),
-            market_quote_vault=Pubkey.from_bytes(market_decoded.quote_vault),
-            bids=Pubkey.from_bytes(market_decoded.bids),
-            asks=Pubkey.from_bytes(market_decoded.asks),
-            event_queue=Pubkey.from_bytes(market_decoded.event_queue),
-            ray_authority_v4=ray_authority_v4,
-            open_book_program=open_book_program,
-            token_program_id=token_program_id
-        )
-
-        return pool_keys
+        marketInfo = fetch_accounts_raw([marketId])[0]
+        return decode_amm_v4_pool_keys(amm_id, amm_data_decoded, marketInfo)
+    except Exception as e:
+        #print(f"Error fetching pool keys: {e}")
+        return None
+
+async def fetch_amm_v4_pool_keys_async(pair_address: str) -> Optional[AmmV4PoolKeys]:
+    try:
+        amm_id = Pubkey.from_string(pair_address)
+        amm_data = (await fetch_accounts_raw_async([amm_id]))[0]
+        amm_data_decoded = LIQUIDITY_STATE_V4_FAST.parse(amm_data)
+        marketId = Pubkey.from_bytes(amm_data_decoded.serumMarket)
+        marketInfo = (await fetch_accounts_raw_async([marketId]))[0]
+        return decode_amm_v4_pool_keys(amm_id, amm_data_decoded, marketInfo)
     except Exception as e:
         #print(f"Error fetching pool keys: {e}")
         return None
@@ -136,91 +154,18 @@ def make_amm_v4_swap_instruction(
         return None
 
 
-def get_amm_v4_reserves(pool_keys: AmmV4PoolKeys) -> tuple:
+async def get_amm_v4_reserves_raw_async(pool_keys: AmmV4PoolKeys) -> tuple:
     try:
-        quote_vault = pool_keys.quote_vault
-        quote_decimal = pool_keys.quote_decimals
-        quote_mint = pool_keys.quote_mint
-        
-        base_vault = pool_keys.base_vault
-        base_decimal = pool_keys.base_decimals
-        base_mint = pool_keys.base_mint
-    
-        balances_response = client.get_multiple_accounts_json_parsed(
-            [quote_vault, base_vault], 
-            Processed
-        )
-        balances = balances_response.value
-
-        quote_account = balances[0]
-        base_account = balances[1]
-        
-        quote_account_balance = quote_account.data.parsed['info']['tokenAmount']['uiAmount']
-        base_account_balance = base_account.data.parsed['info']['tokenAmount']['uiAmount']
-        
-        if quote_account_balance is None or base_account_balance is None:
-            #print("Error: One of the account balances is None.")
-            return None, None, None
-        
-        if base_mint == WSOL:
-            base_reserve = quote_account_balance  
-            quote_reserve = base_account_balance  
-            token_decimal = quote_decimal 
-        else:
-            base_reserve = base_account_balance  
-            quote_reserve = quote_account_balance
-            token_decimal = base_decimal
-
-        #print(f"Base Mint: {base_mint} | Quote Mint: {quote_mint}")
-        #print(f"Base Reserve: {base_reserve} | Quote Reserve: {quote_reserve} | Token Decimal: {token_decimal}")
-        return base_reserve, quote_reserve, token_decimal
-
+        base_vault_amount, quote_vault_amount = await fetch_token_amounts_async([pool_keys.base_vault, pool_keys.quote_vault])
+        return base_vault_amount, quote_vault_amount
     except Exception as e:
         #print(f"Error occurred: {e}")
-        return None, None, None
-
-
-def fetch_pair_address_from_rpc(
-    program_id: Pubkey, 
-    token_mint: str, 
-    quote_offset: int, 
-    base_offset: int, 
-    data_length: int
-) -> list:
-
-    def fetch_pair(base_mint: str, quote_mint: str) -> list:
-        memcmp_filter_base = MemcmpOpts(offset=quote_offset, bytes=quote_mint)
-        memcmp_filter_quote = MemcmpOpts(offset=base_offset, bytes=base_mint)
-        try:
-            #print(f"Fetching pair addresses for base_mint: {base_mint}, quote_mint: {quote_mint}")
-            response = client.get_program_accounts(
-                program_id,
-                commitment=Processed,
-                filters=[data_length, memcmp_filter_base, memcmp_filter_quote],
-            )
-            accounts = response.value
-            if accounts:
-                #print(f"Found {len(accounts)} matching AMM account(s).")
-                return [account.pubkey.__str__() for account in accounts]
-            else:
-                message = "No matching AMM accounts found."
-        except Exception as e:
-            message = f"Error fetching AMM pair addresses: {e}"
-        return []
-
-    pair_addresses = fetch_pair(token_mint, DEFAULT_QUOTE_MINT)
-
-    if not pair_addresses:
-        #print("Retrying with reversed base and quote mints...")
-        pair_addresses = fetch_pair(DEFAULT_QUOTE_MINT, token_mint)
-
-    return pair_addresses
+        return None, None
+
 
 def get_amm_v4_pair_from_rpc(token_mint: str) -> list:
-    return fetch_pair_address_from_rpc(
-        program_id=RAYDIUM_AMM_V4,
-        token_mint=token_mint,
-        quote_offset=400,
-        base_offset=432,
-        data_length=752,
-    )
+    # Answered from the local pool index, the RPC is only scanned for mints it does not know yet
+    pair_addresses = pool_index.pools_for_mint(token_mint)
+    if pair_addresses:
+        return pair_addresses
+    return pool_index.refresh_mint(token_mint)
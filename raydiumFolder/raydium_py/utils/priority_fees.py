@@ -0,0 +1,104 @@
+import time
+import asyncio
+from typing import Optional
+
+from raydiumFolder.raydium_py.utils.clients import rpc_request
+from raydiumFolder.raydium_py.utils.pool_cache import pool_keys_cache
+
+# Priority fees (micro-lamports per CU) paid recently by transactions that wrote the
+# same accounts as our swap. A background loop samples getRecentPrioritizationFees for
+# the pools traded lately and keeps a rolling window of the last slots per pool, so a
+# trade only reads a percentile from memory.
+FEE_TIERS = {"normal": 50, "fast": 75, "turbo": 95}  # tier -> percentile
+DEFAULT_FEE_TIER = "fast"
+FALLBACK_UNIT_PRICE = 1_000_000
+MIN_UNIT_PRICE = 10_000
+MAX_UNIT_PRICE = 5_000_000
+FEE_WINDOW_SLOTS = 300
+FEE_REFRESH_SECONDS = 10
+WATCHED_POOL_SECONDS = 15 * 60
+GLOBAL_FEES = "*"
+
+
+def percentile(sorted_values: list, percent: float) -> int:
+    # Nearest-rank percentile of an already sorted list
+    index = max(0, min(len(sorted_values) - 1, int(round(percent / 100 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+class PriorityFeeEstimator:
+    def __init__(self, request=rpc_request, refresh_seconds: float = FEE_REFRESH_SECONDS, window_slots: int = FEE_WINDOW_SLOTS):
+        self.request = request
+        self.refresh_seconds = refresh_seconds
+        self.window_slots = window_slots
+        self._windows = {}        # pool (or GLOBAL_FEES) -> {slot: fee}
+        self._sorted_fees = {}    # pool -> sorted fees of its window
+        self._watched = {}        # pool -> last time a trade asked for it
+        self._task = None
+
+    def watch(self, pair_address: str):
+        self._watched[pair_address] = time.monotonic()
+
+    def estimate(self, pair_address: Optional[str] = None, tier: str = DEFAULT_FEE_TIER) -> int:
+        # Never waits on the RPC: unknown pools use the global window until the loop samples them
+        if pair_address is not None:
+            self.watch(pair_address)
+        fees = self._sorted_fees.get(pair_address) or self._sorted_fees.get(GLOBAL_FEES)
+        if not fees:
+            return FALLBACK_UNIT_PRICE
+        unit_price = percentile(fees, FEE_TIERS.get(tier, FEE_TIERS[DEFAULT_FEE_TIER]))
+        return max(MIN_UNIT_PRICE, min(MAX_UNIT_PRICE, unit_price))
+
+    def _writable_accounts(self, pair_address: str) -> list:
+        pool_keys = pool_keys_cache.get(pair_address)
+        if pool_keys is None:
+            return [pair_address]
+        return [str(account) for account in (pool_keys.amm_id, pool_keys.base_vault, pool_keys.quote_vault, pool_keys.market_id)]
+
+    async def refresh(self, pair_address: str = GLOBAL_FEES):
+        accounts = [] if pair_address == GLOBAL_FEES else self._writable_accounts(pair_address)
+        response = await self.request("getRecentPrioritizationFees", [accounts])
+        if not response or "result" not in response:
+            return
+        window = self._windows.setdefault(pair_address, {})
+        for sample in response["result"]:
+            window[sample["slot"]] = sample["prioritizationFee"]
+        if window:
+            newest_slot = max(window)
+            for slot in [slot for slot in window if slot <= newest_slot - self.window_slots]:
+                del window[slot]
+        self._sorted_fees[pair_address] = sorted(window.values())
+
+    async def refresh_all(self):
+        now = time.monotonic()
+        for pair_address, last_used in list(self._watched.items()):
+            if now - last_used > WATCHED_POOL_SECONDS:
+                del self._watched[pair_address]
+                self._windows.pop(pair_address, None)
+                self._sorted_fees.pop(pair_address, None)
+        pools = [GLOBAL_FEES, *self._watched]
+        results = await asyncio.gather(*(self.refresh(pair_address) for pair_address in pools), return_exceptions=True)
+        for pair_address, result in zip(pools, results):
+            if isinstance(result, Exception):
+                print(f"[ERROR] Could not sample priority fees for {pair_address}: {result}")
+
+    async def _run(self):
+        while True:
+            await self.refresh_all()
+            await asyncio.sleep(self.refresh_seconds)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+priority_fee_estimator = PriorityFeeEstimator()
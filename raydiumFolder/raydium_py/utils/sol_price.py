@@ -0,0 +1,108 @@
+import os
+import time
+import asyncio
+from typing import Optional
+
+from solders.pubkey import Pubkey  # type: ignore
+
+from raydiumFolder.raydium_py.layouts.amm_v4_fast import LIQUIDITY_STATE_V4_FAST
+from raydiumFolder.raydium_py.raydium.constants import WSOL
+from raydiumFolder.raydium_py.utils.accounts import fetch_accounts_raw_async, fetch_token_amounts_async
+from raydiumFolder.raydium_py.utils.clients import get_http_session
+
+# SOL/USD read from the vaults of the Raydium SOL/USDC AMM v4 pool every few seconds
+# and served from memory. CoinGecko is only asked when the on-chain price is stale.
+SOL_USDC_AMM_V4 = os.getenv("SOL_USDC_AMM_V4", "58oQChx4yWmvKdwLLZzBi4ChoCc2fqCUWBkwMihLYQo2")
+SOL_PRICE_REFRESH_SECONDS = 10
+SOL_PRICE_MAX_AGE_SECONDS = 60
+COINGECKO_PRICE_URL = "https://api.coingecko.com/api/v3/simple/price"
+
+
+class SolPriceService:
+    def __init__(self, pair_address: str = SOL_USDC_AMM_V4, refresh_seconds: float = SOL_PRICE_REFRESH_SECONDS,
+                 max_age_seconds: float = SOL_PRICE_MAX_AGE_SECONDS):
+        self.pair_address = pair_address
+        self.refresh_seconds = refresh_seconds
+        self.max_age_seconds = max_age_seconds
+        self._vaults = None    # (sol vault, usd vault, sol decimals, usd decimals)
+        self._price = None
+        self._fetched_at = 0.0
+        self._task = None
+
+    def get(self) -> Optional[float]:
+        # Price from memory, None when missing or older than max_age_seconds
+        if self._price is None or time.monotonic() - self._fetched_at > self.max_age_seconds:
+            return None
+        return self._price
+
+    async def get_async(self) -> float:
+        price = self.get()
+        if price is not None:
+            return price
+        try:
+            await self.refresh()
+        except Exception as e:
+            print(f"[ERROR] Could not read SOL price from the pool: {e}")
+        price = self.get()
+        if price is not None:
+            return price
+        return await self.refresh_from_http() or self._price or 0
+
+    async def _load_vaults(self):
+        amm_data = (await fetch_accounts_raw_async([Pubkey.from_string(self.pair_address)]))[0]
+        amm = LIQUIDITY_STATE_V4_FAST.parse(amm_data)
+        coin_vault = Pubkey.from_bytes(amm.poolCoinTokenAccount)
+        pc_vault = Pubkey.from_bytes(amm.poolPcTokenAccount)
+        if Pubkey.from_bytes(amm.coinMintAddress) == WSOL:
+            self._vaults = (coin_vault, pc_vault, amm.coinDecimals, amm.pcDecimals)
+        else:
+            self._vaults = (pc_vault, coin_vault, amm.pcDecimals, amm.coinDecimals)
+
+    async def refresh(self):
+        if self._vaults is None:
+            await self._load_vaults()
+        sol_vault, usd_vault, sol_decimals, usd_decimals = self._vaults
+        sol_amount, usd_amount = await fetch_token_amounts_async([sol_vault, usd_vault])
+        if not sol_amount or usd_amount is None:
+            return
+        self._price = (usd_amount / 10**usd_decimals) / (sol_amount / 10**sol_decimals)
+        self._fetched_at = time.monotonic()
+
+    async def refresh_from_http(self) -> Optional[float]:
+        try:
+            params = {'ids': 'solana', 'vs_currencies': 'usd'}
+            async with get_http_session().get(COINGECKO_PRICE_URL, params=params) as response:
+                if response.status != 200:
+                    print(f"Error fetching SOL price: {response.status}")
+                    return None
+                data = await response.json()
+        except Exception as e:
+            print(f"Error fetching SOL price: {e}")
+            return None
+        self._price = float(data['solana']['usd'])
+        self._fetched_at = time.monotonic()
+        return self._price
+
+    async def _run(self):
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                print(f"[ERROR] Could not refresh SOL price: {e}")
+            await asyncio.sleep(self.refresh_seconds)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+sol_price_service = SolPriceService()
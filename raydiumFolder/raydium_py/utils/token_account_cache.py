@@ -0,0 +1,46 @@
+import threading
+from collections import OrderedDict
+
+from solders.pubkey import Pubkey  # type: ignore
+
+# Token accounts each wallet is known to own. A buy whose output account is known
+# skips the create instruction, an unknown one gets an idempotent create, so the
+# buy path never has to read the owner's accounts. Entries are updated after every
+# trade (added on a confirmed buy, removed when a sell closes the account or a
+# trade fails) and wallets are evicted LRU.
+KNOWN_TOKEN_ACCOUNTS_WALLETS = 10_000
+
+
+class KnownTokenAccounts:
+    def __init__(self, max_wallets: int = KNOWN_TOKEN_ACCOUNTS_WALLETS):
+        self.max_wallets = max_wallets
+        self._wallets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def contains(self, owner: Pubkey, token_account: Pubkey) -> bool:
+        with self._lock:
+            accounts = self._wallets.get(owner)
+            if accounts is None:
+                return False
+            self._wallets.move_to_end(owner)
+            return token_account in accounts
+
+    def add(self, owner: Pubkey, token_account: Pubkey):
+        with self._lock:
+            accounts = self._wallets.get(owner)
+            if accounts is None:
+                accounts = set()
+                self._wallets[owner] = accounts
+            self._wallets.move_to_end(owner)
+            accounts.add(token_account)
+            while len(self._wallets) > self.max_wallets:
+                self._wallets.popitem(last=False)
+
+    def discard(self, owner: Pubkey, token_account: Pubkey):
+        with self._lock:
+            accounts = self._wallets.get(owner)
+            if accounts is not None:
+                accounts.discard(token_account)
+
+
+known_token_accounts = KnownTokenAccounts()
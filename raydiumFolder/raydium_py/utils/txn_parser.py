@@ -0,0 +1,132 @@
+from dataclasses import dataclass
+from typing import Optional
+
+import base58
+
+from raydiumFolder.raydium_py.raydium.constants import RAYDIUM_AMM_V4, WSOL
+from raydiumFolder.raydium_py.utils.clients import rpc_request
+
+# Reading confirmed transactions as plain JSON (getTransaction, "json" encoding).
+# Swap amounts are taken from the pool vault balances before/after the transaction,
+# which is exact whatever WSOL mode or token accounts the swap used.
+
+
+async def fetch_transaction(signature, request=rpc_request) -> Optional[dict]:
+    response = await request("getTransaction", [str(signature), {"encoding": "json", "commitment": "confirmed", "maxSupportedTransactionVersion": 0}])
+    result = response.get("result") if response else None
+    if not result or not result.get("meta"):
+        return None
+    return result
+
+def account_keys(transaction: dict) -> list:
+    # Static keys followed by the keys loaded from address lookup tables, in instruction index order
+    keys = list(transaction["transaction"]["message"]["accountKeys"])
+    loaded = transaction["meta"].get("loadedAddresses") or {}
+    return keys + loaded.get("writable", []) + loaded.get("readonly", [])
+
+def _token_balance_entry(token_balances: list, account_index: int) -> Optional[dict]:
+    for balance in token_balances:
+        if balance["accountIndex"] == account_index:
+            return balance
+    return None
+
+def token_balance_at(token_balances: list, account_index: int) -> Optional[int]:
+    balance = _token_balance_entry(token_balances, account_index)
+    return int(balance["uiTokenAmount"]["amount"]) if balance else None
+
+def token_mint_of(transaction: dict, account) -> Optional[str]:
+    keys = account_keys(transaction)
+    if str(account) not in keys:
+        return None
+    index = keys.index(str(account))
+    balance = _token_balance_entry(transaction["meta"]["postTokenBalances"], index) or _token_balance_entry(transaction["meta"]["preTokenBalances"], index)
+    return balance["mint"] if balance else None
+
+def token_balance_delta(transaction: dict, account) -> Optional[int]:
+    # post - pre raw amount of a token account, None when the account is not in the transaction
+    keys = account_keys(transaction)
+    if str(account) not in keys:
+        return None
+    index = keys.index(str(account))
+    pre = token_balance_at(transaction["meta"]["preTokenBalances"], index)
+    post = token_balance_at(transaction["meta"]["postTokenBalances"], index)
+    if pre is None or post is None:
+        return None
+    return post - pre
+
+
+"""---------------------------------"""
+"""         AMM v4 Swaps            """
+"""---------------------------------"""
+
+# Swap instructions of make_amm_v4_swap_instruction (18 accounts) and the shorter
+# 17-account form without target orders, top level or called by another program.
+# Direction and amounts come from the pool vault deltas, so they are the executed
+# amounts whatever the instruction asked for.
+AMM_V4_SWAP_BASE_IN = 9
+AMM_V4_SWAP_BASE_OUT = 11
+
+
+@dataclass
+class AmmV4Swap:
+    amm_id: str
+    owner: str
+    mint: str                         # the non-SOL side of the pool
+    side: str                         # "buy" when SOL went into the pool, "sell" otherwise
+    sol_amount: int                   # lamports in or out of the pool
+    token_amount: int                 # raw tokens in or out of the pool
+    source_balance: Optional[int]     # owner's input account before the swap (raw)
+
+    def sold_percentage(self) -> float:
+        # Share of the owner's token balance this sell spent
+        if self.side != "sell" or not self.source_balance:
+            return 100.0
+        return min(100.0, self.token_amount / self.source_balance * 100)
+
+def _instructions(transaction: dict) -> list:
+    instructions = list(transaction["transaction"]["message"]["instructions"])
+    for group in transaction["meta"].get("innerInstructions") or []:
+        instructions.extend(group["instructions"])
+    return instructions
+
+def decode_amm_v4_swaps(transaction: dict) -> list:
+    keys = account_keys(transaction)
+    program_id = str(RAYDIUM_AMM_V4)
+    swaps = []
+    for instruction in _instructions(transaction):
+        if keys[instruction["programIdIndex"]] != program_id:
+            continue
+        data = base58.b58decode(instruction["data"])
+        if len(data) < 17 or data[0] not in (AMM_V4_SWAP_BASE_IN, AMM_V4_SWAP_BASE_OUT):
+            continue
+        accounts = [keys[index] for index in instruction["accounts"]]
+        if len(accounts) not in (17, 18):
+            continue
+        offset = len(accounts) - 18
+        base_vault, quote_vault = accounts[5 + offset], accounts[6 + offset]
+        source, owner = accounts[15 + offset], accounts[17 + offset]
+
+        base_delta = token_balance_delta(transaction, base_vault)
+        quote_delta = token_balance_delta(transaction, quote_vault)
+        base_mint = token_mint_of(transaction, base_vault)
+        quote_mint = token_mint_of(transaction, quote_vault)
+        if base_delta is None or quote_delta is None:
+            continue
+        if base_mint == str(WSOL):
+            sol_delta, token_delta, mint = base_delta, quote_delta, quote_mint
+        elif quote_mint == str(WSOL):
+            sol_delta, token_delta, mint = quote_delta, base_delta, base_mint
+        else:
+            continue
+
+        source_balance = token_balance_at(transaction["meta"]["preTokenBalances"], keys.index(source))
+        swaps.append(AmmV4Swap(
+            amm_id=accounts[1],
+            owner=owner,
+            mint=mint,
+            side="buy" if sol_delta > 0 else "sell",
+            sol_amount=abs(sol_delta),
+            token_amount=abs(token_delta),
+            source_balance=source_balance,
+        ))
+    return swaps
@@ -0,0 +1,514 @@
+import os
+import sys
+import json
+import time
+import base64
+import random
+import struct
+import asyncio
+from collections import deque
+from dataclasses import dataclass, replace
+from typing import Optional
+
+import base58
+import websockets
+from solders.hash import Hash  # type: ignore
+from solders.keypair import Keypair  # type: ignore
+from solders.pubkey import Pubkey  # type: ignore
+from spl.token.instructions import get_associated_token_address
+
+from raydiumFolder.raydium_py.layouts.amm_v4_fast import LIQUIDITY_STATE_V4_FAST, MARKET_STATE_V3_FAST
+from raydiumFolder.raydium_py.raydium.amm_v4 import SwapState, compile_transaction, prepare_buy
+from raydiumFolder.raydium_py.raydium.constants import RAYDIUM_AMM_V4, WSOL
+from raydiumFolder.raydium_py.utils.accounts import fetch_token_amounts_async
+from raydiumFolder.raydium_py.utils.clients import WS_RPC, close_clients, rpc_request
+from raydiumFolder.raydium_py.utils.pool_cache import pool_keys_cache
+from raydiumFolder.raydium_py.utils.pool_index import pool_index
+from raydiumFolder.raydium_py.utils.pool_utils import AmmV4PoolKeys, decode_amm_v4_pool_keys
+from raydiumFolder.raydium_py.utils.txn_parser import account_keys, fetch_transaction, token_balance_at
+from metrics import LatencyTracker
+
+"""---------------------------------"""
+"""             Sniper              """
+"""---------------------------------"""
+
+# New Raydium AMM v4 pools are detected from the program logs (logsSubscribe on the
+# websocket, raw messages without "initialize2" are dropped before being parsed). When
+# the websocket is down, the signatures of the pool creation fee account are polled
+# instead: every initialize2 pays it. The stream only runs while a target is armed.
+#
+# For every new pool the pool index is primed from the instruction accounts. When its
+# mint is armed, the pool and market accounts are read in one call, the pool keys go
+# into the pool keys cache and the swap state is built from the vault balances of the
+# creation transaction, so the buy needs no other read before being sent.
+
+RAYDIUM_CREATE_POOL_FEE_ACCOUNT = "7YttLkHDoNj9wyDur5pM1ejNaAvT9X4eqaYcHQqtj2G5"
+AMM_V4_INITIALIZE2 = 1
+INITIALIZE2_DATA = struct.Struct("<BBQQQ")   # discriminator, nonce, open time, init pc amount, init coin amount
+SNIPER_POLL_SECONDS = float(os.getenv("SNIPER_POLL_SECONDS", "1"))
+SNIPER_RECONNECT_SECONDS = 5
+SNIPER_MAX_AGE_SECONDS = 60
+SEEN_SIGNATURES = 10_000
+TRANSACTION_FETCH_ATTEMPTS = 5
+
+snipe_latency = LatencyTracker("snipe detection to send", report_every=10)
+
+
+@dataclass
+class SnipeTarget:
+    # Everything the buy needs that is known when the target is armed
+    user_id: str
+    mint: str
+    sol_amount: float
+    slippage: Optional[float]
+    wsol_mode: str
+    fee_tier: str
+    payer: Keypair
+    token_account: Pubkey
+    wsol_account: Pubkey
+
+
+@dataclass
+class NewPool:
+    amm_id: str
+    mint: str
+    pool_keys: AmmV4PoolKeys
+    base_vault_amount: int
+    quote_vault_amount: int
+    open_time: int
+    signature: str
+    detected_at: float    # time.monotonic() when the creation was seen
+
+
+def swap_state_for(target: SnipeTarget, new_pool: NewPool) -> SwapState:
+    # The output account cannot exist yet for a brand new mint only bought through us,
+    # prepare_buy adds the idempotent create anyway
+    return SwapState(new_pool.pool_keys, target.token_account, new_pool.base_vault_amount, new_pool.quote_vault_amount,
+                     None, target.wsol_account, None)
+
+
+class SniperEngine:
+    def __init__(self, request=rpc_request, ws_url: str = WS_RPC, poll_seconds: float = SNIPER_POLL_SECONDS):
+        self.request = request
+        self.ws_url = ws_url
+        self.poll_seconds = poll_seconds
+        self.on_pool = None     # on_pool(SnipeTarget, NewPool), must not block
+        self._targets = {}      # mint -> {user_id: SnipeTarget}
+        self._armed = asyncio.Event()
+        self._disarmed = asyncio.Event()
+        self._disarmed.set()
+        self._handlers = set()
+        self._seen = set()
+        self._seen_order = deque()
+        self._cursor = None
+        self._task = None
+
+    def arm(self, user_id, mint: str, sol_amount: float, private_key: str, slippage: Optional[float], wsol_mode: str, fee_tier: str):
+        payer = Keypair.from_base58_string(private_key)
+        target = SnipeTarget(
+            str(user_id), mint, sol_amount, slippage, wsol_mode, fee_tier, payer,
+            get_associated_token_address(payer.pubkey(), Pubkey.from_string(mint)),
+            get_associated_token_address(payer.pubkey(), WSOL),
+        )
+        self._targets.setdefault(mint, {})[str(user_id)] = target
+        self._update_armed()
+
+    def disarm(self, user_id, mint: str):
+        targets = self._targets.get(mint)
+        if targets is None:
+            return
+        targets.pop(str(user_id), None)
+        if not targets:
+            del self._targets[mint]
+        self._update_armed()
+
+    def _update_armed(self):
+        # The stream runs while a target is armed, the last disarm closes the websocket
+        if self._targets:
+            self._disarmed.clear()
+            self._armed.set()
+        else:
+            self._armed.clear()
+            self._disarmed.set()
+
+    def load(self, users: dict):
+        # Targets are kept in each user's settings: {"snipe": {mint: {"sol_amount": SOL}}}
+        for user_id, user in users.items():
+            settings = user.get("settings") or {}
+            if not settings.get("snipe") or not user.get("wallets"):
+                continue
+            private_key = next(iter(user["wallets"].values()))["private_key"]
+            slippage = None if settings.get("auto_slippage", "disabled") == "enabled" else settings.get("slippage", 2)
+            for mint, snipe in settings["snipe"].items():
+                self.arm(user_id, mint, snipe["sol_amount"], private_key, slippage,
+                         settings.get("wsol_mode", "ephemeral"), settings.get("fee_tier", "fast"))
+
+    def is_armed(self, mint: str) -> bool:
+        return mint in self._targets
+
+    # Detection
+
+    def handle_logs(self, value: dict, detected_at: Optional[float] = None):
+        # value of a logsNotification: {"signature", "err", "logs"}
+        if value.get("err") is not None:
+            return
+        if any("initialize2" in line for line in value.get("logs") or ()):
+            self._handle_soon(value["signature"], detected_at or time.monotonic())
+
+    def _handle_soon(self, signature: str, detected_at: float):
+        task = asyncio.create_task(self.handle_signature(signature, detected_at))
+        self._handlers.add(task)
+        task.add_done_callback(self._handlers.discard)
+
+    async def handle_signature(self, signature: str, detected_at: float):
+        if signature in self._seen:
+            return
+        self._seen.add(signature)
+        self._seen_order.append(signature)
+        if len(self._seen_order) > SEEN_SIGNATURES:
+            self._seen.discard(self._seen_order.popleft())
+
+        try:
+            transaction = await self._fetch(signature)
+            if transaction is None:
+                print(f"[ERROR] Sniper could not read pool creation {signature}")
+                return
+            for initialization in decode_initializations(transaction):
+                pool_index.add(*(bytes(Pubkey.from_string(initialization[key])) for key in ("amm_id", "base_vault", "quote_vault", "base_mint", "quote_mint")))
+                mint = initialization["quote_mint"] if initialization["base_mint"] == str(WSOL) else initialization["base_mint"]
+                if mint in self._targets:
+                    await self._snipe(initialization, mint, signature, detected_at)
+        except Exception as e:
+            print(f"[ERROR] Sniper failed on {signature}: {e}")
+
+    async def _fetch(self, signature: str):
+        # The websocket can announce a transaction before getTransaction serves it
+        for attempt in range(TRANSACTION_FETCH_ATTEMPTS):
+            transaction = await fetch_transaction(signature, self.request)
+            if transaction is not None:
+                return transaction
+            await asyncio.sleep(0.1 * (attempt + 1))
+        return None
+
+    async def _snipe(self, initialization: dict, mint: str, signature: str, detected_at: float):
+        amm_id = initialization["amm_id"]
+        response = await self.request("getMultipleAccounts", [[amm_id, initialization["market_id"]], {"encoding": "base64", "commitment": "confirmed"}])
+        accounts = (response or {}).get("result", {}).get("value") or [None, None]
+        if accounts[0] is None or accounts[1] is None:
+            print(f"[ERROR] Sniper could not read pool {amm_id}")
+            return
+        amm_data = base64.b64decode(accounts[0]["data"][0])
+        market_data = base64.b64decode(accounts[1]["data"][0])
+        pool_keys = decode_amm_v4_pool_keys(Pubkey.from_string(amm_id), LIQUIDITY_STATE_V4_FAST.parse(amm_data), market_data)
+        pool_keys_cache.put(amm_id, pool_keys)
+
+        new_pool = NewPool(amm_id, mint, pool_keys, initialization["base_vault_amount"], initialization["quote_vault_amount"],
+                           initialization["open_time"], signature, detected_at)
+        targets = self._targets.pop(mint, {})
+        self._update_armed()
+
+        # Swaps are refused before the pool open time
+        delay = new_pool.open_time - time.time()
+        if delay > 0:
+            print(f"[INFO] Pool {amm_id} opens in {delay:.0f}s, {len(targets)} snipes waiting")
+            await asyncio.sleep(delay)
+            new_pool = await self._refresh_reserves(new_pool)
+        for target in targets.values():
+            try:
+                self.on_pool(target, new_pool)
+            except Exception as e:
+                print(f"[ERROR] Snipe for user {target.user_id} failed: {e}")
+
+    async def _refresh_reserves(self, new_pool: NewPool) -> NewPool:
+        # Other buyers may have moved the pool since its creation, the buy is quoted on the current vaults
+        try:
+            base_vault_amount, quote_vault_amount = await fetch_token_amounts_async([new_pool.pool_keys.base_vault, new_pool.pool_keys.quote_vault])
+        except Exception as e:
+            print(f"[ERROR] Sniper could not refresh the vaults of {new_pool.amm_id}: {e}")
+            return new_pool
+        if base_vault_amount is None or quote_vault_amount is None:
+            return new_pool
+        return replace(new_pool, base_vault_amount=base_vault_amount, quote_vault_amount=quote_vault_amount)
+
+    # Streams
+
+    async def _subscribe(self):
+        async with websockets.connect(self.ws_url, ping_interval=20, max_size=None) as ws:
+            await ws.send(json.dumps({
+                "jsonrpc": "2.0", "id": 1, "method": "logsSubscribe",
+                "params": [{"mentions": [str(RAYDIUM_AMM_V4)]}, {"commitment": "confirmed"}],
+            }))
+            closer = asyncio.create_task(self._close_when_disarmed(ws))
+            try:
+                await self._read(ws)
+            finally:
+                closer.cancel()
+
+    async def _close_when_disarmed(self, ws):
+        await self._disarmed.wait()
+        await ws.close()
+
+    async def _read(self, ws):
+        async for message in ws:
+            # Every swap of the program comes through here, most never get parsed
+            if "initialize2" not in message:
+                continue
+            value = json.loads(message).get("params", {}).get("result", {}).get("value")
+            if value:
+                self.handle_logs(value)
+
+    async def poll(self):
+        params = {"limit": 50, "commitment": "confirmed"}
+        if self._cursor is not None:
+            params["until"] = self._cursor
+        response = await self.request("getSignaturesForAddress", [RAYDIUM_CREATE_POOL_FEE_ACCOUNT, params])
+        signatures = (response or {}).get("result") or []
+        if not signatures:
+            return
+        self._cursor = signatures[0]["signature"]
+        now = time.time()
+        for signature in reversed(signatures):
+            if signature.get("err") is None and (signature.get("blockTime") is None or now - signature["blockTime"] <= SNIPER_MAX_AGE_SECONDS):
+                self._handle_soon(signature["signature"], time.monotonic())
+
+    async def _poll_for(self, seconds: float):
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline and self._targets:
+            try:
+                await self.poll()
+            except Exception as e:
+                print(f"[ERROR] Sniper poll failed: {e}")
+            await asyncio.sleep(self.poll_seconds)
+
+    async def _run(self):
+        while True:
+            await self._armed.wait()
+            try:
+                await self._subscribe()
+            except Exception as e:
+                print(f"[ERROR] Sniper websocket failed, polling for {SNIPER_RECONNECT_SECONDS}s: {e}")
+                await self._poll_for(SNIPER_RECONNECT_SECONDS)
+
+    def start(self, on_pool):
+        self.on_pool = on_pool
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for task in list(self._handlers):
+            task.cancel()
+        await asyncio.gather(*self._handlers, return_exceptions=True)
+
+
+def decode_initializations(transaction: dict) -> list:
+    # initialize2 instructions of the transaction: pool accounts, open time and the
+    # vault balances right after the creation
+    keys = account_keys(transaction)
+    meta = transaction["meta"]
+    instructions = list(transaction["transaction"]["message"]["instructions"])
+    for group in meta.get("innerInstructions") or []:
+        instructions.extend(group["instructions"])
+
+    initializations = []
+    for instruction in instructions:
+        if keys[instruction["programIdIndex"]] != str(RAYDIUM_AMM_V4):
+            continue
+        data = base58.b58decode(instruction["data"])
+        if len(data) < INITIALIZE2_DATA.size or data[0] != AMM_V4_INITIALIZE2 or len(instruction["accounts"]) < 21:
+            continue
+        _, _, open_time, init_pc_amount, init_coin_amount = INITIALIZE2_DATA.unpack_from(data)
+        accounts = instruction["accounts"]
+        base_vault_amount = token_balance_at(meta["postTokenBalances"], accounts[10])
+        quote_vault_amount = token_balance_at(meta["postTokenBalances"], accounts[11])
+        initializations.append({
+            "amm_id": keys[accounts[4]],
+            "base_mint": keys[accounts[8]],
+            "quote_mint": keys[accounts[9]],
+            "base_vault": keys[accounts[10]],
+            "quote_vault": keys[accounts[11]],
+            "market_id": keys[accounts[16]],
+            "open_time": open_time,
+            "base_vault_amount": base_vault_amount if base_vault_amount is not None else init_coin_amount,
+            "quote_vault_amount": quote_vault_amount if quote_vault_amount is not None else init_pc_amount,
+        })
+    return initializations
+
+
+sniper_engine = SniperEngine()
+
+
+"""---------------------------------"""
+"""          Replay Harness         """
+"""---------------------------------"""
+
+OPEN_BOOK_PROGRAM = Pubkey.from_string("srmqPvymJeFKQ4zGQed1GFppgkRHL9kaELCbyksJtPX")
+
+
+def _random_pubkey() -> Pubkey:
+    return Pubkey.from_bytes(random.randbytes(32))
+
+
+def _set_fields(layout, data: bytearray, values: dict):
+    for name, value in values.items():
+        offset, kind = layout.offsets[name]
+        data[offset:offset + (32 if kind == "pubkey" else 8)] = bytes(value) if kind == "pubkey" else struct.pack("<Q", value)
+
+
+def fake_pool_creation(mint: Pubkey, sol_amount: int = 100 * 10**9, token_amount: int = 10**15) -> tuple:
+    # (logsNotification value, getTransaction result, {address: account data}) of one initialize2
+    amm, market, base_vault, quote_vault = (_random_pubkey() for _ in range(4))
+    nonce = next(nonce for nonce in range(256) if _valid_nonce(market, nonce))
+
+    amm_data = bytearray(LIQUIDITY_STATE_V4_FAST.size)
+    _set_fields(LIQUIDITY_STATE_V4_FAST, amm_data, {
+        "coinDecimals": 6, "pcDecimals": 9, "swapFeeNumerator": 25, "swapFeeDenominator": 10000,
+        "poolCoinTokenAccount": base_vault, "poolPcTokenAccount": quote_vault, "coinMintAddress": mint,
+        "pcMintAddress": WSOL, "ammOpenOrders": _random_pubkey(), "serumMarket": market, "ammTargetOrders": _random_pubkey(),
+    })
+    market_data = bytearray(MARKET_STATE_V3_FAST.size)
+    _set_fields(MARKET_STATE_V3_FAST, market_data, {
+        "vault_signer_nonce": nonce, "base_mint": mint, "quote_mint": WSOL, "base_vault": _random_pubkey(),
+        "quote_vault": _random_pubkey(), "event_queue": _random_pubkey(), "bids": _random_pubkey(), "asks": _random_pubkey(),
+    })
+
+    accounts = [_random_pubkey() for _ in range(21)]
+    accounts[4], accounts[8], accounts[9], accounts[10], accounts[11], accounts[16] = amm, mint, WSOL, base_vault, quote_vault, market
+    keys = [str(account) for account in accounts] + [str(RAYDIUM_AMM_V4)]
+    signature = base58.b58encode(random.randbytes(64)).decode("utf-8")
+    data = INITIALIZE2_DATA.pack(AMM_V4_INITIALIZE2, nonce, 0, sol_amount, token_amount)
+    transaction = {
+        "slot": 1,
+        "transaction": {"message": {
+            "accountKeys": keys,
+            "instructions": [{"programIdIndex": len(keys) - 1, "accounts": list(range(21)), "data": base58.b58encode(data).decode("utf-8")}],
+        }},
+        "meta": {
+            "err": None,
+            "fee": 5000,
+            "preTokenBalances": [],
+            "postTokenBalances": [
+                {"accountIndex": 10, "mint": str(mint), "uiTokenAmount": {"amount": str(token_amount)}},
+                {"accountIndex": 11, "mint": str(WSOL), "uiTokenAmount": {"amount": str(sol_amount)}},
+            ],
+            "innerInstructions": [],
+        },
+    }
+    logs = {"signature": signature, "err": None, "logs": [
+        f"Program {RAYDIUM_AMM_V4} invoke [1]",
+        f"Program log: initialize2: InitializeInstruction2 {{ nonce: {nonce}, open_time: 0, init_pc_amount: {sol_amount}, init_coin_amount: {token_amount} }}",
+        f"Program {RAYDIUM_AMM_V4} success",
+    ]}
+    return logs, transaction, {str(amm): bytes(amm_data), str(market): bytes(market_data)}
+
+
+def _valid_nonce(market: Pubkey, nonce: int) -> bool:
+    try:
+        Pubkey.create_program_address([bytes(market), struct.pack("<Q", nonce)], OPEN_BOOK_PROGRAM)
+        return True
+    except Exception:
+        return False
+
+
+def fake_swap_logs() -> dict:
+    return {"signature": base58.b58encode(random.randbytes(64)).decode("utf-8"), "err": None, "logs": [
+        f"Program {RAYDIUM_AMM_V4} invoke [1]",
+        "Program log: ray_log: A0BCDwAAAAAAAAAAAAAAAAACAAAAAAAAAA==",
+        f"Program {RAYDIUM_AMM_V4} success",
+    ]}
+
+
+class FakeSniperRpc:
+    def __init__(self, latency: float = 0.02):
+        self.latency = latency
+        self.transactions = {}
+        self.accounts = {}
+        self.calls = {}
+
+    async def __call__(self, method: str, params: list) -> dict:
+        self.calls[method] = self.calls.get(method, 0) + 1
+        await asyncio.sleep(self.latency)
+        if method == "getTransaction":
+            return {"result": self.transactions.get(params[0])}
+        if method == "getMultipleAccounts":
+            return {"result": {"value": [
+                {"data": [base64.b64encode(self.accounts[address]).decode("utf-8"), "base64"]} if address in self.accounts else None
+                for address in params[0]
+            ]}}
+        raise ValueError(f"FakeSniperRpc does not implement {method}")
+
+
+async def replay(pools: int = 50, swaps_per_pool: int = 200, users_per_target: int = 20, recorded: list | None = None) -> dict:
+    # Program logs are fed to the engine as the websocket would deliver them: mostly
+    # swaps, some pool creations, half of them armed. The latency is from the
+    # notification to the signed transaction of each snipe (the send itself is not
+    # made). Recorded logs are read against the real RPC (RPC_URL) with nothing armed,
+    # which measures detection and priming only.
+    fake_rpc = FakeSniperRpc()
+    engine = SniperEngine(request=rpc_request if recorded else fake_rpc)
+    latency = LatencyTracker("snipe replay", window=pools * users_per_target, report_every=0)
+    built = {"transactions": 0}
+    blockhash = Hash.default()
+
+    def on_pool(target, new_pool):
+        instructions, _, _ = prepare_buy(swap_state_for(target, new_pool), target.payer.pubkey(), target.sol_amount, target.slippage,
+                                         2_039_280, target.wsol_mode, 1_000_000)
+        bytes(compile_transaction(target.payer, instructions, blockhash))
+        built["transactions"] += 1
+        latency.record(time.monotonic() - new_pool.detected_at)
+
+    engine.on_pool = on_pool
+    payers = [Keypair() for _ in range(users_per_target)]
+    feed = []
+    if recorded:
+        feed = recorded
+    else:
+        for index in range(pools):
+            mint = _random_pubkey()
+            logs, transaction, accounts = fake_pool_creation(mint)
+            fake_rpc.transactions[logs["signature"]] = transaction
+            fake_rpc.accounts.update(accounts)
+            if index % 2 == 0:
+                for user_index, payer in enumerate(payers):
+                    engine.arm(f"user{user_index}", str(mint), 0.1, str(payer), 5.0, "ephemeral", "fast")
+            feed += [fake_swap_logs() for _ in range(swaps_per_pool)] + [logs]
+
+    filter_start = time.perf_counter()
+    for value in feed:
+        message = json.dumps({"jsonrpc": "2.0", "method": "logsNotification", "params": {"result": {"value": value}}})
+        # Same pre-filter as the websocket loop
+        if "initialize2" in message:
+            engine.handle_logs(json.loads(message)["params"]["result"]["value"])
+    filter_ms = (time.perf_counter() - filter_start) * 1000
+    await asyncio.sleep(2)
+    if recorded:
+        await close_clients()
+
+    p50, p95 = latency.percentiles()
+    return {
+        "notifications": len(feed),
+        "filter_ms": round(filter_ms, 2),
+        "snipes_built": built["transactions"],
+        "p50_ms": round(p50 * 1000, 1),
+        "p95_ms": round(p95 * 1000, 1),
+        "rpc_calls": fake_rpc.calls,
+        "pool_index_size": len(pool_index),
+    }
+
+
+if __name__ == "__main__":
+    if len(sys.argv) in (2, 3) and sys.argv[1] == "replay":
+        recorded = None
+        if len(sys.argv) == 3:
+            # A JSON list of logsNotification values recorded from logsSubscribe
+            with open(sys.argv[2], "r") as file:
+                recorded = json.load(file)
+        print(asyncio.run(replay(recorded=recorded)))
+    else:
+        print("Usage: python sniper.py replay [recorded_logs.json]")
@@ -0,0 +1,209 @@
+import os
+import sys
+import time
+import sqlite3
+import asyncio
+import threading
+from dataclasses import dataclass
+
+from raydiumFolder.raydium_py.raydium.amm_v4 import get_token_mint, sol_vault, token_vault
+from raydiumFolder.raydium_py.raydium.amm_v4_quote import token_decimals
+from raydiumFolder.raydium_py.utils.pool_cache import get_pool_keys_async
+from raydiumFolder.raydium_py.utils.txn_parser import fetch_transaction, token_balance_delta
+
+"""---------------------------------"""
+"""          Trade Ledger           """
+"""---------------------------------"""
+
+# Every confirmed trade is appended to the trades table (raw amounts, never rewritten).
+# The positions table holds one row per (user, mint) updated in the same SQLite
+# transaction, so the token card reads cost basis and PnL with one primary key lookup.
+# Cost basis uses the average cost method: a sell releases cost_basis * sold / holding.
+# History pages are read by id (keyset pagination), never by OFFSET.
+
+TRADE_LEDGER_PATH = os.getenv("TRADE_LEDGER_PATH", "users.db")
+HISTORY_PAGE_SIZE = 8
+SOL_DECIMAL = 1e9
+
+
+@dataclass
+class Position:
+    mint: str
+    pool: str
+    token_symbol: str
+    token_decimals: int
+    bought_sol: int        # lamports spent on buys (fees included)
+    sold_sol: int          # lamports received from sells (fees deducted)
+    holding_tokens: int    # raw token amount bought through the bot and not sold yet
+    cost_basis_sol: int    # lamports of cost still attached to holding_tokens
+    realized_pnl_sol: int
+    trades_count: int
+
+    def unrealized_pnl_sol(self, price_sol: float) -> float:
+        # price_sol: SOL per whole token
+        return self.holding_tokens / 10**self.token_decimals * price_sol - self.cost_basis_sol / SOL_DECIMAL
+
+    def pnl_sol(self, price_sol: float) -> float:
+        return self.realized_pnl_sol / SOL_DECIMAL + self.unrealized_pnl_sol(price_sol)
+
+    def pnl_percentage(self, price_sol: float) -> float:
+        if not self.bought_sol:
+            return 0.0
+        return self.pnl_sol(price_sol) / (self.bought_sol / SOL_DECIMAL) * 100
+
+
+class TradeLedger:
+    def __init__(self, path: str = TRADE_LEDGER_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS trades ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, user_id TEXT NOT NULL, signature TEXT NOT NULL UNIQUE, "
+            "mint TEXT NOT NULL, pool TEXT NOT NULL, token_symbol TEXT NOT NULL, side TEXT NOT NULL, "
+            "sol_amount INTEGER NOT NULL, token_amount INTEGER NOT NULL, token_decimals INTEGER NOT NULL, "
+            "fee_lamports INTEGER NOT NULL, slot INTEGER, created_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS trades_by_user ON trades (user_id, id)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS positions ("
+            "user_id TEXT NOT NULL, mint TEXT NOT NULL, pool TEXT NOT NULL, token_symbol TEXT NOT NULL, "
+            "token_decimals INTEGER NOT NULL, bought_sol INTEGER NOT NULL, sold_sol INTEGER NOT NULL, "
+            "holding_tokens INTEGER NOT NULL, cost_basis_sol INTEGER NOT NULL, realized_pnl_sol INTEGER NOT NULL, "
+            "trades_count INTEGER NOT NULL, PRIMARY KEY (user_id, mint))"
+        )
+
+    def record_trade(self, user_id, signature: str, mint: str, pool: str, token_symbol: str, side: str,
+                     sol_amount: int, token_amount: int, decimals: int, fee_lamports: int, slot: int | None) -> bool:
+        # sol_amount / token_amount are raw and positive, side is "buy" or "sell".
+        # False when the signature is already in the ledger.
+        user_id = str(user_id)
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                cursor = self._conn.execute(
+                    "INSERT OR IGNORE INTO trades (user_id, signature, mint, pool, token_symbol, side, sol_amount, "
+                    "token_amount, token_decimals, fee_lamports, slot, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (user_id, signature, mint, pool, token_symbol, side, sol_amount, token_amount, decimals, fee_lamports, slot, time.time()),
+                )
+                if cursor.rowcount == 0:
+                    self._conn.execute("ROLLBACK")
+                    return False
+                self._apply(user_id, mint, pool, token_symbol, side, sol_amount, token_amount, decimals, fee_lamports)
+                self._conn.execute("COMMIT")
+                return True
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def _apply(self, user_id, mint, pool, token_symbol, side, sol_amount, token_amount, decimals, fee_lamports):
+        row = self._conn.execute(
+            "SELECT bought_sol, sold_sol, holding_tokens, cost_basis_sol, realized_pnl_sol, trades_count "
+            "FROM positions WHERE user_id = ? AND mint = ?", (user_id, mint),
+        ).fetchone()
+        bought_sol, sold_sol, holding_tokens, cost_basis_sol, realized_pnl_sol, trades_count = row or (0, 0, 0, 0, 0, 0)
+
+        if side == "buy":
+            bought_sol += sol_amount + fee_lamports
+            holding_tokens += token_amount
+            cost_basis_sol += sol_amount + fee_lamports
+        else:
+            # Tokens that did not come through the bot have no known cost
+            sold_from_holding = min(token_amount, holding_tokens)
+            released_cost = cost_basis_sol * sold_from_holding // holding_tokens if holding_tokens else 0
+            proceeds = sol_amount - fee_lamports
+            sold_sol += proceeds
+            realized_pnl_sol += proceeds - released_cost
+            holding_tokens -= sold_from_holding
+            cost_basis_sol -= released_cost
+
+        self._conn.execute(
+            "INSERT INTO positions (user_id, mint, pool, token_symbol, token_decimals, bought_sol, sold_sol, holding_tokens, "
+            "cost_basis_sol, realized_pnl_sol, trades_count) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT(user_id, mint) DO UPDATE SET pool = excluded.pool, token_symbol = excluded.token_symbol, "
+            "token_decimals = excluded.token_decimals, bought_sol = excluded.bought_sol, sold_sol = excluded.sold_sol, "
+            "holding_tokens = excluded.holding_tokens, cost_basis_sol = excluded.cost_basis_sol, "
+            "realized_pnl_sol = excluded.realized_pnl_sol, trades_count = excluded.trades_count",
+            (user_id, mint, pool, token_symbol, decimals, bought_sol, sold_sol, holding_tokens, cost_basis_sol, realized_pnl_sol, trades_count + 1),
+        )
+
+    def position(self, user_id, mint: str) -> Position | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT mint, pool, token_symbol, token_decimals, bought_sol, sold_sol, holding_tokens, cost_basis_sol, "
+                "realized_pnl_sol, trades_count FROM positions WHERE user_id = ? AND mint = ?", (str(user_id), mint),
+            ).fetchone()
+        return Position(*row) if row else None
+
+    def history(self, user_id, before_id: int | None = None, after_id: int | None = None, limit: int = HISTORY_PAGE_SIZE) -> list:
+        # Newest first. before_id pages towards older trades, after_id towards newer ones.
+        with self._lock:
+            if after_id is not None:
+                rows = self._conn.execute(
+                    "SELECT * FROM trades WHERE user_id = ? AND id > ? ORDER BY id ASC LIMIT ?", (str(user_id), after_id, limit),
+                ).fetchall()
+                rows.reverse()
+            else:
+                rows = self._conn.execute(
+                    "SELECT * FROM trades WHERE user_id = ? AND id < ? ORDER BY id DESC LIMIT ?",
+                    (str(user_id), before_id if before_id is not None else sys.maxsize, limit),
+                ).fetchall()
+            columns = [column[0] for column in self._conn.execute("SELECT * FROM trades LIMIT 0").description]
+        return [dict(zip(columns, row)) for row in rows]
+
+    def has_trades(self, user_id, before_id: int | None = None, after_id: int | None = None) -> bool:
+        with self._lock:
+            if after_id is not None:
+                row = self._conn.execute("SELECT 1 FROM trades WHERE user_id = ? AND id > ? LIMIT 1", (str(user_id), after_id)).fetchone()
+            else:
+                row = self._conn.execute(
+                    "SELECT 1 FROM trades WHERE user_id = ? AND id < ? LIMIT 1",
+                    (str(user_id), before_id if before_id is not None else sys.maxsize),
+                ).fetchone()
+        return row is not None
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+trade_ledger = TradeLedger()
+
+
+async def record_swap(user_id, side: str, pair_address: str, txn_sig, token_symbol: str,
+                      quoted_sol: float, quoted_tokens: float, ledger: TradeLedger = trade_ledger):
+    # Reads the confirmed swap back and appends it to the ledger. The amounts are the
+    # pool vault deltas; the quoted amounts are only used when the transaction cannot be read.
+    try:
+        pool_keys = await get_pool_keys_async(pair_address)
+        if pool_keys is None:
+            return
+        decimals = token_decimals(pool_keys)
+        sol_amount = round(quoted_sol * SOL_DECIMAL)
+        token_amount = round(quoted_tokens * 10**decimals)
+        fee_lamports, slot = 0, None
+
+        transaction = None
+        for attempt in range(3):
+            transaction = await fetch_transaction(txn_sig)
+            if transaction is not None:
+                break
+            await asyncio.sleep(1 + attempt)
+        if transaction is not None:
+            sol_delta = token_balance_delta(transaction, sol_vault(pool_keys))
+            token_delta = token_balance_delta(transaction, token_vault(pool_keys))
+            if sol_delta is not None and token_delta is not None:
+                sol_amount, token_amount = abs(sol_delta), abs(token_delta)
+            fee_lamports = transaction["meta"].get("fee", 0)
+            slot = transaction.get("slot")
+        else:
+            print(f"[ERROR] Could not read {txn_sig}, recording the quoted amounts")
+
+        ledger.record_trade(
+            user_id, str(txn_sig), str(get_token_mint(pool_keys)), pair_address, token_symbol, side,
+            sol_amount, token_amount, decimals, fee_lamports, slot,
+        )
+    except Exception as e:
+        print(f"[ERROR] Could not record trade {txn_sig}: {e}")
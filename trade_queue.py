@@ -0,0 +1,92 @@
+import sys
+import time
+import asyncio
+from collections import deque
+
+"""---------------------------------"""
+"""           Trade Queue           """
+"""---------------------------------"""
+
+# Trades run as background jobs so the Telegram update loop never waits for them.
+# Jobs of the same user run one after the other (a sell never overtakes the buy
+# it follows), jobs of different users run concurrently up to max_in_flight.
+
+MAX_PENDING_TRADES = 1000
+MAX_IN_FLIGHT_TRADES = 200
+
+
+class TradeQueue:
+    def __init__(self, max_pending: int = MAX_PENDING_TRADES, max_in_flight: int = MAX_IN_FLIGHT_TRADES):
+        self.max_pending = max_pending
+        self._semaphore = asyncio.Semaphore(max_in_flight)
+        self._user_jobs = {}
+        self._pending = 0
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    def submit(self, user_id, job) -> asyncio.Future | None:
+        # job is a coroutine function without arguments, None means the queue is full
+        if self._pending >= self.max_pending:
+            return None
+
+        future = asyncio.get_running_loop().create_future()
+        self._pending += 1
+
+        jobs = self._user_jobs.get(user_id)
+        if jobs is None:
+            jobs = deque()
+            self._user_jobs[user_id] = jobs
+            jobs.append((job, future))
+            asyncio.create_task(self._run_user_jobs(user_id, jobs))
+        else:
+            jobs.append((job, future))
+        return future
+
+    async def _run_user_jobs(self, user_id, jobs: deque):
+        while jobs:
+            job, future = jobs.popleft()
+            try:
+                async with self._semaphore:
+                    result = await job()
+                if not future.done():
+                    future.set_result(result)
+            except Exception as e:
+                print(f"[ERROR] Trade job failed for user {user_id}: {e}")
+                if not future.done():
+                    future.set_exception(e)
+            finally:
+                self._pending -= 1
+        del self._user_jobs[user_id]
+
+
+"""---------------------------------"""
+"""            Load Test            """
+"""---------------------------------"""
+
+async def load_test(pending_trades: int, trade_seconds: float = 2.0, samples: int = 100) -> float:
+    # Fake trades hold the queue while we measure how late a 10ms "update handler" tick runs
+    queue = TradeQueue(max_pending=pending_trades + 1, max_in_flight=pending_trades)
+
+    async def fake_trade():
+        await asyncio.sleep(trade_seconds)
+
+    for user_id in range(pending_trades):
+        queue.submit(user_id, fake_trade)
+
+    worst_delay = 0.0
+    for _ in range(samples):
+        start = time.perf_counter()
+        await asyncio.sleep(0.01)
+        worst_delay = max(worst_delay, time.perf_counter() - start - 0.01)
+    return worst_delay * 1000
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 2 and sys.argv[1] == "loadtest":
+        for pending_trades in (0, 10, 100, 500, 1000):
+            delay = asyncio.run(load_test(pending_trades))
+            print(f"{pending_trades:>5} pending trades | worst update delay {delay:.2f} ms")
+    else:
+        print("Usage: python trade_queue.py loadtest")
@@ -0,0 +1,275 @@
+import os
+import sys
+import json
+import time
+import sqlite3
+import threading
+
+"""---------------------------------"""
+"""           User Store            """
+"""---------------------------------"""
+
+# Every user is stored as one JSON document keyed by its Telegram id:
+# {"wallets": {...}, "settings": {...}}. The SQLite backend keeps one row per user
+# so a click only touches the row of the user who clicked.
+
+USER_STORE_BACKEND = os.getenv("USER_STORE_BACKEND", "sqlite")  # "sqlite" or "json"
+USER_STORE_PATH = os.getenv("USER_STORE_PATH", "users.db")
+
+
+class SqliteUserStore:
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS users (user_id TEXT PRIMARY KEY, data TEXT NOT NULL)")
+
+    def get(self, user_id: str) -> dict | None:
+        with self._lock:
+            row = self._conn.execute("SELECT data FROM users WHERE user_id = ?", (str(user_id),)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def exists(self, user_id: str) -> bool:
+        with self._lock:
+            row = self._conn.execute("SELECT 1 FROM users WHERE user_id = ?", (str(user_id),)).fetchone()
+        return row is not None
+
+    def put(self, user_id: str, data: dict):
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO users (user_id, data) VALUES (?, ?) "
+                "ON CONFLICT(user_id) DO UPDATE SET data = excluded.data",
+                (str(user_id), json.dumps(data)),
+            )
+
+    def update_settings(self, user_id: str, **fields) -> bool:
+        # Partial update done by SQLite itself, so two handlers writing different
+        # settings of the same user cannot overwrite each other
+        if not fields:
+            return self.exists(user_id)
+        paths = ", ".join("?, json(?)" for _ in fields)
+        params = []
+        for key, value in fields.items():
+            params.extend((f"$.settings.{key}", json.dumps(value)))
+        with self._lock:
+            cursor = self._conn.execute(
+                f"UPDATE users SET data = json_set(data, {paths}) WHERE user_id = ? AND json_type(data, '$.settings') = 'object'",
+                (*params, str(user_id)),
+            )
+        return cursor.rowcount > 0
+
+    def increment_setting(self, user_id: str, key: str, delta: float = 1) -> bool:
+        path = f"$.settings.{key}"
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE users SET data = json_set(data, ?, coalesce(json_extract(data, ?), 0) + ?) "
+                "WHERE user_id = ? AND json_type(data, '$.settings') = 'object'",
+                (path, path, delta, str(user_id)),
+            )
+        return cursor.rowcount > 0
+
+    def add_wallet(self, user_id: str, wallet_type: str, wallet: dict) -> bool:
+        # Writes only $.wallets.<type>, and only when that wallet does not exist yet
+        if not wallet_type.isidentifier():
+            return False
+        path = f'$.wallets."{wallet_type}"'
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(
+                    "INSERT OR IGNORE INTO users (user_id, data) VALUES (?, ?)",
+                    (str(user_id), json.dumps({"wallets": {}, "settings": {}})),
+                )
+                cursor = self._conn.execute(
+                    "UPDATE users SET data = json_set(data, ?, json(?)) "
+                    "WHERE user_id = ? AND coalesce(json_type(data, ?), 'null') = 'null'",
+                    (path, json.dumps(wallet), str(user_id), path),
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return cursor.rowcount > 0
+
+    def remove_wallet(self, user_id: str, wallet_type: str) -> bool:
+        if not wallet_type.isidentifier():
+            return False
+        path = f'$.wallets."{wallet_type}"'
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE users SET data = json_remove(data, ?) WHERE user_id = ? AND json_type(data, ?) IS NOT NULL",
+                (path, str(user_id), path),
+            )
+        return cursor.rowcount > 0
+
+    def all(self) -> dict:
+        with self._lock:
+            rows = self._conn.execute("SELECT user_id, data FROM users").fetchall()
+        return {user_id: json.loads(data) for user_id, data in rows}
+
+    def replace_all(self, users: dict):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute("DELETE FROM users")
+                self._conn.executemany(
+                    "INSERT INTO users (user_id, data) VALUES (?, ?)",
+                    [(str(user_id), json.dumps(data)) for user_id, data in users.items()],
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class JsonUserStore:
+    # Legacy backend: the whole users.json is read and rewritten on every call
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def _read(self) -> dict:
+        try:
+            with open(self.path, "r") as file:
+                return json.load(file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _write(self, users: dict):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as file:
+            json.dump(users, file, indent=4)
+        os.replace(tmp_path, self.path)
+
+    def get(self, user_id: str) -> dict | None:
+        with self._lock:
+            return self._read().get(str(user_id))
+
+    def exists(self, user_id: str) -> bool:
+        return self.get(user_id) is not None
+
+    def put(self, user_id: str, data: dict):
+        with self._lock:
+            users = self._read()
+            users[str(user_id)] = data
+            self._write(users)
+
+    def update_settings(self, user_id: str, **fields) -> bool:
+        with self._lock:
+            users = self._read()
+            user = users.get(str(user_id))
+            if user is None or not isinstance(user.get("settings"), dict):
+                return False
+            user["settings"].update(fields)
+            self._write(users)
+            return True
+
+    def increment_setting(self, user_id: str, key: str, delta: float = 1) -> bool:
+        with self._lock:
+            users = self._read()
+            user = users.get(str(user_id))
+            if user is None or not isinstance(user.get("settings"), dict):
+                return False
+            user["settings"][key] = user["settings"].get(key, 0) + delta
+            self._write(users)
+            return True
+
+    def add_wallet(self, user_id: str, wallet_type: str, wallet: dict) -> bool:
+        with self._lock:
+            users = self._read()
+            user = users.setdefault(str(user_id), {"wallets": {}, "settings": {}})
+            wallets = user.setdefault("wallets", {})
+            if wallets.get(wallet_type):
+                return False
+            wallets[wallet_type] = wallet
+            self._write(users)
+            return True
+
+    def remove_wallet(self, user_id: str, wallet_type: str) -> bool:
+        with self._lock:
+            users = self._read()
+            user = users.get(str(user_id))
+            if user is None or wallet_type not in user.get("wallets", {}):
+                return False
+            del user["wallets"][wallet_type]
+            self._write(users)
+            return True
+
+    def all(self) -> dict:
+        with self._lock:
+            return self._read()
+
+    def replace_all(self, users: dict):
+        with self._lock:
+            self._write(users)
+
+    def count(self) -> int:
+        return len(self.all())
+
+    def close(self):
+        pass
+
+
+def open_store(backend: str = USER_STORE_BACKEND, path: str = USER_STORE_PATH):
+    if backend == "sqlite":
+        return SqliteUserStore(path)
+    if backend == "json":
+        return JsonUserStore(path)
+    raise ValueError(f"Unknown user store backend: {backend}")
+
+
+"""---------------------------------"""
+"""      Migration / Benchmark      """
+"""---------------------------------"""
+
+def migrate_json_to_sqlite(json_path: str, db_path: str) -> int:
+    source = JsonUserStore(json_path).all()
+    target = SqliteUserStore(db_path)
+    target.replace_all(source)
+    migrated = target.count()
+    target.close()
+    return migrated
+
+
+def benchmark(backend: str, path: str, users_count: int, clicks: int = 200) -> float:
+    # Average latency (ms) of one "click": read one user then update one setting
+    store = open_store(backend, path)
+    store.replace_all({
+        str(user_id): {"wallets": {}, "settings": {"slippage": 2, "trades": 0}}
+        for user_id in range(users_count)
+    })
+    start = time.perf_counter()
+    for click in range(clicks):
+        user_id = str((click * 7919) % users_count)
+        store.get(user_id)
+        store.update_settings(user_id, slippage=click % 50)
+    elapsed = time.perf_counter() - start
+    store.close()
+    return elapsed / clicks * 1000
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 4 and sys.argv[1] == "migrate":
+        count = migrate_json_to_sqlite(sys.argv[2], sys.argv[3])
+        print(f"Migrated {count} users from {sys.argv[2]} to {sys.argv[3]}")
+    elif len(sys.argv) == 2 and sys.argv[1] == "benchmark":
+        for users_count in (1_000, 10_000, 100_000):
+            for backend, path in (("json", "bench_users.json"), ("sqlite", "bench_users.db")):
+                latency = benchmark(backend, path, users_count, clicks=20 if backend == "json" else 1000)
+                print(f"{backend:>6} | {users_count:>7} users | {latency:.3f} ms/click")
+                for suffix in ("", "-wal", "-shm"):
+                    if os.path.exists(path + suffix):
+                        os.remove(path + suffix)
+    else:
+        print("Usage: python user_store.py migrate <users.json> <users.db>")
+        print("       python user_store.py benchmark")